@@ -2,30 +2,60 @@
 
 __version__ = "0.1.0"
 
-from .cli import cli
-from .color import should_use_color
-from .diff import (
-    build_diff_cmd,
-    compute_upstream_range,
-    get_changed_files,
-    get_commits,
-    get_file_diff,
-    get_rename_mapping,
-    normalize_diff,
-    parse_refspec_bases,
-)
-from .pager import Pager
+# Exports are imported lazily, so that `didi.client` (the `git-didi` entry point)
+# can forward commands to a daemon without importing the CLI
+_EXPORTS = {
+    "CommitComparison": ".api",
+    "CompareOptions": ".api",
+    "FileComparison": ".api",
+    "compare_commits": ".api",
+    "compare_patches": ".api",
+    "cli": ".cli",
+    "should_use_color": ".color",
+    "Rules": ".config",
+    "load_rules": ".config",
+    "FileChange": ".diff",
+    "build_diff_cmd": ".diff",
+    "compute_upstream_range": ".diff",
+    "get_changed_files": ".diff",
+    "get_commits": ".diff",
+    "get_file_changes": ".diff",
+    "get_file_diff": ".diff",
+    "get_rename_mapping": ".diff",
+    "normalize_diff": ".diff",
+    "parse_refspec_bases": ".diff",
+    "stream_file_diff": ".diff",
+    "Pager": ".pager",
+}
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        from importlib import import_module
+        return getattr(import_module(_EXPORTS[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 __all__ = [
+    "CommitComparison",
+    "CompareOptions",
+    "FileComparison",
+    "compare_commits",
+    "compare_patches",
     "cli",
     "should_use_color",
+    "Rules",
+    "load_rules",
+    "FileChange",
     "build_diff_cmd",
     "compute_upstream_range",
     "get_changed_files",
     "get_commits",
+    "get_file_changes",
     "get_file_diff",
     "get_rename_mapping",
     "normalize_diff",
     "parse_refspec_bases",
+    "stream_file_diff",
     "Pager",
 ]
@@ -0,0 +1,434 @@
+"""Library API: compare two ranges' patches, or commits, from Python.
+
+    from didi import CompareOptions, compare_patches
+
+    for result in compare_patches('main@{1}..feature@{1}', 'main..feature', CompareOptions(paths=('src',))):
+        if result.different:
+            print(result.status, result.display_name)
+            print(result.diff)
+
+Results are yielded as each file (or commit) is decided; diff-of-diffs text, full
+patches and commit patches are computed on first access. Callers can pass their own
+`concurrent.futures.Executor` (patches are fetched in it) and a mutable mapping to
+cache patches in across calls. The `patch` and `commits` commands are built on these.
+"""
+
+from concurrent.futures import Executor, Future
+from dataclasses import dataclass, field
+from functools import cached_property
+from typing import Dict, Hashable, Iterator, MutableMapping, Optional, Union
+
+from .compare import DIFFERENT, FileResult, Move, iter_compare_files
+from .config import NO_RULES, Rules
+from .diff import FileChange, compute_upstream_range, get_rename_mapping, normalize_diff
+from .mbox import MboxSource
+from .pathspec import ALL_PATHS, PathFilter
+from .progress import NO_PROGRESS, Progress
+from .source import GitSource, Source, open_source
+from .upstream import UpstreamIndex, build_upstream_index
+
+
+@dataclass
+class CompareOptions:
+    """Options shared by `compare_patches` and `compare_commits` (mirroring the CLI's).
+
+    `paths` are repo-root-relative pathspecs; `path_filter`, if given, replaces them
+    (see `didi.pathspec.load_path_filter` for cwd-relative ones). `rename_map` maps
+    upstream renames (old → new path), and is detected from the ranges' bases if None.
+    `pair_by_patch_id` pairs commits with equal `git patch-id`s before pairing the
+    rest by position (by default, when either side is a patch series).
+    """
+    paths: tuple[str, ...] = ()
+    ignore_whitespace: bool = False
+    unified: int = 3
+    find_renames: Optional[str] = None
+    find_copies: Optional[str] = None
+    rules: Rules = field(default_factory=lambda: NO_RULES)
+    path_filter: Optional[PathFilter] = None
+    rename_map: Optional[Dict[str, str]] = None
+    large_file_lines: int = 50000
+    full: bool = False
+    triage: bool = False
+    unexpected_only: bool = False
+    max_workers: int = 8
+    pair_by_patch_id: Optional[bool] = None
+
+    def resolved_path_filter(self) -> PathFilter:
+        if self.path_filter is not None:
+            return self.path_filter
+        return PathFilter.from_specs(self.paths) if self.paths else ALL_PATHS
+
+    def diff_options(self) -> tuple:
+        """(ignore_whitespace, unified, find_renames, find_copies), as `Source` methods take them."""
+        return self.ignore_whitespace, self.unified, self.find_renames, self.find_copies
+
+    def key(self) -> tuple:
+        """The options that affect results (not `max_workers`), in a stable, hashable form."""
+        rules = self.rules
+        path_filter = self.resolved_path_filter()
+        return (
+            *self.diff_options(),
+            rules.excludes,
+            tuple((pattern.pattern, replace) for pattern, replace in rules.normalizations),
+            tuple(sorted(path_filter.literals)), path_filter.globs, path_filter.magic,
+            tuple(sorted((self.rename_map or {}).items())) if self.rename_map is not None else None,
+            self.large_file_lines, self.full, self.triage, self.unexpected_only, self.pair_by_patch_id,
+        )
+
+
+def cached(cache: Optional[MutableMapping], key: Hashable, compute):
+    """Look `key` up in a caller-supplied cache (if any), computing it on a miss."""
+    if cache is None:
+        return compute()
+    # One lookup: a bounded cache (e.g. the daemon's) may evict the key between two
+    value = cache.get(key)
+    if value is None:
+        value = cache[key] = compute()
+    return value
+
+
+@dataclass
+class FileComparison:
+    """How one file's patch compares between two ranges (see `FileResult` for statuses)."""
+    result: FileResult
+    source1: Source
+    source2: Source
+    options: CompareOptions
+
+    @property
+    def path1(self) -> str:
+        return self.result.path1
+
+    @property
+    def path2(self) -> str:
+        return self.result.path2
+
+    @property
+    def display_name(self) -> str:
+        return self.result.display_name
+
+    @property
+    def status(self) -> str:
+        return self.result.status
+
+    @property
+    def different(self) -> bool:
+        return self.result.different
+
+    @property
+    def change1(self) -> Optional[FileChange]:
+        return self.result.change1
+
+    @property
+    def change2(self) -> Optional[FileChange]:
+        return self.result.change2
+
+    @property
+    def summary(self) -> Optional[str]:
+        """For binary and large files, a description in place of the diff-of-diffs."""
+        return self.result.summary
+
+    @cached_property
+    def diff(self) -> str:
+        """The diff-of-diffs of this file's unmatched hunks ('' if none)."""
+        return '\n'.join(self.result.diff_lines(self.source1.refspec, self.source2.refspec))
+
+    @cached_property
+    def patch1(self) -> str:
+        """The file's full patch in the first range ('' if it isn't changed there)."""
+        if self.change1 is None:
+            return ''
+        return self.source1.file_diff(self.path1, *self.options.diff_options())
+
+    @cached_property
+    def patch2(self) -> str:
+        """The file's full patch in the second range ('' if it isn't changed there)."""
+        if self.change2 is None:
+            return ''
+        return self.source2.file_diff(self.path2, *self.options.diff_options())
+
+    def record(self, diff: bool = True) -> dict:
+        """JSON-serializable form (as emitted by `patch --format=jsonl`)."""
+        return self.result.record(self.source1.refspec, self.source2.refspec, diff=diff)
+
+
+class PatchComparison:
+    """Iterable of `FileComparison`s, yielded as each file is decided.
+
+    Nothing runs until iteration starts. Once it completes, `results` holds every
+    file's result in path order, and `moves` the hunks that moved between files.
+    """
+
+    def __init__(
+        self,
+        refspec1: Union[str, Source],
+        refspec2: Union[str, Source],
+        options: CompareOptions = None,
+        executor: Optional[Executor] = None,
+        cache: Optional[MutableMapping] = None,
+        progress: Progress = NO_PROGRESS,
+    ):
+        self.source1 = open_source(refspec1)
+        self.source2 = open_source(refspec2)
+        self.options = options or CompareOptions()
+        self.executor = executor
+        self.cache = cache
+        self.progress = progress
+        self.upstream_range = compute_upstream_range(self.source1.range, self.source2.range)
+        if (self.options.triage or self.options.unexpected_only) and not self.upstream_range:
+            raise ValueError("triage needs two A..B ranges, to find upstream's changes between their bases")
+        self.results: list[FileComparison] = []
+        self.moves: list[Move] = []
+
+    @cached_property
+    def rename_map(self) -> Dict[str, str]:
+        """Upstream renames (old → new path) between the ranges' bases."""
+        options = self.options
+        if options.rename_map is not None:
+            return options.rename_map
+        if not self.upstream_range:
+            return {}
+        return get_rename_mapping(self.upstream_range, options.find_renames, options.find_copies)
+
+    @cached_property
+    def upstream(self) -> Optional[UpstreamIndex]:
+        """Upstream's changed lines, when triaging."""
+        options = self.options
+        if not (options.triage or options.unexpected_only):
+            return None
+        return build_upstream_index(self.upstream_range, options.find_renames, options.find_copies)
+
+    def __iter__(self) -> Iterator[FileComparison]:
+        options = self.options
+        path_filter = options.resolved_path_filter()
+        results = iter_compare_files(
+            self.source1, self.source2, path_filter.git_pathspecs(), options.ignore_whitespace,
+            options.unified, options.find_renames, options.find_copies, options.rules, self.rename_map,
+            options.large_file_lines, options.full,
+            max_workers=options.max_workers,
+            diff_cache=self.cache,
+            path_filter=path_filter,
+            upstream=self.upstream,
+            unexpected_only=options.unexpected_only,
+            executor=self.executor,
+            progress=self.progress,
+        )
+        wrapped = {}
+        while True:
+            try:
+                result = next(results)
+            except StopIteration as stop:
+                ordered, self.moves = stop.value
+                self.results = [wrapped[id(result)] for result in ordered]
+                return
+            wrapped[id(result)] = FileComparison(result, self.source1, self.source2, options)
+            yield wrapped[id(result)]
+
+
+def compare_patches(
+    refspec1: Union[str, Source],
+    refspec2: Union[str, Source],
+    options: CompareOptions = None,
+    executor: Optional[Executor] = None,
+    cache: Optional[MutableMapping] = None,
+    progress: Progress = NO_PROGRESS,
+) -> PatchComparison:
+    """Compare two ranges' patches file by file (like `git-didi patch`).
+
+    Either side may be a refspec (`A..B`) or a snapshot file. Raises ValueError if
+    triage is requested without two `A..B` ranges. `progress` (see `didi.progress`)
+    is updated as files are decided.
+    """
+    return PatchComparison(refspec1, refspec2, options, executor, cache, progress)
+
+
+@dataclass
+class CommitComparison:
+    """How the i-th commits of two ranges compare; their patches are fetched on first access."""
+    index: int
+    sha1: str
+    subject1: str
+    sha2: str
+    subject2: str
+    source1: Source = field(repr=False)
+    source2: Source = field(repr=False)
+    options: CompareOptions = field(repr=False)
+    cache: Optional[MutableMapping] = field(default=None, repr=False)
+    prefetched: Dict[int, Future] = field(default_factory=dict, repr=False)
+
+    def commit_diff(self, side: int) -> str:
+        if side in self.prefetched:
+            return self.prefetched[side].result()
+        source, sha = (self.source1, self.sha1) if side == 1 else (self.source2, self.sha2)
+        return fetch_commit_diff(source, sha, self.options, self.cache)
+
+    @cached_property
+    def diff1(self) -> str:
+        """The first commit's patch (excluding files that match the rules' excludes)."""
+        return self.commit_diff(1)
+
+    @cached_property
+    def diff2(self) -> str:
+        """The second commit's patch."""
+        return self.commit_diff(2)
+
+    @property
+    def subjects_match(self) -> bool:
+        return self.subject1 == self.subject2
+
+    @cached_property
+    def status(self) -> str:
+        """"identical" if the commits' normalized patches are equal, else "changed"."""
+        rules = self.options.rules
+        same = normalize_diff(self.diff1, rules=rules) == normalize_diff(self.diff2, rules=rules)
+        return 'identical' if same else 'changed'
+
+    @property
+    def different(self) -> bool:
+        return self.status in DIFFERENT
+
+    @cached_property
+    def files(self) -> list[str]:
+        """Files whose patches differ between the two commits (empty if they're identical)."""
+        if self.status == 'identical':
+            return []
+        options = self.options
+        rules = options.rules
+        files1 = rules.filter(self.source1.commit_files(self.sha1))
+        files2 = rules.filter(self.source2.commit_files(self.sha2))
+        differing = []
+        for path in sorted(set(files1) | set(files2)):
+            diff1 = fetch_commit_file_diff(self.source1, self.sha1, path, options, self.cache)
+            diff2 = fetch_commit_file_diff(self.source2, self.sha2, path, options, self.cache)
+            if normalize_diff(diff1, rules=rules) != normalize_diff(diff2, rules=rules):
+                differing.append(path)
+        return differing
+
+    def record(self) -> dict:
+        """JSON-serializable form (as emitted by `commits --format=jsonl`)."""
+        return dict(
+            type='commit',
+            index=self.index,
+            sha1=self.sha1,
+            sha2=self.sha2,
+            subject1=self.subject1,
+            subject2=self.subject2,
+            status=self.status,
+            files=self.files,
+        )
+
+
+# Commits' patches are immutable, so they're cached by SHA (snapshots are read directly)
+def fetch_commit_diff(source: Source, sha: str, options: CompareOptions, cache: Optional[MutableMapping]) -> str:
+    def compute():
+        return source.commit_diff(sha, options.ignore_whitespace, options.rules)
+    if not isinstance(source, GitSource):
+        return compute()
+    # Keyed by full SHA: abbreviations can become ambiguous, or differ between requests
+    return cached(cache, ('commit_diff', source.full_sha(sha), options.ignore_whitespace, *options.rules.pathspecs()), compute)
+
+
+def fetch_commit_file_diff(
+    source: Source,
+    sha: str,
+    path: str,
+    options: CompareOptions,
+    cache: Optional[MutableMapping],
+) -> str:
+    def compute():
+        return source.commit_file_diff(sha, path, *options.diff_options())
+    if not isinstance(source, GitSource):
+        return compute()
+    return cached(cache, ('commit_file_diff', source.full_sha(sha), path, *options.diff_options()), compute)
+
+
+def short_patch_ids(ids: Dict[str, str], commits: list[str]) -> list[Optional[str]]:
+    """Each commit's patch ID, looked up by its (abbreviated) SHA."""
+    shas = [commit.split(' ', 1)[0] for commit in commits]
+    by_prefix = {key[:n]: patch_id for key, patch_id in ids.items() for n in {len(sha) for sha in shas}}
+    return [by_prefix.get(sha) for sha in shas]
+
+
+class CommitsComparison:
+    """Iterable of `CommitComparison`s, pairing the ranges' commits in order (or by patch ID).
+
+    `commits1`/`commits2` ("<sha> <subject>", newest first) are listed on first access.
+    With an executor, iteration starts fetching every pair's patches in it up front.
+    """
+
+    def __init__(
+        self,
+        refspec1: Union[str, Source],
+        refspec2: Union[str, Source],
+        options: CompareOptions = None,
+        executor: Optional[Executor] = None,
+        cache: Optional[MutableMapping] = None,
+    ):
+        self.source1 = open_source(refspec1)
+        self.source2 = open_source(refspec2)
+        self.options = options or CompareOptions()
+        self.executor = executor
+        self.cache = cache
+
+    @cached_property
+    def commits1(self) -> list[str]:
+        return self.source1.commits()
+
+    @cached_property
+    def commits2(self) -> list[str]:
+        return self.source2.commits()
+
+    @property
+    def pair_by_patch_id(self) -> bool:
+        if self.options.pair_by_patch_id is not None:
+            return self.options.pair_by_patch_id
+        return isinstance(self.source1, MboxSource) or isinstance(self.source2, MboxSource)
+
+    def pair_indices(self) -> list[tuple[int, int]]:
+        """Indices into `commits1`/`commits2` of each pair, in the first range's order."""
+        n1, n2 = len(self.commits1), len(self.commits2)
+        if not self.pair_by_patch_id:
+            return [(i, i) for i in range(min(n1, n2))]
+        ids1 = short_patch_ids(self.source1.patch_ids(), self.commits1)
+        ids2 = short_patch_ids(self.source2.patch_ids(), self.commits2)
+        index2 = {}
+        for j, patch_id in enumerate(ids2):
+            if patch_id:
+                index2.setdefault(patch_id, []).append(j)
+        pairs = {}
+        for i, patch_id in enumerate(ids1):
+            if index2.get(patch_id):
+                pairs[i] = index2[patch_id].pop(0)
+        # Commits whose patches changed are paired by position, among the rest
+        used2 = set(pairs.values())
+        rest1 = [i for i in range(n1) if i not in pairs]
+        rest2 = [j for j in range(n2) if j not in used2]
+        pairs.update(zip(rest1, rest2))
+        return sorted(pairs.items())
+
+    def __iter__(self) -> Iterator[CommitComparison]:
+        pairs = []
+        for i, j in self.pair_indices():
+            sha1, subject1 = self.commits1[i].split(' ', 1)
+            sha2, subject2 = self.commits2[j].split(' ', 1)
+            pairs.append(CommitComparison(
+                i + 1, sha1, subject1, sha2, subject2, self.source1, self.source2, self.options, self.cache,
+            ))
+        if self.executor:
+            for pair in pairs:
+                pair.prefetched = {
+                    1: self.executor.submit(fetch_commit_diff, self.source1, pair.sha1, self.options, self.cache),
+                    2: self.executor.submit(fetch_commit_diff, self.source2, pair.sha2, self.options, self.cache),
+                }
+        yield from pairs
+
+
+def compare_commits(
+    refspec1: Union[str, Source],
+    refspec2: Union[str, Source],
+    options: CompareOptions = None,
+    executor: Optional[Executor] = None,
+    cache: Optional[MutableMapping] = None,
+) -> CommitsComparison:
+    """Compare two ranges' commits pairwise, in order (like `git-didi commits`)."""
+    return CommitsComparison(refspec1, refspec2, options, executor, cache)
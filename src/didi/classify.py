@@ -0,0 +1,159 @@
+"""Summary classification of files between two ranges, without rendering any patch text.
+
+Files are classified from `git diff --raw` blob pairs and the upstream rename map;
+patches are only fetched (one streamed `git diff` per range) for files whose blob
+pairs differ, and compared by offset-insensitive patch IDs.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Optional, Union
+
+from .config import NO_RULES, Rules
+from .diff import NULL_SHA, FileChange, compute_upstream_range, get_rename_mapping
+from .hunks import parse_hunks, patch_id
+from .pathspec import ALL_PATHS, PathFilter
+from .source import Source, open_source
+
+IDENTICAL = 'identical'
+CHANGED = 'changed'
+ADDED = 'added'
+DROPPED = 'dropped'
+RENAMED = 'renamed'
+
+
+@dataclass
+class FileClass:
+    """How one file's patch compares between two ranges.
+
+    `status` is one of "identical", "changed", "added" (only in the second range),
+    "dropped" (only in the first range) or "renamed" (identical, under a path renamed
+    upstream).
+    """
+    status: str
+    path1: Optional[str]
+    path2: Optional[str]
+    change1: Optional[FileChange] = None
+    change2: Optional[FileChange] = None
+    patch_id1: Optional[str] = None
+    patch_id2: Optional[str] = None
+
+    @property
+    def display_name(self) -> str:
+        if self.path1 and self.path2 and self.path1 != self.path2:
+            return f"{self.path1} → {self.path2}"
+        return self.path1 or self.path2
+
+    def record(self) -> dict:
+        """JSON-serializable form of this classification."""
+        return dict(
+            type='file',
+            path1=self.path1,
+            path2=self.path2,
+            renamed=bool(self.path1 and self.path2 and self.path1 != self.path2),
+            status=self.status,
+            blobs1=list(self.change1.blobs) if self.change1 else None,
+            blobs2=list(self.change2.blobs) if self.change2 else None,
+            patch_id1=self.patch_id1,
+            patch_id2=self.patch_id2,
+        )
+
+
+def _patch_ids(
+    source: Source,
+    wanted: set[str],
+    pathspecs: tuple[str, ...],
+    ignore_whitespace: bool,
+    unified: int,
+    find_renames: str,
+    find_copies: str,
+    path_mapping: Dict[str, str],
+    rules: Rules,
+) -> Dict[str, str]:
+    """Compute patch IDs of the `wanted` files from one streamed range patch."""
+    ids = {}
+    if not wanted:
+        return ids
+    patches = source.range_patches(pathspecs, ignore_whitespace, unified, find_renames, find_copies, wanted=wanted)
+    for path, file_lines in patches:
+        ids[path] = patch_id(*parse_hunks('\n'.join(file_lines), path_mapping, rules))
+    return ids
+
+
+def classify(
+    refspec1: Union[str, Source],
+    refspec2: Union[str, Source],
+    paths: tuple[str, ...] = (),
+    ignore_whitespace: bool = False,
+    unified: int = 3,
+    find_renames: str = None,
+    find_copies: str = None,
+    rules: Rules = NO_RULES,
+    rename_map: Dict[str, str] = None,
+    path_filter: PathFilter = ALL_PATHS,
+) -> list[FileClass]:
+    """Classify each file changed in either range, in a handful of git calls.
+
+    Args:
+        rename_map: Upstream renames (old → new path); computed from the refspecs' bases if None
+        path_filter: Selects files in-process (`paths` are passed to git)
+    """
+    source1 = open_source(refspec1)
+    source2 = open_source(refspec2)
+    if rename_map is None:
+        upstream_range = compute_upstream_range(source1.range, source2.range)
+        rename_map = get_rename_mapping(upstream_range, find_renames, find_copies) if upstream_range else {}
+
+    pathspecs = (*paths, *rules.pathspecs())
+    changes1 = source1.changes(pathspecs, find_renames, find_copies)
+    changes2 = source2.changes(pathspecs, find_renames, find_copies)
+
+    # Pair files up, looking for upstream-renamed files under their new names
+    pairs = []
+    for path1 in path_filter.filter(rules.filter(changes1)):
+        path2 = rename_map.get(path1, path1)
+        pairs.append((path1, path2 if path2 in changes2 else None))
+    paired2 = {path2 for _, path2 in pairs}
+    pairs.extend((None, path2) for path2 in path_filter.filter(rules.filter(changes2)) if path2 not in paired2)
+
+    # Only files whose blob pairs differ (and aren't binary) need their patches hashed
+    need1 = set()
+    need2 = set()
+    for path1, path2 in pairs:
+        if not path1 or not path2:
+            continue
+        change1 = changes1[path1]
+        change2 = changes2[path2]
+        if change1.blobs == change2.blobs and NULL_SHA not in change1.blobs:
+            continue
+        if change1.binary and change2.binary:
+            continue
+        need1.add(path1)
+        need2.add(path2)
+
+    ids1 = _patch_ids(source1, need1, pathspecs, ignore_whitespace, unified, find_renames, find_copies, rename_map, rules)
+    ids2 = _patch_ids(source2, need2, pathspecs, ignore_whitespace, unified, find_renames, find_copies, None, rules)
+
+    results = []
+    for path1, path2 in pairs:
+        change1 = changes1.get(path1)
+        change2 = changes2.get(path2)
+        if not change2:
+            results.append(FileClass(DROPPED, path1, None, change1))
+            continue
+        if not change1:
+            results.append(FileClass(ADDED, None, path2, None, change2))
+            continue
+        id1 = ids1.get(path1)
+        id2 = ids2.get(path2)
+        if path1 in need1:
+            same = id1 == id2
+        else:
+            same = change1.blobs == change2.blobs
+        if not same:
+            status = CHANGED
+        elif path1 != path2:
+            status = RENAMED
+        else:
+            status = IDENTICAL
+        results.append(FileClass(status, path1, path2, change1, change2, id1, id2))
+    return results
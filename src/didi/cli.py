@@ -41,24 +41,45 @@ that change even when the actual patch content is identical.
 
 import difflib
 import sys
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 from subprocess import run
+from time import perf_counter
+from typing import Optional
 
-from click import Choice, echo, group, style
+from click import Choice, group
 from utz import err
 from utz.cli import arg, flag, opt
 
+from .api import CommitComparison, CommitsComparison, CompareOptions, compare_commits, compare_patches
+from .classify import FileClass, classify as classify_files
 from .color import should_use_color
-from .diff import (
-    build_diff_cmd,
-    compute_upstream_range,
-    get_changed_files,
-    get_commits,
-    get_file_diff,
-    get_rename_mapping,
-    normalize_diff,
-)
+from .compare import SHIFTED, UPSTREAM, FileResult, Move, move_record
+from .config import NO_RULES, RULES_FILE, load_rules
+from .daemon import memo, warm_cache
+from .diff import compute_upstream_range, get_rename_mapping, numstat_path
+from .memo import RunMemo
+from .notes import Verification
 from .pager import Pager
+from .pathspec import load_path_filter, read_pathspec_file
+from .progress import Progress
+from .remerge import RemergeAudit
+from .render import (
+    BRIGHT_GREEN,
+    BRIGHT_RED,
+    CLEAR,
+    DARK_GREEN,
+    DARK_RED,
+    NESTED_STYLES,
+    STYLES,
+    VDARK_GREEN,
+    VDARK_RED,
+    Renderer,
+    renderer,
+)
+from .source import GitSource, Source, open_source
+from .upstream import OVERLAP, UNEXPECTED
 
 
 # Common option decorators
@@ -66,7 +87,31 @@ color_opt = opt('-c', '--color', type=Choice(['auto', 'always', 'never']), defau
 pager_opt = opt('--pager', type=Choice(['auto', 'always', 'never']), default='auto', help='When to use pager (default: auto)')
 find_copies_opt = opt('-C', '--find-copies', type=str, metavar='[<n>]', help='Detect copies as well as renames (similarity threshold, e.g., 50% or 0.5)')
 find_renames_opt = opt('-M', '--find-renames', type=str, metavar='[<n>]', help='Detect renames (similarity threshold, e.g., 50% or 0.5)')
+format_opt = opt('--format', type=Choice(['text', 'jsonl', 'html']), default='text', help='Output format: human-readable text, one JSON record per file/commit, or a self-contained HTML report (default: text)')
 ignore_whitespace_flag = flag('-w', '--ignore-whitespace', help='Pass -w to git diff commands to ignore whitespace')
+no_rules_flag = flag('--no-rules', help=f'Ignore exclude/normalize rules from {RULES_FILE} and `didi.*` git config')
+pathspec_from_file_opt = opt('--pathspec-from-file', metavar='FILE', help='Read pathspecs from FILE ("-" for stdin), one per line; matched in-process, not passed to git')
+pathspec_file_nul_flag = flag('--pathspec-file-nul', help='With --pathspec-from-file, pathspecs are NUL-separated')
+notes_flag = flag('--notes', help='Skip comparisons verified identical in refs/notes/didi, and record new ones there')
+no_progress_flag = flag('--no-progress', help="Don't report progress on stderr during long comparisons")
+
+
+@contextmanager
+def output(format: str, pager: str, use_color: bool):
+    """Set up a command's output: paged and (optionally) colored text, machine-readable records, or an HTML report."""
+    if format in ('jsonl', 'html'):
+        with renderer(False, format) as out:
+            yield out
+    else:
+        with Pager(pager), renderer(use_color) as out:
+            yield out
+
+
+def pathspec_opts(func):
+    """Apply options for reading pathspecs from a file."""
+    func = pathspec_from_file_opt(func)
+    func = pathspec_file_nul_flag(func)
+    return func
 
 
 def common_opts(func):
@@ -76,6 +121,7 @@ def common_opts(func):
     func = find_copies_opt(func)
     func = find_renames_opt(func)
     func = ignore_whitespace_flag(func)
+    func = no_rules_flag(func)
     return func
 
 
@@ -92,9 +138,58 @@ def cli():
 from .commands import shell_integration as shell_integration_module
 shell_integration_module.register(cli)
 
+# Register watch command
+from .commands import watch as watch_module
+watch_module.register(cli)
+
+# Register daemon command
+from .commands import daemon as daemon_command_module
+daemon_command_module.register(cli)
+
+# Register series command
+from .commands import series as series_module
+series_module.register(cli)
+
+# Register snapshot command
+from .commands import snapshot as snapshot_module
+snapshot_module.register(cli)
+
+# Register browse command
+from .commands import browse as browse_module
+browse_module.register(cli)
+
+# Register (hidden) complete command, used by shell completion
+from .commands import complete as complete_module
+complete_module.register(cli)
+
+
+def upstream_renames(source1: Source, source2: Source, find_renames: str, find_copies: str) -> dict:
+    """Detect renames in the upstream range between two ranges' bases (e.g. A..C for A..B vs C..D)."""
+    upstream_range = compute_upstream_range(source1.range, source2.range)
+    if not upstream_range:
+        return {}
+    # In a daemon, rename maps are cached by the range's resolved SHAs
+    def compute():
+        return get_rename_mapping(upstream_range, find_renames, find_copies)
+    if warm_cache('renames') is None:
+        rename_map = compute()
+    else:
+        base1, base2 = upstream_range.split('..', 1)
+        result = run(['git', 'rev-parse', base1, base2], capture_output=True, text=True)
+        key = (tuple(result.stdout.split()), find_renames, find_copies) if result.returncode == 0 else None
+        rename_map = memo('renames', key, compute) if key else compute()
+    if rename_map:
+        err(renames_message(len(rename_map), upstream_range))
+    return rename_map
+
+
+def renames_message(n: int, upstream_range: str) -> str:
+    return f"Detected {n} rename(s) in upstream ({upstream_range})"
+
 
 @cli.command()
 @common_opts
+@pathspec_opts
 @arg('refspec1')
 @arg('refspec2')
 @arg('paths', nargs=-1)
@@ -104,6 +199,9 @@ def stat(
     find_copies: str,
     find_renames: str,
     ignore_whitespace: bool,
+    no_rules: bool,
+    pathspec_from_file: str,
+    pathspec_file_nul: bool,
     refspec1: str,
     refspec2: str,
     paths: tuple[str, ...],
@@ -114,39 +212,30 @@ def stat(
     Optionally filter to specific paths.
     """
     use_color = should_use_color(color)
+    rules = NO_RULES if no_rules else load_rules()
+    path_filter = load_path_filter(paths, pathspec_from_file, pathspec_file_nul)
+    source1 = open_source(refspec1)
+    source2 = open_source(refspec2)
 
-    with Pager(pager):
+    with output('text', pager, use_color) as out:
         # Compute upstream range to detect renames
-        upstream_range = compute_upstream_range(refspec1, refspec2)
-        rename_map = {}
-        if upstream_range:
-            rename_map = get_rename_mapping(upstream_range, find_renames, find_copies)
-            if rename_map:
-                err(f"Detected {len(rename_map)} rename(s) in upstream ({upstream_range})")
+        rename_map = upstream_renames(source1, source2, find_renames, find_copies)
 
         # Use --numstat for machine-readable output (fixed format, no spacing issues)
-        # Only use --follow when filtering to a single path
-        use_follow = len(paths) == 1
-        cmd1 = build_diff_cmd(ignore_whitespace, find_renames, find_copies, follow=use_follow)
-        cmd1.extend(['--numstat', refspec1])
-        if paths:
-            cmd1.extend(['--', *paths])
-        result1 = run(cmd1, capture_output=True, text=True)
-        if result1.returncode != 0:
-            err(f"Error getting diff for {refspec1}: {result1.stderr}")
-            sys.exit(1)
-
-        cmd2 = build_diff_cmd(ignore_whitespace, find_renames, find_copies, follow=use_follow)
-        cmd2.extend(['--numstat', refspec2])
-        if paths:
-            cmd2.extend(['--', *paths])
-        result2 = run(cmd2, capture_output=True, text=True)
-        if result2.returncode != 0:
-            err(f"Error getting diff for {refspec2}: {result2.stderr}")
-            sys.exit(1)
-
-        lines1 = result1.stdout.splitlines()
-        lines2 = result2.stdout.splitlines()
+        # Only use --follow when filtering to a single path (which git then matches itself;
+        # --follow takes exactly one pathspec, so exclude rules are applied in-process)
+        live = isinstance(source1, GitSource) and isinstance(source2, GitSource)
+        use_follow = len(paths) == 1 and not pathspec_from_file and live
+        pathspecs = paths if use_follow else (*path_filter.git_pathspecs(), *rules.pathspecs())
+        lines1 = source1.numstat(pathspecs, ignore_whitespace, find_renames, find_copies, follow=use_follow)
+        lines2 = source2.numstat(pathspecs, ignore_whitespace, find_renames, find_copies, follow=use_follow)
+        if path_filter and not use_follow:
+            lines1 = [line for line in lines1 if path_filter.matches(numstat_path(line))]
+            lines2 = [line for line in lines2 if path_filter.matches(numstat_path(line))]
+        if rules and (use_follow or not live):
+            # Snapshots hold every file; apply exclusions here, as git would have
+            lines1 = [line for line in lines1 if not rules.excluded(numstat_path(line))]
+            lines2 = [line for line in lines2 if not rules.excluded(numstat_path(line))]
 
         # Apply rename mapping to lines1
         # numstat format: "added\tdeleted\tfilename"
@@ -183,26 +272,54 @@ def stat(
         has_changes = False
         for line in diff:
             has_changes = True
-            if use_color:
-                if line.startswith('+'):
-                    echo(style(line, fg='green'), color=True)
-                elif line.startswith('-'):
-                    echo(style(line, fg='red'), color=True)
-                elif line.startswith('@'):
-                    echo(style(line, fg='cyan'), color=True)
-                else:
-                    echo(line)
-            else:
-                echo(line)
+            out.diff_line(line)
 
         if not has_changes:
-            err("No differences in diff stats")
+            out.err("No differences in diff stats")
+
+
+def render_file_result(out: Renderer, result: FileResult, refspec1: str, refspec2: str) -> None:
+    """Render one file's banner and diff-of-diffs (or summary, for binary/large files)."""
+    with out.file_section(f"File: {result.display_name}"):
+        if result.overlap1 is not None:
+            tags = Counter([*result.tags(1), *result.tags(2)])
+            out.line(f"Differing hunks: {tags[OVERLAP]} {OVERLAP}, {tags[UNEXPECTED]} {UNEXPECTED}")
+        if result.summary:
+            # Binary or large file, compared without its full patch
+            out.line(result.summary)
+        else:
+            # Show the diff of diffs for this file
+            for line in result.diff_lines(refspec1, refspec2):
+                out.nested_line(line)
+
+
+@dataclass
+class PatchRun:
+    """What `patch` computes (and memoizes, see `didi.memo`); flags like --quiet and --format only change how it's shown."""
+    upstream_range: Optional[str] = None
+    renames: int = 0
+    classes: Optional[list[FileClass]] = None
+    # File results in the order they were decided (as `--format=jsonl` streams them), and in path order
+    decided: list[FileResult] = field(default_factory=list)
+    results: list[FileResult] = field(default_factory=list)
+    moves: list[Move] = field(default_factory=list)
+    triaged: bool = False
 
 
 @cli.command()
 @common_opts
 @opt('-U', '--unified', type=int, default=3, help='Number of context lines to show (default: 3)')
 @flag('-q', '--quiet', help='Only show files with differences')
+@opt('--large-file-lines', type=int, default=50000, help='Compare files changing more lines than this by hunk hashes only (default: 50000)')
+@flag('--full', help='Show the full diff-of-diffs for large files too')
+@flag('--classify', help='Only classify files (identical/changed/added/dropped/renamed), without rendering patches')
+@flag('--triage', help="Tag differing hunks by whether they overlap upstream's changes, and list overlapping files first")
+@flag('--unexpected-only', help="Only show differences that don't overlap upstream's changes (implies --triage)")
+@flag('--no-memo', help='Recompute the comparison, without reading or writing the memoized one')
+@notes_flag
+@no_progress_flag
+@format_opt
+@pathspec_opts
 @arg('refspec1')
 @arg('refspec2')
 @arg('paths', nargs=-1)
@@ -213,7 +330,19 @@ def patch(
     find_renames: str,
     unified: int,
     quiet: bool,
+    large_file_lines: int,
+    full: bool,
+    classify: bool,
+    triage: bool,
+    unexpected_only: bool,
+    no_memo: bool,
+    notes: bool,
+    no_progress: bool,
+    format: str,
+    pathspec_from_file: str,
+    pathspec_file_nul: bool,
     ignore_whitespace: bool,
+    no_rules: bool,
     refspec1: str,
     refspec2: str,
     paths: tuple[str, ...],
@@ -222,186 +351,212 @@ def patch(
 
     Shows only files where the patches differ.
     Optionally filter to specific paths.
+
+    Binary files are compared by blob SHAs. Files whose patches exceed
+    --large-file-lines are streamed and compared hunk-by-hunk, reporting only
+    the first differing hunk (unless --full is passed).
+
+    With --classify, prints one "<status> <path>" line per file instead, computed
+    from blob SHAs and patch IDs in a handful of git calls.
+
+    With --triage, lines upstream changed between the two bases are indexed (from one
+    `git diff -U0`), and each differing hunk is tagged "upstream overlap" (git had to
+    re-apply it, so it may legitimately differ) or "unexpected change". With
+    --unexpected-only, overlapping hunks are dropped, and files upstream never
+    touched are compared by blob SHAs alone.
+
+    Comparisons are memoized in the repo, so re-running one with other --quiet,
+    --color, --pager or --format options re-renders it without running git.
+
+    With --notes, comparisons already verified identical (recorded in
+    refs/notes/didi, e.g. by CI) are skipped, and new ones are recorded.
+
+    Long comparisons report their progress on stderr (unless --no-progress).
     """
     # Determine color BEFORE pager redirects stdout
     use_color = should_use_color(color)
 
-    with Pager(pager):
-        # Compute upstream range to detect renames
-        # E.g., if comparing A..B vs C..D, look at A..C for upstream changes
-        upstream_range = compute_upstream_range(refspec1, refspec2)
-        rename_map = {}
-        if upstream_range:
-            rename_map = get_rename_mapping(upstream_range, find_renames, find_copies)
-            if rename_map:
-                err(f"Detected {len(rename_map)} rename(s) in upstream ({upstream_range})")
-
-        # Get list of changed files in both refspecs
-        files1 = get_changed_files(refspec1, paths)
-        files2 = get_changed_files(refspec2, paths)
-
-        # Apply rename mapping to files1
-        # If a file was renamed in upstream, we need to look for it under the new name in refspec2
-        files1_mapped = []
-        for f in files1:
-            if f in rename_map:
-                files1_mapped.append((f, rename_map[f]))  # (old_name, new_name)
+    def compare_options() -> CompareOptions:
+        # Pathspecs are loaded once, and matched against each range's changed files in-process
+        return CompareOptions(
+            ignore_whitespace=ignore_whitespace,
+            unified=unified,
+            find_renames=find_renames,
+            find_copies=find_copies,
+            rules=NO_RULES if no_rules else load_rules(),
+            path_filter=load_path_filter(paths, pathspec_from_file, pathspec_file_nul),
+            large_file_lines=large_file_lines,
+            full=full,
+            triage=triage,
+            unexpected_only=unexpected_only,
+        )
+
+    options = verification = None
+    if notes and not classify:
+        options = compare_options()
+        verification = Verification.open('patch', refspec1, refspec2, options.key())
+        if verification and verification.recorded():
+            err(verification.message())
+            return
+
+    run_memo = None
+    if not no_memo and pathspec_from_file != '-':
+        flags = dict(
+            paths=paths,
+            pathspecs=read_pathspec_file(pathspec_from_file, pathspec_file_nul) if pathspec_from_file else None,
+            ignore_whitespace=ignore_whitespace,
+            unified=unified,
+            find_renames=find_renames,
+            find_copies=find_copies,
+            no_rules=no_rules,
+            large_file_lines=large_file_lines,
+            full=full,
+            classify=classify,
+            triage=triage,
+            unexpected_only=unexpected_only,
+        )
+        run_memo = RunMemo.open('patch', (refspec1, refspec2), flags)
+    patch_run: Optional[PatchRun] = run_memo.load() if run_memo else None
+
+    with output(format, pager, use_color) as out:
+        if patch_run is None:
+            options = options or compare_options()
+            if run_memo and run_memo.resolve((options.key(), classify)):
+                # Another command line (or an older link) may have computed the same comparison
+                patch_run = run_memo.load()
+            if patch_run is None:
+                patch_run = compute_patch(out, options, refspec1, refspec2, classify, quiet, format, not no_progress)
+                if run_memo and run_memo.key:
+                    run_memo.save(patch_run)
             else:
-                files1_mapped.append((f, f))  # (name, name)
-
-        # Build set of all file names to compare
-        all_files_to_compare = []
-        for old_name, new_name in files1_mapped:
-            all_files_to_compare.append((old_name, new_name))
-
-        # Also check files that only appear in files2
-        files1_new_names = {new_name for _, new_name in files1_mapped}
-        for f2 in files2:
-            if f2 not in files1_new_names:
-                all_files_to_compare.append((f2, f2))
-
-        # Fetch all diffs in parallel
-        def fetch_diffs(old_path, new_path):
-            diff1 = get_file_diff(refspec1, old_path, ignore_whitespace, unified, find_renames, find_copies)
-            diff2 = get_file_diff(refspec2, new_path, ignore_whitespace, unified, find_renames, find_copies)
-            return (old_path, new_path), diff1, diff2
-
-        file_diffs = {}
-        with ThreadPoolExecutor(max_workers=8) as executor:
-            futures = {executor.submit(fetch_diffs, old_path, new_path): (old_path, new_path)
-                      for old_path, new_path in all_files_to_compare}
-            for future in as_completed(futures):
-                file_pair, diff1, diff2 = future.result()
-                file_diffs[file_pair] = (diff1, diff2)
-
-        # Process results in order
-        different_files = []
-        for old_path, new_path in all_files_to_compare:
-            diff1, diff2 = file_diffs[(old_path, new_path)]
-
-            # Normalize diffs to ignore index SHAs and map paths
-            norm_diff1 = normalize_diff(diff1, rename_map)
-            norm_diff2 = normalize_diff(diff2)
-
-            if norm_diff1 != norm_diff2:
-                # Display name: show rename if applicable
-                display_name = f"{old_path} → {new_path}" if old_path != new_path else old_path
-                different_files.append(display_name)
-                if not quiet:
-                    echo(style(f"\n{'='*60}", fg='blue') if use_color else f"\n{'='*60}")
-                    echo(style(f"File: {display_name}", fg='yellow', bold=True) if use_color else f"File: {display_name}")
-                    echo(style(f"{'='*60}", fg='blue') if use_color else f"{'='*60}")
-
-                    # Show the diff of diffs for this file
-                    from_label = f'{old_path} in {refspec1}'
-                    to_label = f'{new_path} in {refspec2}'
-                    diff_lines = list(difflib.unified_diff(
-                        diff1.splitlines(),
-                        diff2.splitlines(),
-                        fromfile=from_label,
-                        tofile=to_label,
-                        lineterm=''
-                    ))
-
-                    for line in diff_lines:
-                        if use_color:
-                            # Handle unified diff headers from outer diff first (---, +++, @@)
-                            # These are lines from the outer diff, not nested patterns
-                            if line.startswith('---') and not line.startswith('----'):
-                                # Real outer diff header - red fg
-                                echo(style(line, fg='red'), color=True)
-                                continue
-                            elif line.startswith('+++') and not line.startswith('++++'):
-                                # Real outer diff header - green fg
-                                echo(style(line, fg='green'), color=True)
-                                continue
-                            elif line.startswith('@@') and not (line.startswith('-@@') or line.startswith('+@@') or line.startswith(' @@')):
-                                # Hunk header from outer diff (not nested)
-                                echo(style(line, fg='cyan'), color=True)
-                                continue
-                            elif line.startswith('-@@') or line.startswith('-index ') or line.startswith('-diff ') or line.startswith('----') or line.startswith('-+++'):
-                                # Nested metadata in removed section - red fg only
-                                echo(style(line, fg='red'), color=True)
-                                continue
-                            elif line.startswith('+@@') or line.startswith('+index ') or line.startswith('+diff ') or line.startswith('++++') or line.startswith('+---'):
-                                # Nested metadata in added section - green fg only
-                                echo(style(line, fg='green'), color=True)
-                                continue
-
-                            # Handle nested diff patterns (diff of diffs)
-                            # Use 256-color palette matching Claude's diff colors
-                            # Greens: 28 (brighter #00a858-like), 22 (darker #005e25-like)
-                            # Reds: 161 (brighter #c1536a-like), 88 (darker #852135-like)
-                            # Background determined by FIRST char: + = green, - = red
-                            # First 2 chars get their own bg colors based on symbols
-                            # All lines in the nested diff have outer prefix (+, -, or space)
-                            if len(line) >= 2 and line[0] in '+-':
-                                prefix = line[:2]
-                                rest = line[2:]
-
-                                # Determine prefix backgrounds based on each char
-                                prefix_bg = []
-                                for char in prefix:
-                                    if char == '+':
-                                        prefix_bg.append('28')  # bright green
-                                    elif char == '-':
-                                        prefix_bg.append('161')  # bright red
-                                    else:  # space
-                                        prefix_bg.append('0')  # black/clear
-
-                                # Determine line background based on first char
-                                if line[0] == '+':
-                                    line_bg_bright = '28'
-                                    line_bg_dark = '22'
-                                    line_bg_vdark = '23'
-                                else:  # '-'
-                                    line_bg_bright = '161'
-                                    line_bg_dark = '88'
-                                    line_bg_vdark = '52'
-
-                                if line.startswith('++'):
-                                    # Added line in added section - white on bright green (bold)
-                                    print(f'\033[1;38;5;231;48;5;{prefix_bg[0]}m{prefix[0]}\033[48;5;{prefix_bg[1]}m{prefix[1]}\033[48;5;{line_bg_bright}m{rest}\033[0m')
-                                elif line.startswith('--'):
-                                    # Removed line in removed section - white on bright red (bold)
-                                    print(f'\033[1;38;5;231;48;5;{prefix_bg[0]}m{prefix[0]}\033[48;5;{prefix_bg[1]}m{prefix[1]}\033[48;5;{line_bg_bright}m{rest}\033[0m')
-                                elif line.startswith('+ '):
-                                    # Context line in added section - white on very dark green
-                                    print(f'\033[38;5;231;48;5;{prefix_bg[0]}m{prefix[0]}\033[48;5;{prefix_bg[1]}m{prefix[1]}\033[48;5;{line_bg_vdark}m{rest}\033[0m')
-                                elif line.startswith('- '):
-                                    # Context line in removed section - white on very dark red
-                                    print(f'\033[38;5;231;48;5;{prefix_bg[0]}m{prefix[0]}\033[48;5;{prefix_bg[1]}m{prefix[1]}\033[48;5;{line_bg_vdark}m{rest}\033[0m')
-                                elif line.startswith('+-'):
-                                    # Line in added section (+ first char = green bg)
-                                    print(f'\033[38;5;231;48;5;{prefix_bg[0]}m{prefix[0]}\033[48;5;{prefix_bg[1]}m{prefix[1]}\033[48;5;{line_bg_dark}m{rest}\033[0m')
-                                elif line.startswith('-+'):
-                                    # Line in removed section (- first char = red bg)
-                                    print(f'\033[38;5;231;48;5;{prefix_bg[0]}m{prefix[0]}\033[48;5;{prefix_bg[1]}m{prefix[1]}\033[48;5;{line_bg_dark}m{rest}\033[0m')
-                                elif line.startswith('+'):
-                                    # Any other line in added section (e.g., +diff, +index)
-                                    print(f'\033[38;5;231;48;5;{prefix_bg[0]}m{prefix[0]}\033[48;5;{prefix_bg[1] if len(prefix) > 1 else line_bg_dark}m{prefix[1] if len(prefix) > 1 else ""}\033[48;5;{line_bg_dark}m{rest}\033[0m')
-                                elif line.startswith('-'):
-                                    # Any other line in removed section (e.g., -diff, -index)
-                                    print(f'\033[38;5;231;48;5;{prefix_bg[0]}m{prefix[0]}\033[48;5;{prefix_bg[1] if len(prefix) > 1 else line_bg_dark}m{prefix[1] if len(prefix) > 1 else ""}\033[48;5;{line_bg_dark}m{rest}\033[0m')
-                                else:
-                                    echo(line)
-                            elif line.startswith(' '):
-                                # Context line from outer diff (no color)
-                                echo(line)
-                            else:
-                                echo(line)
-                        else:
-                            echo(line)
-
-        if quiet and different_files:
-            echo(style("\nFiles with different patches:", fg='yellow', bold=True) if use_color else "\nFiles with different patches:")
-            for f in different_files:
-                echo(f"  {f}")
-
-        if not different_files:
-            err("No differences in patches")
+                # Point this command line's link at it
+                run_memo.save()
+                replay_patch(out, patch_run, refspec1, refspec2, quiet, format)
         else:
-            err(f"\n{len(different_files)} file(s) have different patches")
+            replay_patch(out, patch_run, refspec1, refspec2, quiet, format)
+        render_patch(out, patch_run, refspec1, refspec2, quiet, unexpected_only)
+    if verification and not patch_run.moves and not any(result.different for result in patch_run.results):
+        verification.record()
+
+
+def compute_patch(
+    out: Renderer,
+    options: CompareOptions,
+    refspec1: str,
+    refspec2: str,
+    classify: bool,
+    quiet: bool,
+    format: str,
+    progress: bool = True,
+) -> PatchRun:
+    """Run `patch`'s comparison (or classification), streaming machine-readable records as files are decided."""
+    source1 = open_source(refspec1)
+    source2 = open_source(refspec2)
+    # Compute upstream range to detect renames
+    # E.g., if comparing A..B vs C..D, look at A..C for upstream changes
+    rename_map = options.rename_map = upstream_renames(source1, source2, options.find_renames, options.find_copies)
+    patch_run = PatchRun(compute_upstream_range(source1.range, source2.range), len(rename_map))
+    if classify:
+        path_filter = options.path_filter
+        patch_run.classes = classify_files(
+            source1, source2, path_filter.git_pathspecs(), options.ignore_whitespace, options.unified,
+            options.find_renames, options.find_copies, options.rules, rename_map, path_filter,
+        )
+        return patch_run
+
+    tracker = Progress.open(progress)
+    try:
+        comparison = compare_patches(source1, source2, options, cache=warm_cache('diffs'), progress=tracker)
+    except ValueError as e:
+        out.err(f"Error: {e}")
+        sys.exit(1)
+    # Machine-readable records are emitted as soon as each file is decided
+    with tracker:
+        for result in comparison:
+            patch_run.decided.append(result.result)
+            if format == 'jsonl':
+                out.record(result.record(diff=not quiet))
+    patch_run.results = [result.result for result in comparison.results]
+    patch_run.moves = comparison.moves
+    patch_run.triaged = comparison.upstream is not None
+    return patch_run
+
+
+def replay_patch(out: Renderer, patch_run: PatchRun, refspec1: str, refspec2: str, quiet: bool, format: str) -> None:
+    """Emit what `compute_patch` does while computing, for a memoized comparison."""
+    if patch_run.renames:
+        err(renames_message(patch_run.renames, patch_run.upstream_range))
+    if format == 'jsonl':
+        for result in patch_run.decided:
+            out.record(result.record(refspec1, refspec2, diff=not quiet))
+
+
+def render_patch(out: Renderer, patch_run: PatchRun, refspec1: str, refspec2: str, quiet: bool, unexpected_only: bool) -> None:
+    """Render a (computed or memoized) `patch` comparison."""
+    if patch_run.classes is not None:
+        classes = patch_run.classes
+        for file_class in classes:
+            out.record(file_class.record())
+            status = file_class.status
+            if status in STYLES:
+                status = out.span(status, status)
+            out.line(f"{status}\t{file_class.display_name}")
+        counts = Counter(file_class.status for file_class in classes)
+        out.err(", ".join(f"{n} {status}" for status, n in counts.most_common()) or "No changed files")
+        return
+
+    results = list(patch_run.results)
+    moves = patch_run.moves
+    upstream = patch_run.triaged
+    for move in moves:
+        out.record(move_record(move))
+    if upstream:
+        # Files whose differences overlap upstream's changes first (stable, so otherwise in path order)
+        results.sort(key=lambda result: not result.overlapping)
+
+    # Render results in order; only unmatched hunks go into the diff-of-diffs
+    different_files = [result.display_name for result in results if result.different]
+    offset_only_files = sum(result.status == SHIFTED for result in results)
+
+    if not quiet:
+        for result in results:
+            if result.different:
+                render_file_result(out, result, refspec1, refspec2)
+
+    if moves:
+        out.line()
+        out.styled("Hunks moved between files:", 'title')
+        for move in moves:
+            path1 = move.key1[0]
+            path2 = move.key2[1]
+            heading = move.hunk2.heading or move.hunk2.header
+            out.line(f"  {path1} → {path2}: {heading} ({len(move.hunk2.lines)} lines)")
+
+    if quiet and different_files:
+        out.line()
+        out.styled("Files with different patches:", 'title')
+        for f in different_files:
+            out.line(f"  {f}")
+
+    if upstream:
+        tags = Counter(
+            tag for result in results if result.different for side in (1, 2) for tag in result.tags(side) or ()
+        )
+        if unexpected_only:
+            out.err(f"{tags[UNEXPECTED]} unexpected differing hunk(s)")
+        else:
+            out.err(f"{tags[OVERLAP]} differing hunk(s) overlap upstream changes, {tags[UNEXPECTED]} unexpected")
+        n = sum(result.status == UPSTREAM for result in results)
+        if n:
+            out.err(f"{n} file(s) differ only where upstream changed")
+    if moves:
+        out.err(f"{len(moves)} hunk(s) moved between files")
+    if offset_only_files:
+        out.err(f"{offset_only_files} file(s) differ only in hunk offsets or order")
+    if not different_files:
+        out.err("No differences in patches")
+    else:
+        out.err(f"\n{len(different_files)} file(s) have different patches")
 
 
 @cli.command()
@@ -418,61 +573,54 @@ def swatches(color: str) -> None:
         err("Color swatches require color output. Use --color=always")
         return
 
-    echo(style("\ngddp Color Swatches - Diff of Diffs Patterns", fg='yellow', bold=True))
-    echo(style("=" * 50, fg='blue'))
-    echo("\nSimulated diff-of-diffs output showing all 6 patterns:\n")
-
-    # Simulate a diff context
-    echo(style("@@ -10,6 +10,6 @@ def example():", fg='cyan'))
-
-    # ++ pattern
-    prefix = '++'
-    rest = 'version = "2.0.0"  # Added line in added section'
-    print(f'\033[1;38;5;231;48;5;28m{prefix[0]}\033[48;5;28m{prefix[1]}\033[48;5;28m{rest}\033[0m')
-
-    # -- pattern
-    prefix = '--'
-    rest = 'version = "1.0.0"  # Removed line in removed section'
-    print(f'\033[1;38;5;231;48;5;161m{prefix[0]}\033[48;5;161m{prefix[1]}\033[48;5;161m{rest}\033[0m')
-
-    # + (space) pattern
-    prefix = '+ '
-    rest = 'author = "example"  # Context in added section'
-    print(f'\033[38;5;231;48;5;28m{prefix[0]}\033[48;5;0m{prefix[1]}\033[48;5;23m{rest}\033[0m')
-
-    # - (space) pattern
-    prefix = '- '
-    rest = 'license = "MIT"  # Context in removed section'
-    print(f'\033[38;5;231;48;5;161m{prefix[0]}\033[48;5;0m{prefix[1]}\033[48;5;52m{rest}\033[0m')
-
-    # +- pattern
-    prefix = '+-'
-    rest = 'status = "deprecated"  # Line type changed (+- mixed)'
-    print(f'\033[38;5;231;48;5;28m{prefix[0]}\033[48;5;161m{prefix[1]}\033[48;5;22m{rest}\033[0m')
-
-    # -+ pattern
-    prefix = '-+'
-    rest = 'status = "active"  # Line type changed (-+ mixed)'
-    print(f'\033[38;5;231;48;5;161m{prefix[0]}\033[48;5;28m{prefix[1]}\033[48;5;88m{rest}\033[0m')
-
-    echo("\n" + style("Color Key:", fg='yellow', bold=True))
-    echo("  First 2 chars: Individual bg colors per symbol")
-    echo("    + → bright green (28)")
-    echo("    - → bright red (161)")
-    echo("    (space) → black/clear (0)")
-    echo("\n  Rest of line: Background based on first char")
-    echo("    ++ → bright green (28, bold)")
-    echo("    -- → bright red (161, bold)")
-    echo("    + (space) → very dark green (23)")
-    echo("    - (space) → very dark red (52)")
-    echo("    +- → dark green (22)")
-    echo("    -+ → dark red (88)")
-    echo()
+    examples = {
+        '++': 'version = "2.0.0"  # Added line in added section',
+        '--': 'version = "1.0.0"  # Removed line in removed section',
+        '+ ': 'author = "example"  # Context in added section',
+        '- ': 'license = "MIT"  # Context in removed section',
+        '+-': 'status = "deprecated"  # Line type changed (+- mixed)',
+        '-+': 'status = "active"  # Line type changed (-+ mixed)',
+    }
+    color_names = {
+        BRIGHT_GREEN: 'bright green',
+        DARK_GREEN: 'dark green',
+        VDARK_GREEN: 'very dark green',
+        BRIGHT_RED: 'bright red',
+        DARK_RED: 'dark red',
+        VDARK_RED: 'very dark red',
+        CLEAR: 'black/clear',
+    }
+
+    with renderer(use_color) as out:
+        out.line()
+        out.styled("gddp Color Swatches - Diff of Diffs Patterns", 'title')
+        out.styled("=" * 50, 'rule')
+        out.line("\nSimulated diff-of-diffs output showing all 6 patterns:\n")
+
+        # Simulate a diff context
+        out.nested_line("@@ -10,6 +10,6 @@ def example():")
+        for prefix, rest in examples.items():
+            out.nested_line(prefix + rest)
+
+        out.line()
+        out.styled("Color Key:", 'title')
+        out.line("  First 2 chars: Individual bg colors per symbol")
+        for char, bg in (('+', BRIGHT_GREEN), ('-', BRIGHT_RED), ('(space)', CLEAR)):
+            out.line(f"    {char} → {color_names[bg]} ({bg})")
+        out.line("\n  Rest of line: Background based on first char")
+        for prefix, (bold, _, _, bg) in NESTED_STYLES.items():
+            label = prefix.replace(' ', ' (space)')
+            out.line(f"    {label} → {color_names[bg]} ({bg}{', bold' if bold else ''})")
+        out.line()
 
 
 @cli.command()
 @common_opts
 @opt('-U', '--unified', type=int, default=3, help='Number of context lines to show (default: 3)')
+@flag('--remerge', help="Audit conflict resolutions: diff each rebased commit against git's automatic merge of the original")
+@notes_flag
+@no_progress_flag
+@format_opt
 @arg('refspec1')
 @arg('refspec2')
 def commits(
@@ -482,6 +630,11 @@ def commits(
     find_renames: str,
     unified: int,
     ignore_whitespace: bool,
+    no_rules: bool,
+    remerge: bool,
+    notes: bool,
+    no_progress: bool,
+    format: str,
     refspec1: str,
     refspec2: str,
 ) -> None:
@@ -489,72 +642,109 @@ def commits(
 
     First verifies that commits correspond (same count and messages),
     then shows per-commit differences.
+
+    With --remerge, each commit of REFSPEC1 is instead cherry-picked (in memory) onto
+    its counterpart's parent, and only what differs between that automatic merge and
+    the committed result (i.e. what was changed by hand) is shown.
+
+    With --notes, comparisons already verified identical (recorded in
+    refs/notes/didi) are skipped, and new ones are recorded.
+
+    Long comparisons report their progress on stderr (unless --no-progress).
     """
     use_color = should_use_color(color)
-
-    with Pager(pager):
+    rules = NO_RULES if no_rules else load_rules()
+    options = CompareOptions(
+        ignore_whitespace=ignore_whitespace,
+        unified=unified,
+        find_renames=find_renames,
+        find_copies=find_copies,
+        rules=rules,
+    )
+    verification = None
+    if notes and not remerge:
+        verification = Verification.open('commits', refspec1, refspec2, options.key())
+        if verification and verification.recorded():
+            err(verification.message())
+            return
+    # Commits' patches are immutable, so a daemon can cache them by SHA
+    comparison = compare_commits(refspec1, refspec2, options, cache=warm_cache('commits'))
+    pairs = list(comparison)
+    if remerge and not (isinstance(comparison.source1, GitSource) and isinstance(comparison.source2, GitSource)):
+        err("Error: --remerge needs git ranges (not snapshots or patch files)")
+        sys.exit(1)
+
+    with output(format, pager, use_color) as out:
         # Get commit info for both refspecs
-        commits1 = get_commits(refspec1)
-        commits2 = get_commits(refspec2)
+        commits1 = comparison.commits1
+        commits2 = comparison.commits2
 
         if len(commits1) != len(commits2):
-            err(f"Different number of commits: {len(commits1)} in {refspec1}, {len(commits2)} in {refspec2}")
+            out.err(f"Different number of commits: {len(commits1)} in {refspec1}, {len(commits2)} in {refspec2}")
 
         # Compare commit messages
-        echo(style("Comparing commits:", fg='yellow', bold=True) if use_color else "Comparing commits:")
-        for i, (c1, c2) in enumerate(zip(commits1, commits2)):
-            sha1, msg1 = c1.split(' ', 1)
-            sha2, msg2 = c2.split(' ', 1)
-
-            if msg1 == msg2:
-                echo(f"  [{i+1}] ✓ {msg1}")
+        out.styled("Comparing commits:", 'title')
+        for commit in pairs:
+            if commit.subjects_match:
+                out.line(f"  [{commit.index}] ✓ {commit.subject1}")
             else:
-                echo(style(f"  [{i+1}] ✗ Messages differ:", fg='red') if use_color else f"  [{i+1}] ✗ Messages differ:")
-                echo(f"    {refspec1}: {msg1}")
-                echo(f"    {refspec2}: {msg2}")
+                out.styled(f"  [{commit.index}] ✗ Messages differ:", 'error')
+                out.line(f"    {refspec1}: {commit.subject1}")
+                out.line(f"    {refspec2}: {commit.subject2}")
+
+        if remerge:
+            render_remerge_audit(out, comparison, pairs, options)
+            return
 
         # Compare each commit's changes
-        echo(style("\nComparing commit patches:", fg='yellow', bold=True) if use_color else "\nComparing commit patches:")
-
-        for i, (c1, c2) in enumerate(zip(commits1, commits2)):
-            sha1 = c1.split(' ', 1)[0]
-            sha2 = c2.split(' ', 1)[0]
-            msg = c1.split(' ', 1)[1]
-
-            # Get diff for each commit
-            cmd1 = ['git', 'diff']
-            if ignore_whitespace:
-                cmd1.append('-w')
-            cmd1.extend([f'{sha1}^', sha1])
-            diff1 = run(cmd1, capture_output=True, text=True).stdout
-
-            cmd2 = ['git', 'diff']
-            if ignore_whitespace:
-                cmd2.append('-w')
-            cmd2.extend([f'{sha2}^', sha2])
-            diff2 = run(cmd2, capture_output=True, text=True).stdout
-
-            # Normalize to ignore index SHAs
-            norm_diff1 = normalize_diff(diff1)
-            norm_diff2 = normalize_diff(diff2)
-
-            if norm_diff1 != norm_diff2:
-                echo(style(f"\n[{i+1}] {msg} - DIFFERS", fg='red', bold=True) if use_color else f"\n[{i+1}] {msg} - DIFFERS")
-
-                # Show file-by-file differences for this commit
-                files1 = get_changed_files(f'{sha1}^..{sha1}')
-                files2 = get_changed_files(f'{sha2}^..{sha2}')
-                all_files = sorted(set(files1) | set(files2))
-
-                for filepath in all_files:
-                    file_diff1 = get_file_diff(f'{sha1}^..{sha1}', filepath, ignore_whitespace, unified, find_renames, find_copies)
-                    file_diff2 = get_file_diff(f'{sha2}^..{sha2}', filepath, ignore_whitespace, unified, find_renames, find_copies)
-
-                    # Normalize to ignore index SHAs
-                    if normalize_diff(file_diff1) != normalize_diff(file_diff2):
-                        echo(f"    {filepath}: patches differ")
-            else:
-                echo(f"[{i+1}] {msg} - identical")
+        out.line()
+        out.styled("Comparing commit patches:", 'title')
+
+        progress = Progress.open(not no_progress)
+        progress.phase('comparing commits', len(pairs), 'commits')
+        with progress:
+            for commit in pairs:
+                start = perf_counter()
+                msg = commit.subject1
+                if commit.different:
+                    out.line()
+                    out.styled(f"[{commit.index}] {msg} - DIFFERS", 'error_title')
+                    # Show file-by-file differences for this commit
+                    for filepath in commit.files:
+                        out.line(f"    {filepath}: patches differ")
+                else:
+                    out.line(f"[{commit.index}] {msg} - identical")
+                progress.advance(nbytes=len(commit.diff1) + len(commit.diff2))
+                # Records (with their per-file diffs) are only built for the formats that emit them
+                if format in ('jsonl', 'html'):
+                    record = commit.record()
+                    record['timings'] = dict(ms=round((perf_counter() - start) * 1000, 3))
+                    out.record(record)
+
+    if verification and len(comparison.commits1) == len(comparison.commits2) and not any(
+        commit.different or not commit.subjects_match for commit in pairs
+    ):
+        verification.record()
+
+
+def render_remerge_audit(out: Renderer, comparison: CommitsComparison, pairs: list[CommitComparison], options: CompareOptions) -> None:
+    """Render what differs between each rebased commit and git's automatic merge of its original."""
+    out.line()
+    out.styled("Comparing commits against automatic merges:", 'title')
+    audit = RemergeAudit(
+        comparison.source1, comparison.source2,
+        options.ignore_whitespace, options.unified, options.find_renames, options.find_copies,
+        tuple(options.rules.pathspecs()),
+    )
+    for result in audit.run([(pair.index, pair.sha1, pair.sha2, pair.subject2) for pair in pairs]):
+        if result.manual:
+            out.line()
+            out.styled(f"[{result.index}] {result.subject} - {result.summary}", 'error_title')
+            for line in result.diff.splitlines():
+                out.diff_line(line)
+        else:
+            out.line(f"[{result.index}] {result.subject} - {result.summary}")
+        out.record(result.record())
 
 
 if __name__ == '__main__':
@@ -0,0 +1,136 @@
+"""Thin `git-didi` entry point, forwarding commands to a running `git-didi daemon`.
+
+Only the standard library is imported here, so forwarded commands skip importing
+the CLI (and its dependencies) entirely. Without a daemon for the current repo (or
+with `GIT_DIDI_NO_DAEMON=1`), the CLI runs in-process, as usual.
+
+Protocol: the client sends one JSON line (`argv`, `cwd`); the daemon replies with
+frames of `>BI` (channel, length) followed by the payload: channel 1 is stdout, 2 is
+stderr, and 0 carries the exit code (as 4 bytes), ending the response.
+"""
+
+import codecs
+import json
+import os
+import socket
+import struct
+import sys
+from contextlib import nullcontext
+from os.path import exists, join
+from subprocess import run
+from typing import Optional
+
+from .color import should_use_color
+from .gitdir import find_git_dirs
+from .pager import Pager
+
+COMMANDS = ('stat', 'patch', 'commits')
+FRAME = struct.Struct('>BI')
+EXIT, STDOUT, STDERR = 0, 1, 2
+NO_DAEMON_ENV = 'GIT_DIDI_NO_DAEMON'
+
+
+def socket_path() -> Optional[str]:
+    """The daemon socket for the current repo (None outside a repo).
+
+    Found without running git (this runs before every forwardable command), unless
+    `$GIT_DIR` overrides the usual lookup.
+    """
+    if not os.environ.get('GIT_DIR'):
+        dirs = find_git_dirs()
+        return join(dirs[1], 'didi', 'daemon.sock') if dirs else None
+    result = run(['git', 'rev-parse', '--path-format=absolute', '--git-common-dir'], capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+    return join(result.stdout.strip(), 'didi', 'daemon.sock')
+
+
+def send_frame(sock: socket.socket, channel: int, payload: bytes) -> None:
+    sock.sendall(FRAME.pack(channel, len(payload)) + payload)
+
+
+def recv_exactly(sock: socket.socket, n: int) -> bytes:
+    chunks = []
+    while n:
+        chunk = sock.recv(n)
+        if not chunk:
+            raise ConnectionError("daemon closed the connection")
+        chunks.append(chunk)
+        n -= len(chunk)
+    return b''.join(chunks)
+
+
+def option_value(argv: list[str], names: tuple[str, ...], default: str) -> str:
+    """The last value given for an option (`--name X`, `--name=X`, `-nX`), without parsing the whole command line."""
+    value = default
+    args = iter(argv)
+    for arg in args:
+        if arg == '--':
+            break
+        for name in names:
+            if arg == name:
+                value = next(args, value)
+            elif name.startswith('--') and arg.startswith(name + '='):
+                value = arg[len(name) + 1:]
+            elif not name.startswith('--') and arg.startswith(name):
+                value = arg[len(name):]
+    return value
+
+
+def forward(argv: list[str]) -> Optional[int]:
+    """Run a command in this repo's daemon, if one is running; return its exit code.
+
+    Color is resolved against the client's terminal, and paging happens client-side.
+    Returns None (without side effects) if the command should run in-process instead,
+    e.g. when it reads pathspecs from stdin (the daemon can't read the client's).
+    """
+    if os.environ.get(NO_DAEMON_ENV) or not argv or argv[0] not in COMMANDS:
+        return None
+    if option_value(argv[1:], ('--pathspec-from-file',), '') == '-':
+        return None
+    path = socket_path()
+    if not path or not exists(path):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError:
+        # Stale socket: the daemon exited without cleaning up
+        sock.close()
+        return None
+
+    args = argv[1:]
+    use_color = should_use_color(option_value(args, ('-c', '--color'), 'auto'))
+    pager = option_value(args, ('--pager',), 'auto')
+    format = option_value(args, ('--format',), 'text')
+    # Appended options override the user's (click keeps the last value)
+    argv = [*argv, f'--color={"always" if use_color else "never"}', '--pager=never']
+
+    with sock:
+        request = dict(argv=argv, cwd=os.getcwd())
+        sock.sendall(json.dumps(request).encode() + b'\n')
+        decoders = {
+            STDOUT: codecs.getincrementaldecoder('utf-8')('replace'),
+            STDERR: codecs.getincrementaldecoder('utf-8')('replace'),
+        }
+        with Pager(pager) if format == 'text' else nullcontext():
+            while True:
+                channel, length = FRAME.unpack(recv_exactly(sock, FRAME.size))
+                payload = recv_exactly(sock, length)
+                if channel == EXIT:
+                    code, = struct.unpack('>i', payload)
+                    break
+                stream = sys.stdout if channel == STDOUT else sys.stderr
+                stream.write(decoders[channel].decode(payload))
+                stream.flush()
+    return code
+
+
+def main():
+    """Entry point: forward to this repo's `git-didi daemon` if one is running, else run in-process."""
+    code = forward(sys.argv[1:])
+    if code is None:
+        from .cli import cli
+        cli()
+    else:
+        sys.exit(code)
@@ -0,0 +1,340 @@
+"""Browse command: an interactive (curses) file list, comparing each file's patches when it's opened.
+
+The list comes from the fast classification `patch --classify` prints (blob SHAs and
+patch IDs, from a handful of git calls). A file's full diff-of-diffs is only computed
+when it's opened, and then cached; the files around it are compared in a background
+pool meanwhile, so stepping through the list rarely waits. Hunks that moved between
+files need every file's comparison, so they're only reported by `patch`.
+"""
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Lock
+from typing import Dict, Optional
+
+from utz import err
+from utz.cli import arg, opt
+
+from ..classify import FileClass, classify
+from ..compare import DIFFERENT, FileResult, compare_files
+from ..config import NO_RULES, Rules, load_rules
+from ..pathspec import load_path_filter
+from ..render import DIFF_STYLES, NESTED_DEFAULT_STYLES, STYLES, meta_style
+from ..source import Source, open_source
+
+# Files on each side of an opened one to compare in the background
+PREFETCH = 2
+# Milliseconds between redraws while a comparison is pending
+POLL_MS = 100
+HELP = {
+    'list': 'j/k: move  enter: open  q: quit',
+    'file': 'j/k/space/b: scroll  n/p: next/previous file  q: back',
+}
+
+
+def line_style(line: str) -> Optional[str]:
+    """The named style of a diff-of-diffs line (nested lines take their outer char's)."""
+    style = meta_style(line)
+    if style:
+        return style
+    if line[:1] in NESTED_DEFAULT_STYLES:
+        return DIFF_STYLES[line[0]]
+    return DIFF_STYLES.get(line[:1])
+
+
+def detail_lines(result: FileResult, refspec1: str, refspec2: str) -> list[str]:
+    """What's shown for an opened file: its status, then its summary or diff-of-diffs."""
+    lines = [f"{result.status}\t{result.display_name}", '']
+    if result.summary:
+        lines.append(result.summary)
+    elif result.different:
+        lines.extend(result.diff_lines(refspec1, refspec2))
+    else:
+        lines.append(f"No differences ({result.status})")
+    return lines
+
+
+class Browser:
+    """Classified files, and each one's comparison (computed on first request, in a background pool)."""
+
+    def __init__(
+        self,
+        source1: Source,
+        source2: Source,
+        files: list[FileClass],
+        rename_map: Dict[str, str],
+        ignore_whitespace: bool = False,
+        unified: int = 3,
+        find_renames: str = None,
+        find_copies: str = None,
+        rules: Rules = NO_RULES,
+        large_file_lines: int = 50000,
+        prefetch: int = PREFETCH,
+        max_workers: int = 4,
+    ):
+        self.source1 = source1
+        self.source2 = source2
+        self.files = files
+        self.rename_map = rename_map
+        self.ignore_whitespace = ignore_whitespace
+        self.unified = unified
+        self.find_renames = find_renames
+        self.find_copies = find_copies
+        self.rules = rules
+        self.large_file_lines = large_file_lines
+        self.prefetch = prefetch
+        self.pool = ThreadPoolExecutor(max_workers=max_workers)
+        self.results: Dict[int, Future] = {}
+        # Patches are shared between comparisons (a file pair's may be fetched for a neighbor first)
+        self.diff_cache = {}
+        self.lock = Lock()
+
+    def compare(self, index: int) -> FileResult:
+        """Compare one file's patches, from the changes its classification listed (so only its own two patches are fetched)."""
+        file = self.files[index]
+        changes1 = {file.path1: file.change1} if file.change1 else {}
+        changes2 = {file.path2: file.change2} if file.change2 else {}
+        results, _ = compare_files(
+            self.source1, self.source2, (), self.ignore_whitespace, self.unified, self.find_renames,
+            self.find_copies, self.rules, self.rename_map, self.large_file_lines,
+            max_workers=2, diff_cache=self.diff_cache, changes=(changes1, changes2),
+        )
+        result, = results
+        return result
+
+    def result(self, index: int) -> Future:
+        """The (cached) comparison of one file, started if it hasn't been yet."""
+        with self.lock:
+            future = self.results.get(index)
+            if future is None:
+                future = self.results[index] = self.pool.submit(self.compare, index)
+            return future
+
+    def open(self, index: int) -> Future:
+        """One file's comparison, prefetching the files around it."""
+        future = self.result(index)
+        for offset in range(1, self.prefetch + 1):
+            for neighbor in (index + offset, index - offset):
+                if 0 <= neighbor < len(self.files):
+                    self.result(neighbor)
+        return future
+
+    def status(self, index: int) -> str:
+        """A file's status: its comparison's, once done (e.g. "shifted"), else its classification's."""
+        future = self.results.get(index)
+        if future and future.done() and not future.exception():
+            return future.result().status
+        return self.files[index].status
+
+    def close(self) -> None:
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+class Screen:
+    """The curses UI: a file list, and a scrollable view of the opened file.
+
+    `colors` maps `STYLES`' foregrounds to curses colors. curses is imported where
+    it's used, so only `browse` loads it.
+    """
+
+    def __init__(self, stdscr, browser: Browser, refspec1: str, refspec2: str, colors: Dict[str, int]):
+        import curses
+        self.stdscr = stdscr
+        self.browser = browser
+        self.refspec1 = refspec1
+        self.refspec2 = refspec2
+        self.cursor = 0
+        self.top = 0
+        self.opened: Optional[int] = None
+        self.scroll = 0
+        self.attrs = {}
+        if curses.has_colors():
+            curses.use_default_colors()
+            for i, (name, kwargs) in enumerate(STYLES.items(), 1):
+                curses.init_pair(i, colors[kwargs['fg']], -1)
+                self.attrs[name] = curses.color_pair(i) | (curses.A_BOLD if kwargs.get('bold') else 0)
+
+    def attr(self, name: Optional[str]) -> int:
+        return self.attrs.get(name, 0) if name else 0
+
+    def put(self, y: int, text: str, attr: int = 0) -> None:
+        _, width = self.stdscr.getmaxyx()
+        self.stdscr.addnstr(y, 0, text.expandtabs(), width - 1, attr)
+
+    def draw_list(self, height: int) -> None:
+        import curses
+
+        files = self.browser.files
+        self.top = min(max(self.top, self.cursor - height + 1), self.cursor)
+        for y, index in enumerate(range(self.top, min(self.top + height, len(files)))):
+            status = self.browser.status(index)
+            text = f"{status:<10} {files[index].display_name}"
+            attr = curses.A_REVERSE if index == self.cursor else self.attr(status if status in STYLES else None)
+            self.put(y, text, attr)
+
+    def draw_file(self, height: int) -> bool:
+        """Draw the opened file's comparison; returns whether it's still being computed."""
+        future = self.browser.results[self.opened]
+        if not future.done():
+            self.put(0, f"Comparing {self.browser.files[self.opened].display_name}…")
+            return True
+        try:
+            lines = detail_lines(future.result(), self.refspec1, self.refspec2)
+        except Exception as e:
+            lines = [f"Error: {e}"]
+        self.scroll = max(0, min(self.scroll, len(lines) - height))
+        for y, line in enumerate(lines[self.scroll:self.scroll + height]):
+            self.put(y, line, self.attr('title' if y + self.scroll == 0 else line_style(line)))
+        return False
+
+    def draw(self) -> bool:
+        """Redraw the screen; returns whether a comparison is pending (so it should be redrawn soon)."""
+        import curses
+
+        self.stdscr.erase()
+        height, _ = self.stdscr.getmaxyx()
+        height -= 1
+        if self.opened is None:
+            self.draw_list(height)
+            pending = False
+            mode = 'list'
+        else:
+            pending = self.draw_file(height)
+            mode = 'file'
+        files = self.browser.files
+        different = sum(file.status in DIFFERENT for file in files)
+        self.put(height, f"{self.cursor + 1}/{len(files)} ({different} differ)  {HELP[mode]}", curses.A_REVERSE)
+        self.stdscr.refresh()
+        return pending
+
+    def open(self, index: int) -> None:
+        self.cursor = index
+        self.opened = index
+        self.scroll = 0
+        self.browser.open(index)
+
+    def key(self, key: int) -> bool:
+        """Handle one keypress; returns False to quit."""
+        import curses
+
+        height = self.stdscr.getmaxyx()[0] - 1
+        count = len(self.browser.files)
+        ch = chr(key) if 0 <= key < 256 else ''
+        if self.opened is None:
+            if ch == 'q':
+                return False
+            if ch == 'j' or key == curses.KEY_DOWN:
+                self.cursor = min(self.cursor + 1, count - 1)
+            elif ch == 'k' or key == curses.KEY_UP:
+                self.cursor = max(self.cursor - 1, 0)
+            elif key == curses.KEY_NPAGE:
+                self.cursor = min(self.cursor + height, count - 1)
+            elif key == curses.KEY_PPAGE:
+                self.cursor = max(self.cursor - height, 0)
+            elif ch in ('\n', '\r', 'l') or key in (curses.KEY_ENTER, curses.KEY_RIGHT):
+                self.open(self.cursor)
+        else:
+            if ch in ('q', 'h') or key in (27, curses.KEY_LEFT):
+                self.opened = None
+            elif ch == 'j' or key == curses.KEY_DOWN:
+                self.scroll += 1
+            elif ch == 'k' or key == curses.KEY_UP:
+                self.scroll = max(self.scroll - 1, 0)
+            elif ch == ' ' or key == curses.KEY_NPAGE:
+                self.scroll += height
+            elif ch == 'b' or key == curses.KEY_PPAGE:
+                self.scroll = max(self.scroll - height, 0)
+            elif ch == 'n' and self.opened + 1 < count:
+                self.open(self.opened + 1)
+            elif ch == 'p' and self.opened > 0:
+                self.open(self.opened - 1)
+        return True
+
+    def run(self) -> None:
+        import curses
+
+        curses.curs_set(0)
+        self.stdscr.keypad(True)
+        while True:
+            pending = self.draw()
+            # Poll while a comparison is pending, so it's shown as soon as it's done
+            self.stdscr.timeout(POLL_MS if pending else -1)
+            key = self.stdscr.getch()
+            if key != -1 and not self.key(key):
+                break
+
+
+def browse(
+    find_copies: str,
+    find_renames: str,
+    unified: int,
+    large_file_lines: int,
+    pathspec_from_file: str,
+    pathspec_file_nul: bool,
+    ignore_whitespace: bool,
+    no_rules: bool,
+    refspec1: str,
+    refspec2: str,
+    paths: tuple[str, ...],
+) -> None:
+    """Browse files' patch comparisons interactively, comparing each file when it's opened.
+
+    Files are listed with their classification (identical/changed/added/dropped/
+    renamed); opening one shows its diff-of-diffs, computed on demand (while the files
+    around it are compared in the background).
+    """
+    from ..cli import upstream_renames
+
+    rules = NO_RULES if no_rules else load_rules()
+    path_filter = load_path_filter(paths, pathspec_from_file, pathspec_file_nul)
+    source1 = open_source(refspec1)
+    source2 = open_source(refspec2)
+    rename_map = upstream_renames(source1, source2, find_renames, find_copies)
+    files = classify(
+        source1, source2, path_filter.git_pathspecs(), ignore_whitespace, unified,
+        find_renames, find_copies, rules, rename_map, path_filter,
+    )
+    if not files:
+        err("No changed files")
+        return
+    browser = Browser(
+        source1, source2, files, rename_map, ignore_whitespace, unified,
+        find_renames, find_copies, rules, large_file_lines,
+    )
+    import curses
+    # curses colors of `STYLES`' foregrounds
+    colors = {
+        'green': curses.COLOR_GREEN,
+        'red': curses.COLOR_RED,
+        'cyan': curses.COLOR_CYAN,
+        'blue': curses.COLOR_BLUE,
+        'yellow': curses.COLOR_YELLOW,
+    }
+    try:
+        curses.wrapper(lambda stdscr: Screen(stdscr, browser, refspec1, refspec2, colors).run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        browser.close()
+
+
+def register(cli):
+    """Register command with CLI."""
+    # Imported here: `cli` registers subcommands while it's still being initialized
+    from ..cli import find_copies_opt, find_renames_opt, ignore_whitespace_flag, no_rules_flag, pathspec_opts
+
+    decorators = [
+        find_copies_opt,
+        find_renames_opt,
+        opt('-U', '--unified', type=int, default=3, help='Number of context lines to show (default: 3)'),
+        opt('--large-file-lines', type=int, default=50000, help='Compare files changing more lines than this by hunk hashes only (default: 50000)'),
+        pathspec_opts,
+        ignore_whitespace_flag,
+        no_rules_flag,
+        arg('refspec1'),
+        arg('refspec2'),
+        arg('paths', nargs=-1),
+    ]
+    command = browse
+    for decorator in reversed(decorators):
+        command = decorator(command)
+    cli.command(name='browse')(command)
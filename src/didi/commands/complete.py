@@ -0,0 +1,41 @@
+"""Complete command: the cached ref and reflog listings behind shell completion."""
+
+import sys
+
+from click import Choice
+from utz import err
+from utz.cli import arg, flag, opt
+
+from ..completion import MAX_REFLOG_ENTRIES, ensure_cache, git_common_dir, refresh
+
+
+def complete(refresh_cache: bool, max_reflog: int, listing: str | None) -> None:
+    """Print cached refs or reflog entries, refreshing the cache if refs changed.
+
+    Used by the completion functions from `git-didi shell-integration`, which read the
+    cache directly while it's fresh.
+    """
+    common_dir = git_common_dir()
+    if common_dir is None:
+        err("Error: not in a git repository")
+        exit(1)
+    if refresh_cache:
+        directory = refresh(common_dir, max_reflog)
+    else:
+        directory = ensure_cache(common_dir, max_reflog)
+    if listing:
+        with open(f'{directory}/{listing}') as f:
+            sys.stdout.write(f.read())
+
+
+def register(cli):
+    """Register command with CLI."""
+    cli.command(name='complete', hidden=True)(
+        flag('--refresh', 'refresh_cache', help='Rewrite the cache, even if it looks fresh')(
+            opt('--max-reflog', type=int, default=MAX_REFLOG_ENTRIES, help=f'Reflog entries to cache per ref (default: {MAX_REFLOG_ENTRIES})')(
+                arg('listing', type=Choice(['refs', 'reflog']), required=False)(
+                    complete
+                )
+            )
+        )
+    )
@@ -0,0 +1,39 @@
+"""Daemon command: serve `stat`/`patch`/`commits` for this repo with warm caches."""
+
+from utz import err
+from utz.cli import flag
+
+from ..client import socket_path
+from ..daemon import serve, stop as stop_daemon
+
+
+def daemon(stop: bool) -> None:
+    """Run a per-repo daemon that the CLI forwards `stat`/`patch`/`commits` to.
+
+    Caches (upstream renames, per-file and per-commit patches) stay warm across
+    requests. Commands run in-process as usual when no daemon is running, or when
+    GIT_DIDI_NO_DAEMON is set.
+
+    Usage:
+        git-didi daemon &        # start (runs in the foreground)
+        git-didi daemon --stop   # stop
+    """
+    path = socket_path()
+    if not path:
+        err("Error: not in a git repository")
+        exit(1)
+    if stop:
+        if not stop_daemon(path):
+            err(f"No daemon running on {path}")
+            exit(1)
+        return
+    serve(path)
+
+
+def register(cli):
+    """Register command with CLI."""
+    cli.command(name='daemon')(
+        flag('--stop', help='Stop the running daemon')(
+            daemon
+        )
+    )
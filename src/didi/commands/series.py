@@ -0,0 +1,110 @@
+"""Series command: compare N revisions of a patch series at once."""
+
+from itertools import combinations
+
+from utz import err
+from utz.cli import arg, flag, opt
+
+from ..color import should_use_color
+from ..config import NO_RULES, load_rules
+from ..pathspec import load_path_filter
+from ..series import ABSENT, load_revisions, matrix, pair_results
+
+
+def series(
+    color: str,
+    pager: str,
+    find_copies: str,
+    find_renames: str,
+    unified: int,
+    commits: bool,
+    show_all: bool,
+    pair: tuple[int, int],
+    path: tuple[str, ...],
+    pathspec_from_file: str,
+    pathspec_file_nul: bool,
+    ignore_whitespace: bool,
+    no_rules: bool,
+    refspecs: tuple[str, ...],
+) -> None:
+    """Compare N revisions of a patch series (e.g. v1 vs v2 vs v3).
+
+    Each range's patches are fetched and fingerprinted once. Prints a matrix with one
+    row per file (or commit, with --commits) and one column per revision; equal
+    letters mean equal patches, and "·" means absent. With --pair I J, also shows the
+    diff-of-diffs between revisions I and J (1-based).
+
+    Example: git-didi series main..v1 main..v2 main..v3 --pair 2 3
+    """
+    from ..cli import output, render_file_result
+
+    if len(refspecs) < 2:
+        err("Error: series needs at least 2 refspecs")
+        exit(1)
+    if pair and not all(1 <= i <= len(refspecs) for i in pair):
+        err(f"Error: --pair indices must be between 1 and {len(refspecs)}")
+        exit(1)
+
+    use_color = should_use_color(color)
+    rules = NO_RULES if no_rules else load_rules()
+    path_filter = load_path_filter(path, pathspec_from_file, pathspec_file_nul)
+    revisions = load_revisions(
+        list(refspecs), path_filter.git_pathspecs(), ignore_whitespace, unified,
+        find_renames, find_copies, rules, path_filter, commits,
+    )
+
+    with output('text', pager, use_color) as out:
+        for i, revision in enumerate(revisions, 1):
+            out.styled(f"{i}: {revision.refspec}", 'title')
+        out.line()
+
+        if commits:
+            rows = matrix([revision.commits for revision in revisions])
+            names = {key: key[0] if key[1] == 1 else f"{key[0]} ({key[1]})" for key, _ in rows}
+        else:
+            rows = matrix([revision.fingerprints for revision in revisions])
+            names = {key: key for key, _ in rows}
+        shown = 0
+        for key, cells in rows:
+            if not show_all and ABSENT not in cells and len(set(cells)) == 1:
+                continue
+            shown += 1
+            cells = ''.join(
+                c if c == cells[0] else out.span(c, 'dropped' if c == ABSENT else 'changed')
+                for c in cells
+            )
+            out.line(f"{cells}  {names[key]}")
+
+        # Pairwise counts, from the same fingerprints
+        for i, j in combinations(range(len(revisions)), 2):
+            n = sum(cells[i] != cells[j] for _, cells in rows)
+            out.err(f"{i + 1} vs {j + 1}: {n} {'commit' if commits else 'file'}(s) differ")
+        if not shown:
+            out.err(f"No differences between {len(revisions)} revisions")
+
+        if pair:
+            i, j = pair
+            rev1, rev2 = revisions[i - 1], revisions[j - 1]
+            for result in pair_results(rev1, rev2, rules):
+                render_file_result(out, result, rev1.refspec, rev2.refspec)
+
+
+def register(cli):
+    """Register command with CLI."""
+    # Imported here: `cli` registers subcommands while it's still being initialized
+    from ..cli import common_opts, pathspec_opts
+
+    decorators = [
+        common_opts,
+        opt('-U', '--unified', type=int, default=3, help='Number of context lines to show (default: 3)'),
+        flag('--commits', help='Compare commits (matched by subject) instead of files'),
+        flag('-a', '--all', 'show_all', help='Also show rows that are identical in every revision'),
+        opt('--pair', type=int, nargs=2, metavar='I J', help='Show the diff-of-diffs between revisions I and J (1-based)'),
+        opt('--path', multiple=True, help='Only compare files matching this pathspec (repeatable)'),
+        pathspec_opts,
+        arg('refspecs', nargs=-1, required=True),
+    ]
+    command = series
+    for decorator in reversed(decorators):
+        command = decorator(command)
+    cli.command(name='series')(command)
@@ -9,7 +9,7 @@ from utz.cli import arg
 
 
 def shell_integration(shell: str | None) -> None:
-    """Output shell aliases for git-didi commands.
+    """Output shell aliases and completion functions for git-didi commands.
 
     Usage:
         # Bash/Zsh: Add to your ~/.bashrc or ~/.zshrc:
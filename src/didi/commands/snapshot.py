@@ -0,0 +1,53 @@
+"""Snapshot command: store a range's patches in a file, for later comparison."""
+
+from utz import err
+from utz.cli import arg, flag, opt
+
+from ..snapshot import write_snapshot
+
+
+def snapshot(
+    find_copies: str,
+    find_renames: str,
+    ignore_whitespace: bool,
+    unified: int,
+    output: str,
+    no_commits: bool,
+    refspec: str,
+) -> None:
+    """Store a range's per-file and per-commit patches in a compact snapshot file.
+
+    The snapshot can be passed to `stat`, `patch` and `commits` in place of a
+    refspec, e.g. to compare a rebased branch against its pre-rebase state after the
+    old commits are gone. Patches are stored with the diff options given here.
+
+    Example: git-didi snapshot main..feature -o feature-v1.didi
+    """
+    stats = write_snapshot(
+        refspec, output, ignore_whitespace, unified, find_renames, find_copies,
+        commits=not no_commits,
+    )
+    err(
+        f"Wrote {output}: {stats['files']} file(s), {stats['commits']} commit(s), "
+        f"{stats['blobs']} distinct patch(es), {stats['bytes']} bytes"
+    )
+
+
+def register(cli):
+    """Register command with CLI."""
+    # Imported here: `cli` registers subcommands while it's still being initialized
+    from ..cli import find_copies_opt, find_renames_opt, ignore_whitespace_flag
+
+    decorators = [
+        find_copies_opt,
+        find_renames_opt,
+        ignore_whitespace_flag,
+        opt('-U', '--unified', type=int, default=3, help='Number of context lines to store (default: 3)'),
+        opt('-o', '--output', required=True, metavar='FILE', help='Snapshot file to write'),
+        flag('--no-commits', help="Only store per-file patches, not each commit's"),
+        arg('refspec'),
+    ]
+    command = snapshot
+    for decorator in reversed(decorators):
+        command = decorator(command)
+    cli.command(name='snapshot')(command)
@@ -0,0 +1,217 @@
+"""Watch command: re-compare two ranges whenever the repository's refs or index change."""
+
+import os
+from os.path import join
+from subprocess import run
+from time import perf_counter, sleep, strftime
+from typing import Dict, Optional
+
+from utz import err
+from utz.cli import arg, flag, opt
+
+from ..color import should_use_color
+from ..compare import DIFFERENT, FileResult, compare_files
+from ..config import NO_RULES, load_rules
+from ..diff import compute_upstream_range, get_rename_mapping
+from ..render import STYLES, Renderer, renderer
+
+
+def repo_dirs() -> tuple[str, str, str]:
+    """Return the (per-worktree) git dir, the common git dir, and the worktree's top level."""
+    result = run(
+        ['git', 'rev-parse', '--path-format=absolute', '--git-dir', '--git-common-dir', '--show-toplevel'],
+        capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        err(f"Error: not in a git repository: {result.stderr}")
+        exit(1)
+    git_dir, common_dir, toplevel = result.stdout.splitlines()
+    return git_dir, common_dir, toplevel
+
+
+def watched_paths(git_dir: str, common_dir: str) -> list[str]:
+    """Files and directories whose mtimes change when HEAD, a ref, or the index is updated.
+
+    Ref updates are written to a lock file and renamed into place, so watching the
+    directories under `refs/` (rather than every ref file) catches them.
+    """
+    paths = [
+        join(git_dir, 'HEAD'),
+        join(git_dir, 'index'),
+        join(git_dir, 'rebase-merge'),
+        join(git_dir, 'rebase-apply'),
+        join(common_dir, 'packed-refs'),
+    ]
+    for root, _, _ in os.walk(join(common_dir, 'refs')):
+        paths.append(root)
+    return paths
+
+
+def mtimes(paths: list[str]) -> tuple[Optional[int], ...]:
+    """Modification times of `paths` (None for missing paths)."""
+    stamps = []
+    for path in paths:
+        try:
+            stamps.append(os.stat(path).st_mtime_ns)
+        except FileNotFoundError:
+            stamps.append(None)
+    return tuple(stamps)
+
+
+def worktree_state(toplevel: str, shown_paths: set[str]) -> tuple:
+    """What changes when a worktree file is edited: modified tracked files (`git ls-files -m`), and their mtimes.
+
+    Worktree files have no blob SHAs, and edits don't touch the index, so files already
+    shown (`shown_paths`) and files newly modified are stat'ed on each check.
+    """
+    result = run(['git', 'ls-files', '-m', '-z'], cwd=toplevel, capture_output=True, text=True)
+    modified = set(filter(None, result.stdout.split('\0'))) if result.returncode == 0 else set()
+    paths = sorted(shown_paths | modified)
+    return (tuple(paths), *mtimes([join(toplevel, path) for path in paths]))
+
+
+def worktree_refspec(refspec: str) -> str:
+    """Replace a range's tip with the worktree: `A..B` → `A`, `A...B` → A and B's merge base (as `git diff A...B` does)."""
+    base, sep, tip = refspec.partition('..')
+    if not sep:
+        return refspec
+    base = base or 'HEAD'
+    if not tip.startswith('.'):
+        return base
+    result = run(['git', 'merge-base', base, tip[1:] or 'HEAD'], capture_output=True, text=True)
+    if result.returncode != 0:
+        err(f"Error: no merge base for {refspec}: {result.stderr}")
+        exit(1)
+    return result.stdout.strip()
+
+
+def prune_diff_cache(diff_cache: dict, results: list[FileResult]) -> None:
+    """Drop cached patches of blob pairs the latest results no longer have (e.g. commits rewritten by a rebase).
+
+    `compare_files` keys patches by (path, old path, blob pair, *diff options).
+    """
+    current = {
+        (path, change.old_path, change.blobs)
+        for result in results
+        for path, change in ((result.path1, result.change1), (result.path2, result.change2))
+        if change is not None
+    }
+    for key in [key for key in diff_cache if key[:3] not in current]:
+        del diff_cache[key]
+
+
+def render_updates(
+    out: Renderer,
+    results: list[FileResult],
+    shown: Dict[tuple[str, str], tuple[str, str]],
+) -> None:
+    """Print a line for each file whose status changed since the last evaluation.
+
+    `shown` maps each file's path pair to its last (status, display name), and is
+    updated in place. Files that start out matching aren't announced.
+    """
+    stamp = strftime('%H:%M:%S')
+    current = {(result.path1, result.path2): (result.status, result.display_name) for result in results}
+    for pair, (status, name) in current.items():
+        last = shown.get(pair)
+        shown[pair] = (status, name)
+        if (last is None and status not in DIFFERENT) or (last and last[0] == status):
+            continue
+        label = out.span(status, status) if status in STYLES else status
+        out.line(f"{stamp}\t{label}\t{name}")
+    for pair in [pair for pair in shown if pair not in current]:
+        _, name = shown.pop(pair)
+        out.line(f"{stamp}\tgone\t{name}")
+
+
+def watch(
+    color: str,
+    find_copies: str,
+    find_renames: str,
+    unified: int,
+    interval: float,
+    worktree: bool,
+    once: bool,
+    ignore_whitespace: bool,
+    no_rules: bool,
+    refspec1: str,
+    refspec2: str,
+    paths: tuple[str, ...],
+) -> None:
+    """Re-compare patches whenever HEAD, refs or the index change (e.g. during `git rebase -i`).
+
+    Refs are re-resolved on each change; patches are only re-fetched for files whose
+    blob pairs changed since the last evaluation (only the latest patches are kept).
+    Each evaluation prints one line per file whose status changed.
+
+    With --worktree, the second range's tip is replaced by the working tree, so
+    conflict resolutions are compared before they're committed. Edits to any tracked
+    file then trigger a re-comparison too.
+    """
+    use_color = should_use_color(color)
+    rules = NO_RULES if no_rules else load_rules()
+    git_dir, common_dir, toplevel = repo_dirs()
+
+    # Upstream renames are looked up from the ranges as given, before the worktree swap
+    upstream_range = compute_upstream_range(refspec1, refspec2)
+    if worktree:
+        refspec2 = worktree_refspec(refspec2)
+
+    diff_cache = {}
+    shown = {}
+    last_state = None
+
+    def current_worktree_state() -> tuple:
+        return worktree_state(toplevel, {path2 for _, path2 in shown}) if worktree else ()
+
+    with renderer(use_color) as out:
+        try:
+            while True:
+                git_state = mtimes(watched_paths(git_dir, common_dir))
+                if git_state + current_worktree_state() != last_state:
+                    start = perf_counter()
+                    cached = len(diff_cache)
+                    rename_map = get_rename_mapping(upstream_range, find_renames, find_copies) if upstream_range else {}
+                    results, _ = compare_files(
+                        refspec1, refspec2, paths, ignore_whitespace, unified, find_renames, find_copies,
+                        rules, rename_map, diff_cache=diff_cache,
+                    )
+                    render_updates(out, results, shown)
+                    different = sum(result.different for result in results)
+                    ms = (perf_counter() - start) * 1000
+                    out.err(
+                        f"{strftime('%H:%M:%S')}\t{different} of {len(results)} file(s) have different patches"
+                        f" ({len(diff_cache) - cached} patch(es) fetched, {ms:.0f}ms)"
+                    )
+                    prune_diff_cache(diff_cache, results)
+                    last_state = git_state + current_worktree_state()
+                if once:
+                    break
+                sleep(interval)
+        except KeyboardInterrupt:
+            pass
+
+
+def register(cli):
+    """Register command with CLI."""
+    # Imported here: `cli` registers subcommands while it's still being initialized
+    from ..cli import color_opt, find_copies_opt, find_renames_opt, ignore_whitespace_flag, no_rules_flag
+
+    decorators = [
+        color_opt,
+        find_copies_opt,
+        find_renames_opt,
+        opt('-U', '--unified', type=int, default=3, help='Number of context lines to show (default: 3)'),
+        opt('-n', '--interval', type=float, default=1.0, help='Seconds between checks for ref/index changes (default: 1)'),
+        flag('-W', '--worktree', help="Compare against the working tree instead of the second range's tip"),
+        flag('--once', help='Evaluate once and exit (useful for scripting and testing)'),
+        ignore_whitespace_flag,
+        no_rules_flag,
+        arg('refspec1'),
+        arg('refspec2'),
+        arg('paths', nargs=-1),
+    ]
+    command = watch
+    for decorator in reversed(decorators):
+        command = decorator(command)
+    cli.command(name='watch')(command)
@@ -0,0 +1,426 @@
+"""File-by-file comparison of two ranges' patches (the engine behind `git-didi patch`)."""
+
+import difflib
+from concurrent.futures import Executor, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from time import perf_counter
+from typing import Callable, Dict, Generator, MutableMapping, Optional, Union
+
+from .config import NO_RULES, Rules
+from .diff import NULL_SHA, FileChange, normalize_diff
+from .hunks import (
+    Hunk,
+    Move,
+    find_moved_hunks,
+    first_differing_hunk,
+    format_hunks,
+    iter_hunk_digests,
+    match_hunks,
+    parse_hunks,
+    patch_id,
+)
+from .pathspec import ALL_PATHS, PathFilter
+from .progress import NO_PROGRESS, Progress
+from .source import Source, open_source
+from .upstream import OVERLAP, UNEXPECTED, UpstreamIndex
+
+IDENTICAL = 'identical'
+SHIFTED = 'shifted'
+MOVED = 'moved'
+CHANGED = 'changed'
+ADDED = 'added'
+DROPPED = 'dropped'
+UPSTREAM = 'upstream'
+
+# Statuses for which `patch` reports a file as having a different patch
+DIFFERENT = (CHANGED, ADDED, DROPPED)
+
+
+def move_record(move: Move) -> dict:
+    """JSON-serializable form of a hunk that moved between files."""
+    return dict(
+        type='move',
+        path1=move.key1[0],
+        path2=move.key2[1],
+        heading=move.hunk2.heading,
+        lines=len(move.hunk2.lines),
+    )
+
+
+@dataclass
+class FileResult:
+    """How one file's patch compares between two ranges.
+
+    `status` is one of:
+    - "identical": normalized patches are equal
+    - "shifted": all hunks match, but at different offsets or in a different order
+    - "moved": the remaining hunks all moved to (or from) other files
+    - "changed", "added" (only in the second range), "dropped" (only in the first range)
+    - "upstream": with `unexpected_only`, every remaining difference overlaps upstream changes
+
+    `summary` describes binary and large files, which are compared without fetching
+    their full patches; for other files, `header*`/`unmatched*` hold the normalized
+    file headers and the hunks without a counterpart on the other side. When compared
+    with an `UpstreamIndex`, `overlap*` flag which unmatched hunks overlap upstream's
+    changes.
+    """
+    path1: str
+    path2: str
+    status: str = IDENTICAL
+    change1: Optional[FileChange] = None
+    change2: Optional[FileChange] = None
+    summary: Optional[str] = None
+    header1: list[str] = field(default_factory=list)
+    unmatched1: list[Hunk] = field(default_factory=list)
+    header2: list[str] = field(default_factory=list)
+    unmatched2: list[Hunk] = field(default_factory=list)
+    patch_id1: Optional[str] = None
+    patch_id2: Optional[str] = None
+    overlap1: Optional[list[bool]] = None
+    overlap2: Optional[list[bool]] = None
+    timings: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def display_name(self) -> str:
+        """The file's path, showing an upstream rename if applicable."""
+        return f"{self.path1} → {self.path2}" if self.path1 != self.path2 else self.path1
+
+    @property
+    def different(self) -> bool:
+        return self.status in DIFFERENT
+
+    @property
+    def overlapping(self) -> bool:
+        """Whether any unmatched hunk overlaps upstream's changes."""
+        return any(self.overlap1 or ()) or any(self.overlap2 or ())
+
+    def tags(self, side: int) -> Optional[list[str]]:
+        """Per-hunk triage tags of one side's unmatched hunks (None if not triaged)."""
+        overlap = self.overlap1 if side == 1 else self.overlap2
+        if overlap is None:
+            return None
+        return [OVERLAP if o else UNEXPECTED for o in overlap]
+
+    def record(self, refspec1: str, refspec2: str, diff: bool = True) -> dict:
+        """JSON-serializable form of this result; `diff` includes the diff-of-diffs lines."""
+        record = dict(
+            type='file',
+            path1=self.path1 if self.change1 else None,
+            path2=self.path2 if self.change2 else None,
+            renamed=self.path1 != self.path2,
+            status=self.status,
+            blobs1=list(self.change1.blobs) if self.change1 else None,
+            blobs2=list(self.change2.blobs) if self.change2 else None,
+            patch_id1=self.patch_id1,
+            patch_id2=self.patch_id2,
+        )
+        if self.summary:
+            record['summary'] = self.summary
+        if self.overlap1 is not None:
+            record['hunks1'] = self.tags(1)
+            record['hunks2'] = self.tags(2)
+        if diff and self.different:
+            record['diff'] = self.diff_lines(refspec1, refspec2)
+        record['timings'] = {k: round(v, 3) for k, v in self.timings.items()}
+        return record
+
+    def diff_lines(self, refspec1: str, refspec2: str) -> list[str]:
+        """The diff-of-diffs of this file's unmatched hunks."""
+        if self.summary is not None:
+            return []
+        return list(difflib.unified_diff(
+            format_hunks(self.header1, self.unmatched1, self.tags(1)),
+            format_hunks(self.header2, self.unmatched2, self.tags(2)),
+            fromfile=f'{self.path1} in {refspec1}',
+            tofile=f'{self.path2} in {refspec2}',
+            lineterm='',
+        ))
+
+
+def pair_files(
+    files1: list[str],
+    files2: list[str],
+    rename_map: Dict[str, str],
+) -> list[tuple[str, str]]:
+    """Pair up files changed in each range, looking for upstream-renamed files under their new names."""
+    # If a file was renamed in upstream, we need to look for it under the new name in refspec2
+    pairs = [(f, rename_map.get(f, f)) for f in files1]
+    # Also check files that only appear in files2
+    files1_new_names = {new_name for _, new_name in pairs}
+    pairs.extend((f2, f2) for f2 in files2 if f2 not in files1_new_names)
+    return pairs
+
+
+def iter_compare_files(
+    refspec1: Union[str, Source],
+    refspec2: Union[str, Source],
+    paths: tuple[str, ...] = (),
+    ignore_whitespace: bool = False,
+    unified: int = 3,
+    find_renames: str = None,
+    find_copies: str = None,
+    rules: Rules = NO_RULES,
+    rename_map: Dict[str, str] = None,
+    large_file_lines: int = 50000,
+    full: bool = False,
+    max_workers: int = 8,
+    diff_cache: MutableMapping = None,
+    path_filter: PathFilter = ALL_PATHS,
+    upstream: Optional[UpstreamIndex] = None,
+    unexpected_only: bool = False,
+    executor: Optional[Executor] = None,
+    progress: Progress = NO_PROGRESS,
+    changes: Optional[tuple[Dict[str, FileChange], Dict[str, FileChange]]] = None,
+) -> Generator[FileResult, None, tuple[list[FileResult], list[Move]]]:
+    """Compare each changed file's patch between two refspecs, yielding results as they're decided.
+
+    Most files are yielded as soon as their patches are fetched and compared; files
+    with unmatched hunks after the cross-file move detection. Files with the same
+    change (blob pair, modes and old path) in both ranges are identical, and are
+    yielded first, without fetching their patches. The generator returns
+    one result per file (in git's path order) and the hunks that moved between files.
+    Patches are fetched in `executor` (or a pool of `max_workers` threads); closing the
+    generator early cancels fetches that haven't started.
+
+    `diff_cache` (if given) holds per-file patches keyed by path and blob pair, so
+    repeated comparisons (e.g. `git-didi watch`) only fetch patches whose blobs changed.
+    `path_filter` selects files in-process, after `paths` are passed to git. Either
+    side may be a snapshot file (see `didi.snapshot`) instead of a refspec.
+
+    With `upstream`, unmatched hunks are flagged by whether they overlap upstream's
+    changes. `unexpected_only` (which requires `upstream`) decides files upstream
+    never touched by blob equality alone, and drops hunks that overlap upstream.
+
+    `progress` counts files decided, bytes of patches read, and git processes running.
+    `changes` (if given) are both ranges' changed files, as `Source.changes` lists them
+    (e.g. from an earlier `classify`), so they aren't listed again.
+    """
+    rename_map = rename_map or {}
+    source1 = open_source(refspec1)
+    source2 = open_source(refspec2)
+
+    # Get changed files (with blob SHAs and line counts) in both refspecs
+    # Excluded files are dropped here, before any per-file diff is fetched
+    pathspecs = (*paths, *rules.pathspecs())
+    if changes is None:
+        progress.phase('listing changed files')
+        changes = (
+            source1.changes(pathspecs, find_renames, find_copies),
+            source2.changes(pathspecs, find_renames, find_copies),
+        )
+    changes1, changes2 = changes
+    pairs = pair_files(
+        path_filter.filter(rules.filter(changes1)),
+        path_filter.filter(rules.filter(changes2)),
+        rename_map,
+    )
+
+    def diff_args(path):
+        return path, ignore_whitespace, unified, find_renames, find_copies
+
+    # A file's patch is determined by its blob pair (worktree files have no blob SHA yet);
+    # files not changed in a range have an empty patch there
+    def file_diff(source: Source, path: str, change: Optional[FileChange]) -> str:
+        if change is None:
+            return ''
+        if diff_cache is None or change.worktree:
+            with progress.git():
+                return source.file_diff(*diff_args(path))
+        key = (path, change.old_path, change.blobs, ignore_whitespace, unified, find_renames, find_copies)
+        diff = diff_cache.get(key)
+        if diff is None:
+            with progress.git():
+                diff = diff_cache[key] = source.file_diff(*diff_args(path))
+        return diff
+
+    # Binary and large files are compared without fetching their full patches
+    def summarize(result: FileResult) -> None:
+        change1, change2 = result.change1, result.change2
+        if (
+            change1 and change2 and change1.binary and change2.binary
+            and NULL_SHA not in change1.blobs + change2.blobs
+        ):
+            if change1.blobs != change2.blobs:
+                result.summary = (
+                    f"Binary file differs: {change1.old_blob[:10]}..{change1.new_blob[:10]}"
+                    f" vs {change2.old_blob[:10]}..{change2.new_blob[:10]}"
+                )
+            else:
+                result.summary = ''
+            return
+        size = max(change1.size if change1 else 0, change2.size if change2 else 0)
+        if full or size <= large_file_lines:
+            return
+        hunk = first_differing_hunk(
+            iter_hunk_digests(source1.stream_file_diff(*diff_args(result.path1)), rename_map, rules),
+            iter_hunk_digests(source2.stream_file_diff(*diff_args(result.path2)), rules=rules),
+        )
+        if hunk is None:
+            result.summary = ''
+        else:
+            where = "file header" if hunk == 0 else f"hunk {hunk}"
+            result.summary = f"Large file ({size} changed lines) differs at {where}; use --full for the diff-of-diffs"
+
+    # Patches of files upstream never touched can only differ if their blobs do
+    def untouched_identical(result: FileResult) -> bool:
+        change1, change2 = result.change1, result.change2
+        return (
+            unexpected_only and change1 is not None and change2 is not None
+            and not change1.worktree and not change2.worktree
+            and change1.blobs == change2.blobs
+            and not upstream.touches(result.path1, result.path2)
+        )
+
+    # The same change (blob pair, modes and old path) on both sides can only produce the same patch
+    def same_change(result: FileResult) -> bool:
+        change1, change2 = result.change1, result.change2
+        return (
+            change1 is not None and change2 is not None
+            and not change1.worktree and not change2.worktree
+            and change1.old_mode is not None and change2.old_mode is not None
+            and (change1.blobs, change1.old_mode, change1.new_mode, change1.status)
+            == (change2.blobs, change2.old_mode, change2.new_mode, change2.status)
+            and rename_map.get(change1.old_path, change1.old_path) == change2.old_path
+        )
+
+    # Fetch diffs (or summaries) in parallel
+    def fetch(result: FileResult):
+        start = perf_counter()
+        if untouched_identical(result):
+            result.summary = ''
+        else:
+            summarize(result)
+        if result.summary is None:
+            diffs = (
+                file_diff(source1, result.path1, result.change1),
+                file_diff(source2, result.path2, result.change2),
+            )
+            progress.read(len(diffs[0]) + len(diffs[1]))
+        else:
+            diffs = None
+        result.timings['fetch_ms'] = (perf_counter() - start) * 1000
+        return result, diffs
+
+    # Compare hunks by body digest, ignoring line offsets and hunk order. Returns
+    # whether the file's status is final, or depends on cross-file move detection.
+    def compare(result: FileResult, diffs) -> bool:
+        start = perf_counter()
+        try:
+            if result.change1 is None:
+                result.status = ADDED
+            elif result.change2 is None:
+                result.status = DROPPED
+            if diffs is None:
+                if result.summary and result.status == IDENTICAL:
+                    result.status = CHANGED
+                return True
+
+            diff1, diff2 = diffs
+            # Normalize diffs to ignore index SHAs and map paths
+            if normalize_diff(diff1, rename_map, rules) == normalize_diff(diff2, rules=rules):
+                return True
+
+            result.header1, hunks1 = parse_hunks(diff1, rename_map, rules)
+            result.header2, hunks2 = parse_hunks(diff2, rules=rules)
+            result.patch_id1 = patch_id(result.header1, hunks1)
+            result.patch_id2 = patch_id(result.header2, hunks2)
+            result.unmatched1, result.unmatched2 = match_hunks(hunks1, hunks2)
+            if result.header1 == result.header2 and not result.unmatched1 and not result.unmatched2:
+                result.status = SHIFTED
+                return True
+            return False
+        finally:
+            result.timings['compare_ms'] = (perf_counter() - start) * 1000
+
+    # Flag unmatched hunks overlapping upstream's changes (dropping them, with `unexpected_only`)
+    def triage(result: FileResult) -> None:
+        overlap1 = [upstream.overlaps1(result.path1, hunk) for hunk in result.unmatched1]
+        overlap2 = [upstream.overlaps2(result.path2, hunk) for hunk in result.unmatched2]
+        if unexpected_only:
+            n1, n2 = len(result.unmatched1), len(result.unmatched2)
+            result.unmatched1 = [h for h, o in zip(result.unmatched1, overlap1) if not o]
+            result.unmatched2 = [h for h, o in zip(result.unmatched2, overlap2) if not o]
+            overlap1 = [False] * len(result.unmatched1)
+            overlap2 = [False] * len(result.unmatched2)
+            dropped = (n1, n2) != (len(result.unmatched1), len(result.unmatched2))
+            headers_match = result.header1 == result.header2 or result.status in (ADDED, DROPPED)
+            if dropped and headers_match and not result.unmatched1 and not result.unmatched2:
+                result.status = UPSTREAM
+        result.overlap1, result.overlap2 = overlap1, overlap2
+
+    results = {
+        (path1, path2): FileResult(path1, path2, change1=changes1.get(path1), change2=changes2.get(path2))
+        for path1, path2 in pairs
+    }
+    progress.phase('comparing patches', len(results))
+    pending = []
+    pool = executor or ThreadPoolExecutor(max_workers=max_workers)
+    # Files with the same change on both sides are decided without a git call (or a trip through the pool)
+    same = []
+    futures = []
+    for result in results.values():
+        if same_change(result):
+            same.append(result)
+        else:
+            futures.append(pool.submit(fetch, result))
+    try:
+        progress.advance(len(same))
+        yield from same
+        for future in as_completed(futures):
+            result, diffs = future.result()
+            if compare(result, diffs):
+                progress.advance()
+                yield result
+            else:
+                pending.append(result)
+    finally:
+        for future in futures:
+            future.cancel()
+        if executor is None:
+            pool.shutdown()
+
+    # Hunks with no counterpart in their own file may have moved to another one
+    progress.phase('finding moved hunks', len(pending))
+    order = {pair: i for i, pair in enumerate(pairs)}
+    pending.sort(key=lambda r: order[(r.path1, r.path2)])
+    moves = find_moved_hunks(
+        {(r.path1, r.path2): r.unmatched1 for r in pending},
+        {(r.path1, r.path2): r.unmatched2 for r in pending},
+    )
+    moved_pairs = {m.key1 for m in moves} | {m.key2 for m in moves}
+    for result in pending:
+        if result.status == IDENTICAL:
+            result.status = CHANGED
+        if not result.unmatched1 and not result.unmatched2 and (
+            result.header1 == result.header2 or (result.path1, result.path2) in moved_pairs
+        ):
+            # Everything left in this file moved to (or from) another file
+            result.status = MOVED
+        if upstream:
+            triage(result)
+        progress.advance()
+        yield result
+
+    return list(results.values()), moves
+
+
+def compare_files(
+    refspec1: Union[str, Source],
+    refspec2: Union[str, Source],
+    *args,
+    on_result: Callable[[FileResult], None] = None,
+    **kwargs,
+) -> tuple[list[FileResult], list[Move]]:
+    """Compare each changed file's patch between two refspecs (see `iter_compare_files` for the options).
+
+    Returns one result per file (in git's path order) and the hunks that moved between
+    files. `on_result` is called with each result as soon as its status is decided.
+    """
+    results = iter_compare_files(refspec1, refspec2, *args, **kwargs)
+    while True:
+        try:
+            result = next(results)
+        except StopIteration as stop:
+            return stop.value
+        if on_result:
+            on_result(result)
@@ -0,0 +1,139 @@
+"""Cached ref and reflog listings for shell completion.
+
+Completing `main@{1}..feature@{1}` needs every ref and recent reflog entries (with
+their commits' subjects), which is too slow to compute per keystroke in repos with
+many refs. `refresh` writes them to `<git-common-dir>/didi/completion/`:
+
+    refs     one (short) ref name per line
+    reflog   "<ref>@{<n>}\t<subject>" per reflog entry, newest first per ref
+
+The cache is stale once `HEAD`, `packed-refs`, or any directory under `refs/` or
+`logs/` is newer than the `refs` file (whose mtime is set to the refresh's start
+time). Git writes loose refs (and rewrites reflogs) by renaming a lock file into
+place, which updates the containing directory's mtime, so only directories need
+checking, not every ref. The shell functions from `git-didi shell-integration` read
+the cache files directly, and only run `git-didi complete --refresh` when
+`find -newer` says they're stale.
+"""
+
+import os
+import time
+from os.path import exists, getmtime, join
+from subprocess import run
+from typing import Iterator, Optional
+
+CACHE_FILES = ('refs', 'reflog')
+# Files, and directory trees, whose changes invalidate the cache
+REF_FILES = ('HEAD', 'packed-refs')
+REF_DIRS = ('refs', 'logs')
+MAX_REFLOG_ENTRIES = 50
+
+
+def git_common_dir() -> Optional[str]:
+    """The current repo's (absolute) common git dir, or None outside a repo."""
+    result = run(['git', 'rev-parse', '--path-format=absolute', '--git-common-dir'], capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+    return result.stdout.strip()
+
+
+def cache_dir(common_dir: str) -> str:
+    return join(common_dir, 'didi', 'completion')
+
+
+def newest_mtime(common_dir: str) -> float:
+    """The latest mtime of `HEAD`, `packed-refs`, and the directories holding refs and reflogs."""
+    paths = [join(common_dir, name) for name in REF_FILES]
+    for name in REF_DIRS:
+        for root, _, _ in os.walk(join(common_dir, name)):
+            paths.append(root)
+    return max((getmtime(path) for path in paths if exists(path)), default=0.0)
+
+
+def is_stale(common_dir: str) -> bool:
+    """Whether the cache is missing, or older than some ref or reflog."""
+    directory = cache_dir(common_dir)
+    if not all(exists(join(directory, name)) for name in CACHE_FILES):
+        return True
+    return newest_mtime(common_dir) > getmtime(join(directory, 'refs'))
+
+
+def list_refs() -> list[str]:
+    """Short names of all refs (plus `HEAD`), from one `git for-each-ref`."""
+    result = run(['git', 'for-each-ref', '--format=%(refname:short)'], capture_output=True, text=True)
+    return ['HEAD', *result.stdout.splitlines()]
+
+
+def short_ref(refname: str) -> str:
+    """How a ref is usually typed: `refs/heads/x` → `x`, `refs/remotes/o/x` → `o/x`."""
+    for prefix in ('refs/heads/', 'refs/tags/', 'refs/remotes/', 'refs/'):
+        if refname.startswith(prefix):
+            return refname[len(prefix):]
+    return refname
+
+
+def iter_reflogs(common_dir: str, max_entries: int = MAX_REFLOG_ENTRIES) -> Iterator[tuple[str, list[tuple[str, str]]]]:
+    """(short ref, [(new SHA, message), …] newest first) for each reflog, read from `logs/` directly."""
+    logs = join(common_dir, 'logs')
+    for root, _, files in os.walk(logs):
+        for file in sorted(files):
+            path = join(root, file)
+            refname = os.path.relpath(path, logs).replace(os.sep, '/')
+            with open(path, errors='replace') as f:
+                lines = f.read().splitlines()
+            entries = []
+            for line in reversed(lines[-max_entries:]):
+                info, _, message = line.partition('\t')
+                fields = info.split(' ')
+                if len(fields) >= 2:
+                    entries.append((fields[1], message))
+            yield short_ref(refname), entries
+
+
+def commit_subjects(shas: set[str]) -> dict[str, str]:
+    """Subjects of the given commits, from one `git log --stdin` (unknown SHAs are skipped)."""
+    if not shas:
+        return {}
+    result = run(
+        ['git', 'log', '--no-walk=unsorted', '--ignore-missing', '--stdin', '--format=%H%x09%s'],
+        input='\n'.join(shas) + '\n', capture_output=True, text=True,
+    )
+    subjects = {}
+    for line in result.stdout.splitlines():
+        sha, _, subject = line.partition('\t')
+        subjects[sha] = subject
+    return subjects
+
+
+def write_lines(path: str, lines: list[str]) -> None:
+    """Replace a cache file atomically, so concurrent completions never see a partial listing."""
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as f:
+        f.writelines(f'{line}\n' for line in lines)
+    os.replace(tmp, path)
+
+
+def refresh(common_dir: str, max_entries: int = MAX_REFLOG_ENTRIES) -> str:
+    """Rewrite the cache; returns its directory."""
+    start = time.time()
+    directory = cache_dir(common_dir)
+    os.makedirs(directory, exist_ok=True)
+    reflogs = list(iter_reflogs(common_dir, max_entries))
+    subjects = commit_subjects({sha for _, entries in reflogs for sha, _ in entries})
+    write_lines(join(directory, 'reflog'), [
+        f'{ref}@{{{n}}}\t{subjects.get(sha) or message}'
+        for ref, entries in reflogs
+        for n, (sha, message) in enumerate(entries)
+    ])
+    refs = join(directory, 'refs')
+    write_lines(refs, list_refs())
+    # Stamped with the start time, so refs updated during the refresh invalidate it
+    os.utime(refs, (start, start))
+    return directory
+
+
+def ensure_cache(common_dir: str, max_entries: int = MAX_REFLOG_ENTRIES) -> str:
+    """The cache directory, refreshed first if it's stale."""
+    if is_stale(common_dir):
+        return refresh(common_dir, max_entries)
+    return cache_dir(common_dir)
@@ -0,0 +1,149 @@
+"""User-defined exclude and normalization rules.
+
+Rules are read from a `.didi.toml` at the top of the worktree:
+
+    exclude = ["uv.lock", "*_pb2.py", "docs/generated/*"]
+
+    [[normalize]]
+    pattern = '^([-+])version = ".*"'
+    replace = '\\1version = "..."'
+
+and from git config (`git config --add didi.exclude <glob>`, `git config --add
+didi.normalize <regex>`; matches of config regexes are replaced with "...").
+
+Exclude globs without a "/" match a file's basename at any depth; globs with a "/"
+match paths relative to the repository root. Normalization regexes are applied to
+each diff line, in the same pass that normalizes `index` lines.
+"""
+
+import re
+from dataclasses import dataclass
+from os.path import join
+from subprocess import run
+from typing import Iterable, Optional, Pattern
+
+from utz import err
+
+RULES_FILE = '.didi.toml'
+
+
+def glob_regex(glob: str) -> str:
+    """Translate a git-style glob (`*`, `?`, `**/`) to a regex matching repo-relative paths."""
+    anchored = '/' in glob.rstrip('/')
+    glob = glob.lstrip('/')
+    rgx = ''
+    i = 0
+    while i < len(glob):
+        c = glob[i]
+        if glob.startswith('**/', i):
+            rgx += '(?:.*/)?'
+            i += 3
+            continue
+        if glob.startswith('**', i):
+            rgx += '.*'
+            i += 2
+            continue
+        if c == '*':
+            rgx += '[^/]*'
+        elif c == '?':
+            rgx += '[^/]'
+        else:
+            rgx += re.escape(c)
+        i += 1
+    return rgx if anchored else f'(?:.*/)?{rgx}'
+
+
+@dataclass
+class Rules:
+    """Exclude globs and line normalizations, compiled once per run."""
+    excludes: tuple[str, ...] = ()
+    normalizations: tuple[tuple[Pattern, str], ...] = ()
+
+    def __post_init__(self):
+        if self.excludes:
+            self._exclude_rgx = re.compile('|'.join(f'(?:{glob_regex(g)})' for g in self.excludes))
+        else:
+            self._exclude_rgx = None
+
+    def __bool__(self) -> bool:
+        return bool(self.excludes or self.normalizations)
+
+    def excluded(self, path: str) -> bool:
+        """Whether a (repo-relative) path matches an exclude glob."""
+        return bool(self._exclude_rgx and self._exclude_rgx.fullmatch(path))
+
+    def filter(self, paths: Iterable[str]) -> list[str]:
+        """Drop excluded paths."""
+        if not self._exclude_rgx:
+            return list(paths)
+        return [path for path in paths if not self.excluded(path)]
+
+    def pathspecs(self) -> list[str]:
+        """Exclude globs as git pathspecs, so range-level git calls skip excluded files too."""
+        return [
+            f':(top,exclude,glob){g.lstrip("/") if "/" in g.rstrip("/") else "**/" + g}'
+            for g in self.excludes
+        ]
+
+    def normalize(self, line: str) -> str:
+        """Apply all normalization regexes to one diff line."""
+        for pattern, replace in self.normalizations:
+            line = pattern.sub(replace, line)
+        return line
+
+
+NO_RULES = Rules()
+
+
+def _git_config_rules() -> list[tuple[str, str]]:
+    """Read all `didi.exclude` / `didi.normalize` values, in one git call."""
+    result = run(
+        ['git', 'config', '-z', '--get-regexp', r'^didi\.(exclude|normalize)$'],
+        capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        return []
+    entries = []
+    for entry in result.stdout.split('\0'):
+        if entry:
+            key, _, value = entry.partition('\n')
+            entries.append((key, value))
+    return entries
+
+
+def _load_toml(path: str) -> Optional[dict]:
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    try:
+        import tomllib
+    except ImportError:
+        try:
+            import tomli as tomllib
+        except ImportError:
+            err(f"Warning: ignoring {path}; reading it requires Python 3.11+ or `pip install tomli`")
+            return None
+    return tomllib.loads(data.decode())
+
+
+def load_rules() -> Rules:
+    """Load rules from `.didi.toml` and `didi.*` git config."""
+    excludes = []
+    normalizations = []
+
+    result = run(['git', 'rev-parse', '--show-toplevel'], capture_output=True, text=True)
+    if result.returncode == 0:
+        config = _load_toml(join(result.stdout.strip(), RULES_FILE)) or {}
+        excludes.extend(config.get('exclude', []))
+        for rule in config.get('normalize', []):
+            normalizations.append((re.compile(rule['pattern']), rule.get('replace', '...')))
+
+    for key, value in _git_config_rules():
+        if key == 'didi.exclude':
+            excludes.append(value)
+        else:
+            normalizations.append((re.compile(value), '...'))
+
+    return Rules(tuple(excludes), tuple(normalizations))
@@ -0,0 +1,220 @@
+"""Resident per-repo daemon, serving `stat`/`patch`/`commits` over a Unix socket.
+
+`git-didi daemon` listens on `<git-common-dir>/didi/daemon.sock` (readable and
+writable only by its owner), and keeps caches (upstream rename maps, per-file and
+per-commit patches, keyed by resolved SHAs or blob pairs) warm across requests, each
+holding its `CACHE_ENTRIES` most recently used entries; `client.main` forwards
+commands to it. Requests run one at a time, in the client's cwd (restored
+afterwards), with the daemon's stdout/stderr fds redirected into the socket, so git
+subprocesses' output is forwarded too.
+"""
+
+import json
+import os
+import socket
+import struct
+import sys
+import traceback
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from os.path import exists
+from threading import Lock, Thread
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from utz import err
+
+from .client import EXIT, FRAME, STDERR, STDOUT, recv_exactly, send_frame
+
+# Entries kept per warm cache (least recently used are evicted first)
+CACHE_ENTRIES = 4096
+# Requests share the process's cwd and stdout/stderr fds, so they're served one at a time
+REQUEST_LOCK = Lock()
+
+
+class LRUCache(MutableMapping):
+    """A mapping keeping its `maxsize` most recently used entries (safe to share between threads)."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = Lock()
+
+    def __getitem__(self, key):
+        with self.lock:
+            value = self.entries[key]
+            self.entries.move_to_end(key)
+            return value
+
+    def __setitem__(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def __delitem__(self, key):
+        with self.lock:
+            del self.entries[key]
+
+    def __contains__(self, key) -> bool:
+        return key in self.entries
+
+    def __iter__(self):
+        with self.lock:
+            return iter(list(self.entries))
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+# Warm caches, only populated inside a running daemon
+_caches: Optional[Dict[str, LRUCache]] = None
+
+
+def warm_cache(name: str) -> Optional[LRUCache]:
+    """The daemon-resident cache called `name`, or None when not running in a daemon."""
+    if _caches is None:
+        return None
+    return _caches.setdefault(name, LRUCache(CACHE_ENTRIES))
+
+
+def memo(name: str, key: Hashable, compute: Callable[[], Any]) -> Any:
+    """Look `key` up in a daemon-resident cache, computing it on a miss (or outside a daemon)."""
+    cache = warm_cache(name)
+    if cache is None:
+        return compute()
+    value = cache.get(key)
+    if value is None:
+        value = cache[key] = compute()
+    return value
+
+
+def _pump(fd: int, sock: socket.socket, channel: int, lock: Lock) -> None:
+    """Forward everything written to a pipe as frames on one channel.
+
+    Keeps draining the pipe if the client hangs up, so the command can't block on a full pipe.
+    """
+    connected = True
+    while True:
+        data = os.read(fd, 65536)
+        if not data:
+            break
+        if connected:
+            with lock:
+                try:
+                    send_frame(sock, channel, data)
+                except OSError:
+                    connected = False
+    os.close(fd)
+
+
+def _run_command(argv: list[str]) -> int:
+    from .cli import cli
+
+    try:
+        cli.main(args=argv, prog_name='git-didi')
+    except SystemExit as e:
+        if e.code is None:
+            return 0
+        if isinstance(e.code, int):
+            return e.code
+        print(e.code, file=sys.stderr)
+        return 1
+    except Exception:
+        traceback.print_exc()
+        return 1
+    return 0
+
+
+def _serve_request(request: dict, conn: socket.socket) -> int:
+    """Run a request's command in its cwd, forwarding its stdout/stderr; returns its exit code."""
+    send_lock = Lock()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved = {fd: os.dup(fd) for fd in (1, 2)}
+    pumps = []
+    for fd, channel in ((1, STDOUT), (2, STDERR)):
+        r, w = os.pipe()
+        os.dup2(w, fd)
+        os.close(w)
+        pump = Thread(target=_pump, args=(r, conn, channel, send_lock), daemon=True)
+        pump.start()
+        pumps.append(pump)
+    cwd = os.getcwd()
+    try:
+        os.chdir(request['cwd'])
+        code = _run_command(request['argv'])
+    finally:
+        os.chdir(cwd)
+        sys.stdout.flush()
+        sys.stderr.flush()
+        for fd, copy in saved.items():
+            os.dup2(copy, fd)
+            os.close(copy)
+    for pump in pumps:
+        pump.join()
+    return code
+
+
+def handle(conn: socket.socket) -> bool:
+    """Serve one request; returns False if the daemon was asked to stop."""
+    with conn, conn.makefile('rb') as f:
+        request = json.loads(f.readline())
+        if request.get('stop'):
+            send_frame(conn, EXIT, struct.pack('>i', 0))
+            return False
+
+        with REQUEST_LOCK:
+            code = _serve_request(request, conn)
+        try:
+            send_frame(conn, EXIT, struct.pack('>i', code))
+        except OSError:
+            pass
+    return True
+
+
+def serve(path: str) -> None:
+    """Serve requests on a Unix socket until stopped (`git-didi daemon --stop`, or Ctrl-C)."""
+    global _caches
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if exists(path):
+        os.unlink(path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    # Only the owner may connect (requests run commands as the daemon's user); set
+    # before binding, so the socket is never accessible to others
+    umask = os.umask(0o177)
+    try:
+        server.bind(path)
+    finally:
+        os.umask(umask)
+    server.listen()
+    _caches = {}
+    err(f"git-didi daemon listening on {path}")
+    try:
+        while True:
+            conn, _ = server.accept()
+            try:
+                if not handle(conn):
+                    break
+            except (OSError, ValueError) as e:
+                err(f"Error serving request: {e}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        if exists(path):
+            os.unlink(path)
+        _caches = None
+
+
+def stop(path: str) -> bool:
+    """Ask the daemon listening on `path` to exit; returns whether one was running."""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    with sock:
+        try:
+            sock.connect(path)
+        except OSError:
+            return False
+        sock.sendall(json.dumps(dict(stop=True)).encode() + b'\n')
+        recv_exactly(sock, FRAME.size + 4)
+    return True
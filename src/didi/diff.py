@@ -1,9 +1,18 @@
+import re
 import sys
-from subprocess import run
-from typing import Dict
+import weakref
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass
+from subprocess import DEVNULL, PIPE, Popen, run
+from threading import Lock, Thread
+from typing import IO, TYPE_CHECKING, Deque, Dict, Iterable, Iterator, Optional
 
 from utz import err
 
+if TYPE_CHECKING:
+    from .config import Rules
+
 
 def get_rename_mapping(
     refspec: str,
@@ -76,33 +85,240 @@ def get_changed_files(refspec: str, paths: tuple[str, ...] = ()) -> list[str]:
     return [f for f in result.stdout.strip().split('\n') if f]
 
 
-def normalize_diff(diff_text: str, path_mapping: Dict[str, str] = None) -> str:
+NULL_SHA = '0' * 40
+
+
+@dataclass
+class FileChange:
+    """One file's entry in `git diff --raw --numstat` output."""
+    path: str
+    old_path: str
+    status: str
+    old_blob: str
+    new_blob: str
+    added: Optional[int]
+    deleted: Optional[int]
+    # File modes (from `--raw`; None where unknown, e.g. in snapshots and mailed patches)
+    old_mode: Optional[str] = None
+    new_mode: Optional[str] = None
+
+    @property
+    def binary(self) -> bool:
+        """Whether git reported the file as binary (`-\t-` in --numstat)."""
+        return self.added is None
+
+    @property
+    def size(self) -> int:
+        """Number of changed lines (0 for binary files)."""
+        return (self.added or 0) + (self.deleted or 0)
+
+    @property
+    def blobs(self) -> tuple[str, str]:
+        """(old, new) blob SHAs; NULL_SHA marks a missing side or a worktree file."""
+        return (self.old_blob, self.new_blob)
+
+    @property
+    def worktree(self) -> bool:
+        """Whether the new side is an (unhashed) worktree file, so the blob pair doesn't identify the patch."""
+        return self.new_blob == NULL_SHA and not self.status.startswith('D')
+
+
+NUMSTAT_RENAME_RGX = re.compile(r'(?P<pre>.*)\{(?P<old>.*) => (?P<new>.*)\}(?P<post>.*)')
+
+
+def numstat_path(line: str) -> str:
+    """The (new) path of a `--numstat` line, expanding rename notation (`a/{old => new}/b`, `old => new`)."""
+    path = line.split('\t', 2)[-1]
+    m = NUMSTAT_RENAME_RGX.fullmatch(path)
+    if m:
+        return f"{m['pre']}{m['new']}{m['post']}".replace('//', '/')
+    if ' => ' in path:
+        return path.split(' => ', 1)[1]
+    return path
+
+
+def parse_raw_numstat(output: str) -> Dict[str, FileChange]:
+    """Parse `git diff --raw --numstat -z --no-abbrev` output, keyed by (new) path."""
+    tokens = output.split('\0')
+    changes = {}
+    stats = {}
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        i += 1
+        if not token:
+            continue
+        if token.startswith(':'):
+            # :<mode1> <mode2> <sha1> <sha2> <status>\0<path>[\0<new path>]
+            old_mode, new_mode, old_blob, new_blob, status = token[1:].split(' ')
+            old_path = tokens[i]
+            i += 1
+            if status[0] in 'RC':
+                path = tokens[i]
+                i += 1
+            else:
+                path = old_path
+            changes[path] = FileChange(path, old_path, status, old_blob, new_blob, None, None, old_mode, new_mode)
+        else:
+            # <added>\t<deleted>\t<path>, or <added>\t<deleted>\t\0<old path>\0<new path>
+            added, deleted, path = token.split('\t', 2)
+            if not path:
+                path = tokens[i + 1]
+                i += 2
+            stats[path] = (
+                None if added == '-' else int(added),
+                None if deleted == '-' else int(deleted),
+            )
+    for path, (added, deleted) in stats.items():
+        if path in changes:
+            changes[path].added = added
+            changes[path].deleted = deleted
+    return changes
+
+
+def get_file_changes(
+    refspec: str,
+    paths: tuple[str, ...] = (),
+    find_renames: str = None,
+    find_copies: str = None,
+) -> Dict[str, FileChange]:
+    """Get blob SHAs and line counts for each file changed in a refspec, in one git call."""
+    cmd = build_diff_cmd(find_renames=find_renames, find_copies=find_copies)
+    cmd.extend(['--raw', '--numstat', '-z', '--no-abbrev', refspec])
+    if paths:
+        cmd.extend(['--', *paths])
+    result = run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        err(f"Error getting changed files for {refspec}: {result.stderr.strip()}")
+        sys.exit(1)
+    return parse_raw_numstat(result.stdout)
+
+
+def stream_range_diff(
+    refspec: str,
+    paths: tuple[str, ...] = (),
+    ignore_whitespace: bool = False,
+    unified: int = 3,
+    find_renames: str = None,
+    find_copies: str = None,
+) -> Iterator[str]:
+    """Yield the lines of a whole refspec's patch as git produces them."""
+    cmd = build_diff_cmd(ignore_whitespace, find_renames, find_copies)
+    cmd.extend([f'-U{unified}', refspec])
+    if paths:
+        cmd.extend(['--', *paths])
+    with Popen(cmd, stdout=PIPE, stderr=DEVNULL, text=True, errors='replace') as proc:
+        try:
+            for line in proc.stdout:
+                yield line.rstrip('\n')
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+
+
+def unquote_path(path: str) -> str:
+    """A path as git prints it in patch headers, unquoted if it's C-style quoted (e.g. non-ASCII characters)."""
+    if not (path.startswith('"') and path.endswith('"')):
+        return path
+    raw = path[1:-1].encode('latin-1', 'backslashreplace').decode('unicode_escape')
+    return raw.encode('latin-1').decode('utf-8', 'replace')
+
+
+def section_paths(section: list[str]) -> tuple[str, str]:
+    """The old and new paths of one `diff --git` section of a patch, read from its own header lines.
+
+    Added and deleted files have the same path on both sides.
+    """
+    old = new = None
+    for line in section[1:]:
+        if line.startswith('@@') or line.startswith('Binary files '):
+            break
+        if line.startswith(('rename from ', 'copy from ')):
+            old = unquote_path(line.split(' ', 2)[2])
+        elif line.startswith(('rename to ', 'copy to ')):
+            new = unquote_path(line.split(' ', 2)[2])
+        # Paths with spaces get a trailing tab on ---/+++ lines
+        elif line.startswith('--- ') and line != '--- /dev/null' and old is None:
+            old = unquote_path(line[4:].rstrip('\t'))[2:]
+        elif line.startswith('+++ ') and line != '+++ /dev/null' and new is None:
+            new = unquote_path(line[4:].rstrip('\t'))[2:]
+    if old is None and new is None:
+        # No ---/+++ lines (binary, mode-only or empty file): `diff --git a/<path> b/<path>`
+        names = section[0][len('diff --git '):]
+        if names.startswith('"'):
+            end = names.index('" ', 1) + 1 if '" ' in names else len(names)
+            old = new = unquote_path(names[end + 1:])[2:]
+        else:
+            old = new = names[2:2 + (len(names) - 5) // 2]
+    return old or new, new or old
+
+
+def section_path(section: list[str]) -> str:
+    """The (new) path of one `diff --git` section of a patch (see `section_paths`)."""
+    return section_paths(section)[1]
+
+
+def split_file_patches(lines: Iterator[str]) -> Iterator[tuple[str, list[str]]]:
+    """Split a range patch into per-file patches, each keyed by the (new) path in its own header.
+
+    Files can be missing from the patch (e.g. whitespace-only changes, with `-w`), so
+    sections are never matched to paths by position.
+    """
+    current = None
+    for line in lines:
+        if line.startswith('diff --git '):
+            if current is not None:
+                yield section_path(current), current
+            current = [line]
+        elif current is not None:
+            current.append(line)
+    if current is not None:
+        yield section_path(current), current
+
+
+def normalize_line(line: str, path_mapping: Dict[str, str] = None, rules: 'Rules' = None) -> str:
+    """Normalize a single diff line (see `normalize_diff`)."""
+    # Remove index line SHAs: "index abc123..def456" -> "index ..."
+    if line.startswith('index '):
+        return 'index ...'
+    if rules:
+        line = rules.normalize(line)
+    # Normalize paths in diff headers if mapping provided
+    if path_mapping and (line.startswith('diff --git ') or
+                         line.startswith('--- ') or
+                         line.startswith('+++ ')):
+        # Apply path mapping to normalize renamed files
+        for old_path, new_path in path_mapping.items():
+            line = line.replace(old_path, new_path)
+    return line
+
+
+def normalize_diff(diff_text: str, path_mapping: Dict[str, str] = None, rules: 'Rules' = None) -> str:
     """Normalize diff text by removing variable parts like index SHAs and mapping paths.
 
     Args:
         diff_text: The diff text to normalize
         path_mapping: Optional dict mapping old paths to new paths (for renames)
+        rules: Optional user-defined line normalizations (see `didi.config`)
 
     Returns:
         Normalized diff text
     """
-    lines = []
-    for line in diff_text.splitlines():
-        # Remove index line SHAs: "index abc123..def456" -> "index ..."
-        if line.startswith('index '):
-            lines.append('index ...')
-        # Normalize paths in diff headers if mapping provided
-        elif path_mapping and (line.startswith('diff --git ') or
-                               line.startswith('--- ') or
-                               line.startswith('+++ ')):
-            # Apply path mapping to normalize renamed files
-            normalized_line = line
-            for old_path, new_path in path_mapping.items():
-                normalized_line = normalized_line.replace(old_path, new_path)
-            lines.append(normalized_line)
-        else:
-            lines.append(line)
-    return '\n'.join(lines)
+    return '\n'.join(normalize_line(line, path_mapping, rules) for line in diff_text.splitlines())
+
+
+def file_diff_cmd(
+    refspec: str,
+    filepath: str,
+    ignore_whitespace: bool = False,
+    unified: int = 3,
+    find_renames: str = None,
+    find_copies: str = None,
+) -> list[str]:
+    """Build the `git diff` command for a specific file in a refspec."""
+    cmd = build_diff_cmd(ignore_whitespace, find_renames, find_copies, follow=True)
+    cmd.extend([f'-U{unified}', refspec, '--', filepath])
+    return cmd
 
 
 def get_file_diff(
@@ -114,12 +330,144 @@ def get_file_diff(
     find_copies: str = None,
 ) -> str:
     """Get diff for a specific file in a refspec."""
-    cmd = build_diff_cmd(ignore_whitespace, find_renames, find_copies, follow=True)
-    cmd.extend([f'-U{unified}', refspec, '--', filepath])
+    cmd = file_diff_cmd(refspec, filepath, ignore_whitespace, unified, find_renames, find_copies)
     result = run(cmd, capture_output=True, text=True)
     return result.stdout
 
 
+def stream_file_diff(
+    refspec: str,
+    filepath: str,
+    ignore_whitespace: bool = False,
+    unified: int = 3,
+    find_renames: str = None,
+    find_copies: str = None,
+) -> Iterator[str]:
+    """Yield the lines of a file's diff as git produces them, without buffering the whole patch.
+
+    The git process is killed if the caller stops iterating early.
+    """
+    cmd = file_diff_cmd(refspec, filepath, ignore_whitespace, unified, find_renames, find_copies)
+    with Popen(cmd, stdout=PIPE, stderr=DEVNULL, text=True, errors='replace') as proc:
+        try:
+            for line in proc.stdout:
+                yield line.rstrip('\n')
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+
+
+FULL_SHA_RGX = re.compile(r'[0-9a-f]{40}([0-9a-f]{24})?')
+# Written after each request; `git diff-tree --stdin` echoes lines that aren't object IDs
+BATCH_END = 'didi-batch-end'
+
+
+def read_batch_responses(stdout: IO[bytes], pending: Deque[tuple[Future, bool]], lock: Lock) -> None:
+    """Resolve `pending` futures, in order, with each request's patch from `git diff-tree --stdin -p -z`."""
+    end = f'{BATCH_END}\n'.encode()
+    chunks = []
+    for line in stdout:
+        if line != end:
+            chunks.append(line)
+            continue
+        future, trees = pending.popleft()
+        data = b''.join(chunks)
+        chunks = []
+        if trees:
+            # Tree pairs' output starts with the request line
+            patch = data.partition(b'\n')[2]
+        else:
+            # Commits' output (if any) starts with the commit ID, which `-z` ends with a NUL
+            _, nul, patch = data.partition(b'\0')
+        future.set_result(patch.decode(errors='replace'))
+    with lock:
+        while pending:
+            pending.popleft()[0].set_exception(RuntimeError("git diff-tree exited"))
+
+
+def close_batch(proc: Popen) -> None:
+    """End a `git diff-tree --stdin` process: it exits when its stdin closes."""
+    try:
+        proc.stdin.close()
+    except OSError:
+        pass
+    proc.wait()
+
+
+class DiffTreeBatch:
+    """One `git diff-tree --stdin -p -z` process, producing many commits' (or tree pairs') patches.
+
+    `submit` / `submit_trees` queue a request and return a future of its patch; a
+    reader thread demultiplexes git's output back to the futures, in request order.
+    Commits are diffed against their first parent, and renames are detected (as
+    `git diff` does by default). The process exits once the batch is closed or
+    garbage-collected.
+    """
+
+    def __init__(
+        self,
+        ignore_whitespace: bool = False,
+        unified: int = 3,
+        find_renames: str = None,
+        find_copies: str = None,
+        pathspecs: tuple[str, ...] = (),
+    ):
+        cmd = ['git', 'diff-tree', '--stdin', '-p', '-z', '--no-color', '--diff-merges=first-parent', f'-U{unified}']
+        if ignore_whitespace:
+            cmd.append('-w')
+        cmd.append(f'-M{find_renames}' if find_renames else '-M')
+        if find_copies:
+            cmd.append(f'-C{find_copies}')
+        if pathspecs:
+            cmd.extend(['--', *pathspecs])
+        self.proc = Popen(cmd, stdin=PIPE, stdout=PIPE, stderr=DEVNULL)
+        self.pending: Deque[tuple[Future, bool]] = deque()
+        self.lock = Lock()
+        # The reader doesn't reference the batch, so an unused batch can be collected (and its process ended)
+        Thread(target=read_batch_responses, args=(self.proc.stdout, self.pending, self.lock), daemon=True).start()
+        self.close = weakref.finalize(self, close_batch, self.proc)
+
+    def request(self, line: str, trees: bool) -> Future:
+        future = Future()
+        with self.lock:
+            self.pending.append((future, trees))
+            try:
+                self.proc.stdin.write(f'{line}\n{BATCH_END}\n'.encode())
+                self.proc.stdin.flush()
+            except (BrokenPipeError, ValueError):
+                # Unless the reader already failed it (under the same lock)
+                if self.pending and self.pending[-1][0] is future:
+                    self.pending.pop()
+                    future.set_exception(RuntimeError("git diff-tree exited"))
+        return future
+
+    def submit(self, commit: str) -> Future:
+        """A future of a commit's patch against its first parent (empty for root commits, like `git diff <root>^`)."""
+        check_full_sha(commit)
+        return self.request(commit, trees=False)
+
+    def submit_trees(self, old: str, new: str) -> Future:
+        """A future of the patch between two trees.
+
+        These must be tree IDs: given "<commit> <commit>", git would diff the first
+        commit against the second as its parent, and keep using that parent for later
+        requests.
+        """
+        check_full_sha(old)
+        check_full_sha(new)
+        return self.request(f'{old} {new}', trees=True)
+
+    def diff(self, commit: str) -> str:
+        """A commit's patch, waiting for it."""
+        return self.submit(commit).result()
+
+
+def check_full_sha(oid: str) -> None:
+    """Requests must be full object IDs (git echoes anything else back, like the end-of-request markers)."""
+    if not FULL_SHA_RGX.fullmatch(oid):
+        raise ValueError(f"Not a full object ID: {oid}")
+
+
 def get_commits(refspec: str) -> list[str]:
     """Get list of commits in a refspec."""
     result = run(['git', 'log', '--oneline', refspec], capture_output=True, text=True)
@@ -129,6 +477,31 @@ def get_commits(refspec: str) -> list[str]:
     return [line for line in result.stdout.strip().split('\n') if line]
 
 
+def get_patch_ids(refspec: str) -> Dict[str, str]:
+    """`git patch-id --stable` of each commit in a range, keyed by full commit SHA."""
+    log = Popen(['git', 'log', '--no-color', '-p', '--diff-merges=first-parent', '--format=commit %H', refspec], stdout=PIPE)
+    result = run(['git', 'patch-id', '--stable'], stdin=log.stdout, capture_output=True, text=True)
+    log.stdout.close()
+    log.wait()
+    return parse_patch_ids(result.stdout)
+
+
+def compute_patch_ids(patches: Iterable[tuple[str, str]]) -> Dict[str, str]:
+    """`git patch-id --stable` of (40-hex key, patch text) pairs, keyed the same way."""
+    stdin = ''.join(f'commit {key}\n\n{text}\n' for key, text in patches)
+    result = run(['git', 'patch-id', '--stable'], input=stdin, capture_output=True, text=True)
+    return parse_patch_ids(result.stdout)
+
+
+def parse_patch_ids(output: str) -> Dict[str, str]:
+    """Parse `git patch-id` output ("<patch-id> <commit>" lines) into {commit: patch-id}."""
+    ids = {}
+    for line in output.splitlines():
+        patch_id, _, commit = line.partition(' ')
+        ids[commit] = patch_id
+    return ids
+
+
 def parse_refspec_bases(refspec1: str, refspec2: str) -> tuple[str, str, str, str]:
     """Parse two refspecs to extract bases.
 
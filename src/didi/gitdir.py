@@ -0,0 +1,43 @@
+"""Locating a repo's git directories without running git.
+
+Used where a `git rev-parse` per call would cost more than the work it guards, e.g.
+the `git-didi` entry point checking for a daemon (so only the standard library is
+imported here).
+"""
+
+import os
+from os.path import abspath, dirname, isdir, isfile, join, normpath
+from typing import Optional
+
+
+def find_git_dirs(cwd: Optional[str] = None) -> Optional[tuple[str, str, str]]:
+    """(git dir, common git dir, worktree top level) of the repo containing `cwd`, found without running git.
+
+    None outside a repo, or when `$GIT_DIR` overrides the usual lookup.
+    """
+    if os.environ.get('GIT_DIR'):
+        return None
+    path = abspath(cwd or os.getcwd())
+    while True:
+        dot_git = join(path, '.git')
+        if isdir(dot_git):
+            git_dir = dot_git
+            break
+        if isfile(dot_git):
+            # Linked worktree (or submodule): "gitdir: <path>"
+            with open(dot_git) as f:
+                line = f.read().strip()
+            if not line.startswith('gitdir: '):
+                return None
+            git_dir = normpath(join(path, line[len('gitdir: '):]))
+            break
+        parent = dirname(path)
+        if parent == path:
+            return None
+        path = parent
+    common_dir = git_dir
+    commondir = join(git_dir, 'commondir')
+    if isfile(commondir):
+        with open(commondir) as f:
+            common_dir = normpath(join(git_dir, f.read().strip()))
+    return git_dir, common_dir, path
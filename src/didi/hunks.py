@@ -0,0 +1,275 @@
+"""Hunk-level hashing of patches.
+
+Hunks are identified by a digest of their (normalized) body lines only; the line
+offsets in `@@ -a,b +c,d @@` headers are ignored, since they shift whenever upstream
+adds or removes lines above a change. This lets patches be compared as multisets of
+hunks (catching shifted and reordered hunks), and lets large patches be compared as
+sequences of per-hunk digests, streamed from git, instead of holding both full patch
+texts in memory.
+"""
+
+import re
+from collections import Counter, defaultdict, deque
+from dataclasses import dataclass
+from functools import cached_property
+from hashlib import blake2b
+from itertools import zip_longest
+from typing import Deque, Dict, Hashable, Iterable, Iterator, Optional
+
+from .config import Rules
+from .diff import normalize_line
+
+
+def iter_hunk_digests(
+    lines: Iterable[str],
+    path_mapping: Dict[str, str] = None,
+    rules: Rules = None,
+) -> Iterator[str]:
+    """Yield one digest per hunk of a patch, after normalizing each line.
+
+    The first digest covers the file header (everything before the first `@@`), so
+    hunk N of the patch is digest N. Hunk headers themselves are not hashed.
+    """
+    h = blake2b(digest_size=16)
+    for line in lines:
+        if line.startswith('@@'):
+            yield h.hexdigest()
+            h = blake2b(digest_size=16)
+            continue
+        h.update(normalize_line(line, path_mapping, rules).encode())
+        h.update(b'\n')
+    yield h.hexdigest()
+
+
+def first_differing_hunk(digests1: Iterable[str], digests2: Iterable[str]) -> Optional[int]:
+    """Return the index of the first hunk whose digests differ, or None if all match.
+
+    Stops consuming both iterables at the first difference.
+    """
+    for i, (d1, d2) in enumerate(zip_longest(digests1, digests2)):
+        if d1 != d2:
+            return i
+    return None
+
+
+HUNK_HEADER_RGX = re.compile(
+    r'@@ -(?P<old_start>\d+)(?:,(?P<old_count>\d+))? \+(?P<new_start>\d+)(?:,(?P<new_count>\d+))? @@ ?(?P<heading>.*)'
+)
+
+
+def line_span(start: int, count: Optional[int]) -> tuple[int, int]:
+    """A hunk side's `start,count` as a closed interval of line boundaries (boundary N precedes line N).
+
+    An empty side (`count` 0, e.g. a pure insertion after line `start`) is the single
+    boundary after line `start`, so that it intersects hunks touching either neighbor.
+    """
+    if count is None:
+        count = 1
+    if count == 0:
+        return start + 1, start + 1
+    return start, start + count
+
+
+def digest_lines(lines: Iterable[str]) -> str:
+    """Digest a sequence of lines, consistently with `iter_hunk_digests`."""
+    h = blake2b(digest_size=16)
+    for line in lines:
+        h.update(line.encode())
+        h.update(b'\n')
+    return h.hexdigest()
+
+
+@dataclass
+class Hunk:
+    """One hunk of a patch: its original `@@` header line and normalized body lines."""
+    header: str
+    lines: list[str]
+    digest: str
+
+    @property
+    def heading(self) -> str:
+        """The section heading git appends after the `@@ ... @@` offsets (often a function name)."""
+        m = HUNK_HEADER_RGX.fullmatch(self.header)
+        return m['heading'] if m else ''
+
+    @property
+    def old_span(self) -> Optional[tuple[int, int]]:
+        """The lines this hunk covers in the range's base (see `line_span`), or None if the header doesn't parse."""
+        m = HUNK_HEADER_RGX.fullmatch(self.header)
+        if not m:
+            return None
+        return line_span(int(m['old_start']), int(m['old_count']) if m['old_count'] is not None else None)
+
+    @cached_property
+    def change_digest(self) -> str:
+        """Digest of the hunk's added/removed lines only, ignoring its context lines."""
+        return digest_lines(line for line in self.lines if line[:1] in '+-')
+
+    @property
+    def canonical_header(self) -> str:
+        """The hunk header with line offsets stripped."""
+        heading = self.heading
+        return f'@@ @@ {heading}' if heading else '@@ @@'
+
+
+def parse_hunks(
+    diff_text: str,
+    path_mapping: Dict[str, str] = None,
+    rules: Rules = None,
+) -> tuple[list[str], list[Hunk]]:
+    """Split a file's patch into normalized file-header lines and hunks."""
+    header = []
+    hunks = []
+    hunk_header = None
+    body = []
+
+    def flush():
+        if hunk_header is not None:
+            hunks.append(Hunk(hunk_header, body, digest_lines(body)))
+
+    for line in diff_text.splitlines():
+        if line.startswith('@@'):
+            flush()
+            hunk_header = line
+            body = []
+        elif hunk_header is None:
+            header.append(normalize_line(line, path_mapping, rules))
+        else:
+            body.append(normalize_line(line, path_mapping, rules))
+    flush()
+    return header, hunks
+
+
+def canonical_diff(
+    diff_text: str,
+    path_mapping: Dict[str, str] = None,
+    rules: Rules = None,
+) -> str:
+    """Normalize a patch and strip line offsets from its hunk headers."""
+    header, hunks = parse_hunks(diff_text, path_mapping, rules)
+    lines = list(header)
+    for hunk in hunks:
+        lines.append(hunk.canonical_header)
+        lines.extend(hunk.lines)
+    return '\n'.join(lines)
+
+
+def patch_id(header: list[str], hunks: list[Hunk]) -> str:
+    """Digest a file's patch independently of hunk offsets and order.
+
+    Two patches have equal IDs exactly when `match_hunks` pairs all their hunks and
+    their (normalized) file headers are equal.
+    """
+    return digest_lines([*header, *sorted(h.digest for h in hunks)])
+
+
+def match_hunks(hunks1: list[Hunk], hunks2: list[Hunk]) -> tuple[list[Hunk], list[Hunk]]:
+    """Pair up hunks with equal digests, regardless of position or offsets.
+
+    Returns the unmatched hunks from each side, in their original order.
+    """
+    counts = Counter(h.digest for h in hunks1)
+    counts.subtract(h.digest for h in hunks2)
+    unmatched1 = []
+    unmatched2 = []
+    surplus1 = {d: n for d, n in counts.items() if n > 0}
+    surplus2 = {d: -n for d, n in counts.items() if n < 0}
+    # When a digest occurs more often on one side, report its last occurrences as unmatched
+    for hunks, surplus, unmatched in ((hunks1, surplus1, unmatched1), (hunks2, surplus2, unmatched2)):
+        seen = Counter(h.digest for h in hunks)
+        for hunk in hunks:
+            n = surplus.get(hunk.digest, 0)
+            if n and seen[hunk.digest] <= n:
+                unmatched.append(hunk)
+            seen[hunk.digest] -= 1
+    return unmatched1, unmatched2
+
+
+def format_hunks(header: list[str], hunks: list[Hunk], tags: Optional[list[str]] = None) -> list[str]:
+    """Reassemble patch lines from a file header and a subset of its hunks (appending `[tag]`s to their headers)."""
+    lines = list(header)
+    for i, hunk in enumerate(hunks):
+        lines.append(f'{hunk.header} [{tags[i]}]' if tags else hunk.header)
+        lines.extend(hunk.lines)
+    return lines
+
+
+# Significant changed lines a hunk needs to be matched across files by its changes alone
+MIN_MOVE_LINES = 3
+
+
+@dataclass
+class Move:
+    """A hunk that appears in one file on the left side and a different file on the right."""
+    key1: Hashable
+    key2: Hashable
+    hunk1: Hunk
+    hunk2: Hunk
+
+
+def significant_changes(hunk: Hunk) -> int:
+    """How many of a hunk's added/removed lines have any alphanumeric content (not just e.g. `}` or blank)."""
+    return sum(1 for line in hunk.lines if line[:1] in '+-' and any(c.isalnum() for c in line[1:]))
+
+
+def take_candidate(index: Dict[str, Dict[Hashable, Deque[Hunk]]], digest: str, key1: Hashable, used: set) -> Optional[tuple]:
+    """Pop the first hunk indexed under `digest` from a file other than `key1` (and not yet used)."""
+    by_key = index.get(digest)
+    if not by_key:
+        return None
+    found = None
+    exhausted = []
+    for key2, hunks in by_key.items():
+        if key2 == key1:
+            continue
+        while hunks and id(hunks[0]) in used:
+            hunks.popleft()
+        if hunks:
+            found = key2, hunks.popleft()
+            used.add(id(found[1]))
+            break
+        exhausted.append(key2)
+    # Drop files with no hunks left, so repeated lookups don't rescan them
+    for key2 in exhausted:
+        del by_key[key2]
+    return found
+
+
+def find_moved_hunks(
+    unmatched1: Dict[Hashable, list[Hunk]],
+    unmatched2: Dict[Hashable, list[Hunk]],
+) -> list[Move]:
+    """Match unmatched hunks across files, via global indexes of their bodies and changed lines.
+
+    Both dicts map a file key to the hunks that had no counterpart in the same file on
+    the other side; keys are equal when they refer to the same file. A hunk is reported
+    as moved if a hunk under a different key on the other side has the same body
+    (context included), or the same added/removed lines when there are at least
+    `MIN_MOVE_LINES` significant ones (so that e.g. a lone `+}` in two unrelated files
+    isn't a move). Moved hunks are removed from both dicts' lists, in place. Runs in
+    O(total hunks).
+    """
+    bodies = defaultdict(dict)
+    changes = defaultdict(dict)
+    for key2, hunks in unmatched2.items():
+        for hunk in hunks:
+            bodies[hunk.digest].setdefault(key2, deque()).append(hunk)
+            if significant_changes(hunk) >= MIN_MOVE_LINES:
+                changes[hunk.change_digest].setdefault(key2, deque()).append(hunk)
+
+    moves = []
+    used = set()
+    for key1, hunks in unmatched1.items():
+        for hunk in hunks:
+            found = take_candidate(bodies, hunk.digest, key1, used)
+            if found is None and significant_changes(hunk) >= MIN_MOVE_LINES:
+                found = take_candidate(changes, hunk.change_digest, key1, used)
+            if found:
+                moves.append(Move(key1, found[0], hunk, found[1]))
+
+    moved1 = {id(m.hunk1) for m in moves}
+    for hunks in unmatched1.values():
+        hunks[:] = [h for h in hunks if id(h) not in moved1]
+    for hunks in unmatched2.values():
+        hunks[:] = [h for h in hunks if id(h) not in used]
+    return moves
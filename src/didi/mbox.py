@@ -0,0 +1,360 @@
+"""Patch series from `git format-patch` output: an mbox, or a directory of `.patch` files.
+
+`open_source` returns an `MboxSource` for either, so `stat`, `patch` and `commits`
+can compare an emailed series against a range. The series is indexed in one
+streaming pass (each commit's SHA, subject, files, and where its message is); a
+commit's patch sections are re-read from its message when compared. Commits are
+paired with the other range's by `git patch-id` (see `didi.api`).
+
+A file's patch for the whole series is its cumulative diff: the series is applied
+onto its base (`base-commit:`, from `format-patch --base`, or else the parent of its
+first commit, if this repo has either) with `git apply --cached` into a temporary
+index, and diffed like a range (so diff options apply). Without a base, or if the
+series doesn't apply, each file's sections are used as mailed. That's exact for
+files only one commit changes; files several commits change are compared hunk by
+hunk across those commits' patches, with a warning. Diff options (`-U`, `-w`, `-M`,
+`-C`) can't be re-applied to mailed patches, and are ignored for them.
+"""
+
+import os
+import re
+from dataclasses import dataclass, field
+from email.header import decode_header, make_header
+from functools import cached_property, lru_cache
+from glob import glob
+from io import BytesIO
+from os.path import abspath, basename, isdir, join
+from subprocess import run
+from tempfile import TemporaryDirectory
+from typing import IO, Dict, Iterable, Iterator, Optional
+
+from utz import err
+
+from .config import Rules
+from .diff import NULL_SHA, FileChange, compute_patch_ids, section_path, section_paths, split_file_patches
+from .snapshot import strip_blank
+from .source import GitSource
+
+FROM_SHA_RGX = re.compile(r'From (?P<sha>[0-9a-f]{40}) ')
+SUBJECT_PREFIX_RGX = re.compile(r'^(?:\[[^\]]*\]\s*)+')
+INDEX_RGX = re.compile(r'index (?P<old>[0-9a-f]+)\.\.(?P<new>[0-9a-f]+)')
+# Messages whose patch sections are kept parsed, per source
+CACHED_MESSAGES = 64
+# Identity of the commit recording an applied series (it's never referenced by a ref)
+APPLIED_IDENTITY = {
+    f'GIT_{role}_{key}': value
+    for role in ('AUTHOR', 'COMMITTER')
+    for key, value in (('NAME', 'git-didi'), ('EMAIL', 'git-didi@localhost'))
+}
+
+
+def is_mbox(path: str) -> bool:
+    """Whether a file looks like `git format-patch` output (or any mbox)."""
+    with open(path, 'rb') as f:
+        return f.read(5) == b'From '
+
+
+def decode_subject(subject: str) -> str:
+    """Decode RFC 2047 words, and strip `[PATCH v2 1/3]`-style prefixes."""
+    subject = str(make_header(decode_header(subject)))
+    return SUBJECT_PREFIX_RGX.sub('', subject).strip()
+
+
+@dataclass
+class MboxCommit:
+    """One message's commit: its (original or synthesized) SHA, subject, changed files, and where its message is."""
+    sha: str
+    subject: str
+    message: tuple[str, int, int]
+    paths: list[str] = field(default_factory=list)
+
+    @property
+    def short_sha(self) -> str:
+        return self.sha[:7]
+
+
+def iter_lines(f: IO[bytes], offset: list[int]) -> Iterator[str]:
+    """Decode a file's lines, keeping `offset[0]` at the start of the line last read (at the end of the file, once all are)."""
+    pos = 0
+    for raw in f:
+        offset[0] = pos
+        pos += len(raw)
+        if raw.endswith(b'\r\n'):
+            raw = raw[:-2] + b'\n'
+        yield raw.decode(errors='replace')
+    offset[0] = pos
+
+
+def iter_messages(lines: Iterable[str], default_subject: str = '') -> Iterator[tuple[Optional[str], str, list[str], Optional[str]]]:
+    """(sha, subject, diff lines, base-commit) for each message of an mbox, in one pass.
+
+    Lines outside any message (e.g. a bare `git diff` saved as a `.patch`) form a
+    message of their own, with `default_subject`.
+    """
+    sha = None
+    subject = default_subject
+    headers = {}
+    state = 'message'
+    diff = []
+    base = None
+    started = False
+    last_header = None
+    for line in lines:
+        line = line.rstrip('\n')
+        if line.startswith('From ') and state != 'headers':
+            if started:
+                yield sha, subject, strip_blank(diff), base
+            m = FROM_SHA_RGX.match(line)
+            sha = m['sha'] if m else None
+            headers = {}
+            last_header = None
+            state = 'headers'
+            diff = []
+            base = None
+            started = True
+            continue
+        if state == 'headers':
+            if not line:
+                subject = decode_subject(headers.get('subject', default_subject))
+                state = 'message'
+            elif line[:1] in ' \t' and last_header:
+                # Folded header
+                headers[last_header] += ' ' + line.strip()
+            else:
+                key, _, value = line.partition(':')
+                last_header = key.lower()
+                headers[last_header] = value.strip()
+            continue
+        started = True
+        if state in ('message', 'stat'):
+            if line.startswith('diff --git '):
+                state = 'diff'
+            elif line == '---':
+                state = 'stat'
+                continue
+            else:
+                continue
+        if state == 'diff':
+            if line == '-- ':
+                # Signature (git's version), up to the next message
+                state = 'trailer'
+            elif line.startswith('base-commit: '):
+                base = line.split(' ', 1)[1].strip()
+            elif not line.startswith('prerequisite-patch-id: '):
+                diff.append(line)
+    if started:
+        yield sha, subject, strip_blank(diff), base
+
+
+def plain_binary(section: list[str]) -> list[str]:
+    """Replace a `GIT binary patch` (as `format-patch` writes) with the line `git diff` shows instead."""
+    try:
+        i = section.index('GIT binary patch')
+    except ValueError:
+        return section
+    header = section[:i]
+    old_path, new_path = section_paths(header)
+    old = '/dev/null' if any(line.startswith('new file mode') for line in header) else f'a/{old_path}'
+    new = '/dev/null' if any(line.startswith('deleted file mode') for line in header) else f'b/{new_path}'
+    return [*header, f'Binary files {old} and {new} differ']
+
+
+def file_change(sections: list[list[str]]) -> FileChange:
+    """Summarize one file's sections (from successive commits) as a `git diff --raw --numstat` entry would."""
+    path = section_path(sections[-1])
+    old_path = section_paths(sections[0])[0]
+    status = 'M'
+    old_blob = new_blob = None
+    added = deleted = 0
+    binary = False
+    for i, lines in enumerate(sections):
+        in_hunk = False
+        for line in lines:
+            if line.startswith('@@'):
+                in_hunk = True
+            elif in_hunk:
+                if line.startswith('+'):
+                    added += 1
+                elif line.startswith('-'):
+                    deleted += 1
+            elif line.startswith('new file mode') and i == 0:
+                status = 'A'
+            elif line.startswith('deleted file mode'):
+                status = 'D'
+            elif line.startswith('rename from') and status == 'M':
+                status = 'R'
+            elif line.startswith('index '):
+                m = INDEX_RGX.match(line)
+                if m:
+                    old_blob = old_blob or m['old']
+                    new_blob = m['new']
+            elif line.startswith('Binary files '):
+                binary = True
+
+    def blob(sha: Optional[str]) -> str:
+        return NULL_SHA if not sha or not sha.strip('0') else sha
+
+    return FileChange(
+        path, old_path if status == 'R' else path, status, blob(old_blob), blob(new_blob),
+        None if binary else added, None if binary else deleted,
+    )
+
+
+def read_sections(file: str, start: int, end: int) -> Dict[str, list[str]]:
+    """One message's per-file patch sections, re-read from bytes `start:end` of `file`."""
+    with open(file, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    sections = {}
+    for _, _, lines, _ in iter_messages(iter_lines(BytesIO(data), [0])):
+        for path, section in split_file_patches(lines):
+            sections[path] = plain_binary(section)
+    return sections
+
+
+class MboxSource:
+    """Patches of a series from an mbox, or a directory of `.patch` files (see `GitSource` for the interface)."""
+
+    def __init__(self, path: str):
+        self.refspec = path
+        self.files = sorted(glob(join(path, '*.patch'))) if isdir(path) else [path]
+        self.series: list[MboxCommit] = []
+        # Files' commits (indices into `series`)
+        self.touched: Dict[str, list[int]] = {}
+        self.base_commit = None
+        self.origin = None
+        self.sections = lru_cache(maxsize=CACHED_MESSAGES)(read_sections)
+        for file in self.files:
+            with open(file, 'rb') as f:
+                offset = [0]
+                start = 0
+                for sha, subject, lines, base_commit in iter_messages(iter_lines(f, offset), basename(file)):
+                    # Messages are delimited by their `From ` lines, so each ends where the next starts
+                    message = (file, start, offset[0])
+                    start = offset[0]
+                    self.base_commit = self.base_commit or base_commit
+                    if not lines:
+                        # Cover letter
+                        continue
+                    if not self.series:
+                        self.origin = sha
+                    # Messages without a `From <sha>` line get a placeholder (distinct in its first 7 digits)
+                    sha = sha or f'{len(self.series) + 1:07x}'.ljust(40, '0')
+                    commit = MboxCommit(sha, subject, message, [path for path, _ in split_file_patches(lines)])
+                    for path in commit.paths:
+                        self.touched.setdefault(path, []).append(len(self.series))
+                    self.series.append(commit)
+        self.by_sha = {commit.short_sha: commit for commit in self.series}
+
+    @cached_property
+    def base(self) -> Optional[str]:
+        """The commit the series applies onto: its `base-commit:`, or else its first commit's parent (if this repo has either)."""
+        for rev in (self.base_commit, self.origin and f'{self.origin}^'):
+            if not rev:
+                continue
+            result = run(['git', 'rev-parse', '--verify', '-q', f'{rev}^{{commit}}'], capture_output=True, text=True)
+            if result.returncode == 0:
+                return result.stdout.strip()
+        return None
+
+    @property
+    def range(self) -> str:
+        # With a base, upstream renames can be found from it
+        return f'{self.base}..' if self.base else self.refspec
+
+    @cached_property
+    def applied(self) -> Optional[GitSource]:
+        """The series applied onto its base, as a range (None, with a warning, if it has no base or doesn't apply)."""
+        reason = f"no base commit to apply {self.refspec} onto"
+        if self.base:
+            toplevel = run(['git', 'rev-parse', '--show-toplevel'], capture_output=True, text=True).stdout.strip()
+            with TemporaryDirectory() as tmp:
+                env = {**os.environ, **APPLIED_IDENTITY, 'GIT_INDEX_FILE': join(tmp, 'index')}
+
+                def git(*args, **kwargs):
+                    return run(['git', *args], env=env, cwd=toplevel or None, capture_output=True, text=True, **kwargs)
+
+                result = git('read-tree', self.base)
+                if result.returncode == 0:
+                    result = git('apply', '--cached', *map(abspath, self.files))
+                if result.returncode == 0:
+                    tree = git('write-tree').stdout.strip()
+                    tip = git('commit-tree', tree, '-p', self.base, input=f'{self.refspec}\n').stdout.strip()
+                    if tip:
+                        return GitSource(f'{self.base}..{tip}')
+                reason = f"{self.refspec} doesn't apply onto {self.base[:12]}: {result.stderr.strip()}"
+        several = [path for path, commits in self.touched.items() if len(commits) > 1]
+        if several:
+            err(f"Warning: {reason}; {len(several)} file(s) changed by several patches are compared hunk by hunk, and may differ spuriously: {', '.join(several)}")
+        return None
+
+    def commit_sections(self, commit: MboxCommit) -> Dict[str, list[str]]:
+        return self.sections(*commit.message)
+
+    def changes(self, paths=(), find_renames=None, find_copies=None) -> Dict[str, FileChange]:
+        if self.applied:
+            return self.applied.changes(paths, find_renames, find_copies)
+        return {
+            path: file_change([self.commit_sections(self.series[i])[path] for i in commits])
+            for path, commits in self.touched.items()
+        }
+
+    def numstat(self, paths=(), ignore_whitespace=False, find_renames=None, find_copies=None, follow=False) -> list[str]:
+        if self.applied:
+            return self.applied.numstat(paths, ignore_whitespace, find_renames, find_copies, follow)
+        return [
+            f"{'-' if change.binary else change.added}\t{'-' if change.binary else change.deleted}\t{path}"
+            for path, change in self.changes().items()
+        ]
+
+    def file_diff(self, path: str, *args) -> str:
+        """The file's cumulative patch (or, if the series can't be applied, its first section followed by the hunks of any later ones)."""
+        if self.applied:
+            return self.applied.file_diff(path, *args)
+        lines = []
+        for i in self.touched.get(path, ()):
+            section = self.commit_sections(self.series[i])[path]
+            if lines:
+                section = section[next((n for n, line in enumerate(section) if line.startswith('@@')), len(section)):]
+            lines.extend(section)
+        return '\n'.join(lines)
+
+    def stream_file_diff(self, path: str, *args) -> Iterator[str]:
+        if self.applied:
+            return self.applied.stream_file_diff(path, *args)
+        return iter(self.file_diff(path).splitlines())
+
+    def range_patches(self, paths=(), *args, wanted: Optional[set[str]] = None) -> Iterator[tuple[str, list[str]]]:
+        if self.applied:
+            yield from self.applied.range_patches(paths, *args, wanted=wanted)
+            return
+        for path in self.touched:
+            if wanted is None or path in wanted:
+                yield path, self.file_diff(path).splitlines()
+
+    def commits(self) -> list[str]:
+        """"<sha> <subject>" for each commit, newest first (like `git log --oneline`)."""
+        return [f'{commit.short_sha} {commit.subject}' for commit in reversed(self.series)]
+
+    def patch_ids(self) -> Dict[str, str]:
+        """`git patch-id --stable` of each commit, keyed by SHA."""
+        return compute_patch_ids((commit.sha, self.commit_text(commit)) for commit in self.series)
+
+    def commit_text(self, commit: MboxCommit, rules: Rules = None) -> str:
+        return '\n'.join(
+            '\n'.join(lines)
+            for path, lines in self.commit_sections(commit).items()
+            if not (rules and rules.excluded(path))
+        )
+
+    def commit_diff(self, sha: str, ignore_whitespace: bool = False, rules: Rules = None) -> str:
+        commit = self.by_sha.get(sha)
+        return self.commit_text(commit, rules) if commit else ''
+
+    def commit_files(self, sha: str) -> list[str]:
+        commit = self.by_sha.get(sha)
+        return list(commit.paths) if commit else []
+
+    def commit_file_diff(self, sha: str, path: str, *args) -> str:
+        commit = self.by_sha.get(sha)
+        return '\n'.join(self.commit_sections(commit).get(path, ())) if commit else ''
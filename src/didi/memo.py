@@ -0,0 +1,156 @@
+"""Whole-run memo: a command's computed comparison, so re-rendering it is instant.
+
+A `patch` comparison (file classifications, and the diff-of-diffs hunks) depends on
+the two ranges' resolved commits and on its semantic options (pathspecs, rules, diff
+and comparison options). `--quiet`, `--color`, `--pager` and `--format` only change
+how it's rendered. Computed comparisons are pickled to
+`<git-common-dir>/didi/memo/<key>.pickle`, where the key is a digest of the resolved
+SHAs and the semantic options.
+
+Resolving SHAs takes a git call, so each command line also gets a link file
+(`<digest>.link`, holding its key). The link's digest covers the refspecs as typed,
+the flags, and the cwd. A link is trusted while nothing that could change its
+resolution is newer than it. That means `HEAD` and pseudo-refs like `FETCH_HEAD`,
+refs, reflogs, git config, and `.didi.toml` (as in `didi.completion`). Re-running a command line with other
+presentation options then re-renders from the memo without running git at all.
+Comparisons against the working tree aren't memoized.
+"""
+
+import os
+import pickle
+import time
+from hashlib import blake2b
+from os.path import abspath, exists, expanduser, getmtime, join
+from subprocess import run
+from typing import Any, Optional
+
+from . import __version__
+from .completion import newest_mtime
+from .config import RULES_FILE
+from .gitdir import find_git_dirs
+
+# Bump when pickled results' classes change shape
+MEMO_VERSION = 1
+# Memoized comparisons kept per repo (least recently written are evicted first)
+MAX_ENTRIES = 64
+GLOBAL_CONFIGS = ('~/.gitconfig', '~/.config/git/config')
+# Refs written as files in the (per-worktree) git dir, outside refs/ and without reflogs
+PSEUDO_REFS = (
+    'FETCH_HEAD', 'ORIG_HEAD', 'MERGE_HEAD', 'REBASE_HEAD', 'CHERRY_PICK_HEAD', 'REVERT_HEAD',
+    'BISECT_HEAD', 'AUTO_MERGE',
+)
+
+
+def digest(*parts) -> str:
+    return blake2b(repr(parts).encode(), digest_size=16).hexdigest()
+
+
+def file_stamp(path: str) -> tuple:
+    """What identifies a snapshot or patch series' contents, without reading it."""
+    st = os.stat(path)
+    return abspath(path), st.st_mtime_ns, st.st_size
+
+
+class RunMemo:
+    """One command line's memoized comparison (see the module docstring).
+
+    `load` returns it if the command line's link is fresh (running no git). Otherwise
+    `resolve` keys it by the ranges' SHAs (one `git rev-parse` per range), and
+    `load`/`save` read and write it under that key.
+    """
+
+    def __init__(self, command: str, refspecs: tuple[str, ...], flags: dict, dirs: tuple[str, str, str]):
+        self.command = command
+        self.refspecs = refspecs
+        self.git_dir, self.common_dir, self.toplevel = dirs
+        self.directory = join(self.common_dir, 'didi', 'memo')
+        self.files = [refspec for refspec in refspecs if exists(refspec)]
+        self.link = join(self.directory, digest(
+            MEMO_VERSION, __version__, command, os.getcwd(), refspecs,
+            [file_stamp(path) for path in self.files], sorted(flags.items()),
+        ) + '.link')
+        self.key: Optional[str] = None
+        # Links are stamped with the start time, so refs updated during the run invalidate them
+        self.start = time.time()
+
+    @classmethod
+    def open(cls, command: str, refspecs: tuple[str, ...], flags: dict) -> Optional['RunMemo']:
+        """The memo of a command line, or None if it can't be memoized (outside a repo, or vs. the working tree)."""
+        dirs = find_git_dirs()
+        if dirs is None:
+            return None
+        if not all(exists(refspec) or '..' in refspec for refspec in refspecs):
+            return None
+        return cls(command, refspecs, flags, dirs)
+
+    def newest_change(self) -> float:
+        """The latest mtime of anything a link's resolution depends on."""
+        paths = [
+            join(self.git_dir, 'HEAD'),
+            *(join(self.git_dir, ref) for ref in PSEUDO_REFS),
+            join(self.git_dir, 'config.worktree'),
+            join(self.common_dir, 'config'),
+            join(self.toplevel, RULES_FILE),
+            *(expanduser(path) for path in GLOBAL_CONFIGS),
+        ]
+        if self.git_dir != self.common_dir:
+            for root, _, _ in os.walk(join(self.git_dir, 'logs')):
+                paths.append(root)
+        newest = max((getmtime(path) for path in paths if exists(path)), default=0.0)
+        return max(newest, newest_mtime(self.common_dir))
+
+    def path(self) -> str:
+        return join(self.directory, f'{self.key}.pickle')
+
+    def resolve(self, semantic: tuple) -> bool:
+        """Key the memo by the ranges' resolved SHAs and the semantic options; False if a range doesn't resolve."""
+        resolved = []
+        for refspec in self.refspecs:
+            if refspec in self.files:
+                resolved.append(file_stamp(refspec))
+                continue
+            result = run(['git', 'rev-parse', refspec], capture_output=True, text=True)
+            if result.returncode != 0:
+                return False
+            resolved.append(result.stdout.split())
+        self.key = digest(MEMO_VERSION, __version__, self.command, resolved, semantic)
+        return True
+
+    def load(self) -> Optional[Any]:
+        """The memoized comparison: via a fresh link (if not yet resolved), else under the resolved key."""
+        if self.key is None:
+            if not exists(self.link) or self.newest_change() > getmtime(self.link):
+                return None
+            with open(self.link) as f:
+                self.key = f.read().strip()
+        try:
+            with open(self.path(), 'rb') as f:
+                return pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            return None
+
+    def save(self, value: Any = None) -> None:
+        """Write the comparison under the resolved key (if given), and (re)point the command line's link at it."""
+        os.makedirs(self.directory, exist_ok=True)
+        if value is not None:
+            tmp = f'{self.path()}.{os.getpid()}.tmp'
+            with open(tmp, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self.path())
+            self.evict()
+        tmp = f'{self.link}.{os.getpid()}.tmp'
+        with open(tmp, 'w') as f:
+            f.write(f'{self.key}\n')
+        os.replace(tmp, self.link)
+        os.utime(self.link, (self.start, self.start))
+
+    def evict(self) -> None:
+        """Remove all but the `MAX_ENTRIES` newest comparisons (and the oldest links, which may point at them)."""
+        names = os.listdir(self.directory)
+        for suffix, keep in (('.pickle', MAX_ENTRIES), ('.link', 4 * MAX_ENTRIES)):
+            paths = sorted(
+                (join(self.directory, name) for name in names if name.endswith(suffix)),
+                key=getmtime,
+            )
+            for path in paths[:-keep]:
+                os.remove(path)
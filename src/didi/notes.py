@@ -0,0 +1,92 @@
+"""Verification records: range pairs already verified identical, kept in git notes.
+
+With `--notes`, `patch` and `commits` look for a record of the same comparison
+before computing anything. A record matches on the command, both ranges' resolved
+SHAs, and a digest of the options that affect results (and of git-didi's version).
+If one is found, the ranges are reported identical without comparing them. A new
+comparison that finds no differences is recorded. Records are lines of a note
+(under `refs/notes/didi`) on the second range's tip commit:
+
+    didi <command> <options digest> <range1 SHAs> <range2 SHAs> identical
+
+Notes are ordinary git objects, so records travel with the repo. Push them with
+`git push <remote> refs/notes/didi`, and fetch them with
+`git fetch <remote> refs/notes/didi:refs/notes/didi`. That way a rebase verified in
+CI isn't re-verified by a retry, or by a reviewer's clone. Only git ranges are
+recorded, not snapshots, patch files or the working tree.
+"""
+
+from os.path import exists
+from subprocess import run
+from typing import Optional
+
+from utz import err
+
+from . import __version__
+from .memo import digest
+
+NOTES_REF = 'didi'
+IDENTICAL = 'identical'
+
+
+def resolve_range(refspec: str) -> Optional[list[str]]:
+    """A range's commits as `git rev-parse` resolves them (e.g. `["<tip>", "^<base>"]`), or None."""
+    result = run(['git', 'rev-parse', refspec], capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+    return result.stdout.split()
+
+
+class Verification:
+    """The verification record of one comparison (see the module docstring).
+
+    `recorded` reads the tip commit's note (one `git notes show`), and `record`
+    rewrites it with this comparison's record added.
+    """
+
+    def __init__(self, command: str, shas1: list[str], shas2: list[str], semantic: tuple):
+        self.command = command
+        # Notes attach to the rebased range's tip (its first positive revision)
+        self.tip = next(sha for sha in shas2 if not sha.startswith('^'))
+        self.line = ' '.join((
+            'didi', command, digest(__version__, semantic), ','.join(shas1), ','.join(shas2), IDENTICAL,
+        ))
+
+    @classmethod
+    def open(cls, command: str, refspec1: str, refspec2: str, semantic: tuple) -> Optional['Verification']:
+        """The record of comparing two git ranges, or None if they aren't both ranges that resolve."""
+        if not all('..' in refspec and not exists(refspec) for refspec in (refspec1, refspec2)):
+            return None
+        shas1 = resolve_range(refspec1)
+        shas2 = resolve_range(refspec2)
+        if not shas1 or not shas2 or all(sha.startswith('^') for sha in shas2):
+            return None
+        return cls(command, shas1, shas2, semantic)
+
+    def lines(self) -> list[str]:
+        """The tip commit's note's lines (none if it has no note)."""
+        result = run(
+            ['git', 'notes', f'--ref={NOTES_REF}', 'show', self.tip],
+            capture_output=True, text=True,
+        )
+        return result.stdout.splitlines() if result.returncode == 0 else []
+
+    def recorded(self) -> bool:
+        """Whether this comparison was already verified identical."""
+        return self.line in self.lines()
+
+    def record(self) -> None:
+        """Record this comparison as verified identical (warning, rather than failing, if git can't)."""
+        lines = self.lines()
+        if self.line in lines:
+            return
+        result = run(
+            ['git', 'notes', f'--ref={NOTES_REF}', 'add', '-f', '-F', '-', self.tip],
+            input=''.join(f'{line}\n' for line in [*lines, self.line]),
+            capture_output=True, text=True,
+        )
+        if result.returncode != 0:
+            err(f"Warning: couldn't record verification in refs/notes/{NOTES_REF}: {result.stderr.strip()}")
+
+    def message(self) -> str:
+        return f"Verified identical (recorded in refs/notes/{NOTES_REF} on {self.tip[:12]}), not recomputed"
@@ -0,0 +1,106 @@
+"""In-process pathspec matching.
+
+Path arguments (and `--pathspec-from-file` lists, which can hold thousands of
+CODEOWNERS-derived entries) are parsed once and matched against the changed-file
+lists each range's `git diff --raw` already produced, instead of being spliced into
+every git command line. Supported forms, relative to the current directory like
+git's: exact files, directories (matching everything below them), and `*`/`?`/`[...]`
+wildcards (where `*` also matches "/"). Pathspecs with `:(magic)` are passed to git
+as-is.
+"""
+
+import re
+import sys
+from dataclasses import dataclass
+from fnmatch import translate
+from os.path import normpath
+from subprocess import run
+from typing import Iterable, Optional
+
+GLOB_CHARS = re.compile(r'[*?[]')
+
+
+def read_pathspec_file(path: str, nul: bool = False) -> list[str]:
+    """Read pathspecs from a file ("-" for stdin), one per line or NUL-separated."""
+    if path == '-':
+        data = sys.stdin.read()
+    else:
+        with open(path) as f:
+            data = f.read()
+    specs = data.split('\0') if nul else data.splitlines()
+    return [spec for spec in specs if spec]
+
+
+@dataclass
+class PathFilter:
+    """Pathspecs, resolved to repo-root-relative form and compiled once per run."""
+    literals: frozenset[str] = frozenset()
+    globs: tuple[str, ...] = ()
+    magic: tuple[str, ...] = ()
+
+    def __post_init__(self):
+        self._glob_rgx = re.compile('|'.join(translate(g) for g in self.globs)) if self.globs else None
+
+    def __bool__(self) -> bool:
+        return bool(self.literals or self.globs or self.magic)
+
+    @classmethod
+    def from_specs(cls, specs: Iterable[str], prefix: str = '') -> 'PathFilter':
+        """Parse pathspecs given relative to `prefix` (the current directory, relative to the repo root)."""
+        specs = list(specs)
+        if any(spec.startswith(':') for spec in specs):
+            # Magic pathspecs are left to git (along with the rest, which they may be combined with)
+            return cls(magic=tuple(specs))
+        literals = set()
+        globs = []
+        for spec in specs:
+            path = normpath(prefix + spec)
+            path = '' if path == '.' else path.rstrip('/')
+            if GLOB_CHARS.search(path):
+                globs.append(path)
+            else:
+                literals.add(path)
+        return cls(frozenset(literals), tuple(globs))
+
+    def git_pathspecs(self) -> tuple[str, ...]:
+        """Pathspecs that must still be passed to git."""
+        return self.magic
+
+    def matches(self, path: str) -> bool:
+        """Whether a (repo-relative) path is selected by these pathspecs."""
+        if not self or self.magic:
+            return True
+        if '' in self.literals or path in self.literals:
+            return True
+        # Directory pathspecs match everything below them
+        idx = path.rfind('/')
+        while idx > 0:
+            if path[:idx] in self.literals:
+                return True
+            idx = path.rfind('/', 0, idx)
+        return bool(self._glob_rgx and self._glob_rgx.match(path))
+
+    def filter(self, paths: Iterable[str]) -> list[str]:
+        """Keep paths selected by these pathspecs."""
+        if not self or self.magic:
+            return list(paths)
+        return [path for path in paths if self.matches(path)]
+
+
+ALL_PATHS = PathFilter()
+
+
+def load_path_filter(
+    paths: tuple[str, ...] = (),
+    pathspec_from_file: Optional[str] = None,
+    pathspec_file_nul: bool = False,
+) -> PathFilter:
+    """Combine path arguments with pathspecs read from a file, resolving them against the current directory."""
+    specs = list(paths)
+    if pathspec_from_file:
+        specs.extend(read_pathspec_file(pathspec_from_file, pathspec_file_nul))
+    if not specs:
+        return ALL_PATHS
+    result = run(['git', 'rev-parse', '--show-prefix'], capture_output=True, text=True)
+    prefix = result.stdout.strip() if result.returncode == 0 else ''
+    return PathFilter.from_specs(specs, prefix)
@@ -0,0 +1,177 @@
+"""Progress of long comparisons, reported on stderr.
+
+The comparison pipeline updates a `Progress`'s counters as it goes: the current
+phase, files (or commits) decided out of the total, bytes of patches read, and git
+processes running. While it's active, a background thread reports them with the
+throughput and an ETA. On a terminal, that's one status line, redrawn in place
+(stdout is buffered for the pager meanwhile, so the two don't interleave). Otherwise
+(e.g. in CI logs), it's a line every `LOG_INTERVAL` seconds. Nothing is shown for
+comparisons finishing within `DELAY` seconds.
+"""
+
+import sys
+from contextlib import contextmanager
+from threading import Event, Lock, Thread
+from time import perf_counter
+from typing import IO, Iterator, Optional
+
+# Seconds before anything is shown
+DELAY = 1.0
+# Seconds between redraws of the status line, and between log lines
+REFRESH = 0.2
+LOG_INTERVAL = 10.0
+
+
+def format_bytes(n: int) -> str:
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if n < 1024 or unit == 'GB':
+            return f"{n:.0f} {unit}" if unit == 'B' else f"{n:.1f} {unit}"
+        n /= 1024
+
+
+def format_duration(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02}:{seconds:02}" if hours else f"{minutes}:{seconds:02}"
+
+
+class Progress:
+    """A comparison's counters, and (as a context manager) their display on `stream`.
+
+    `mode` is "line" (a status line redrawn in place), "log" (periodic lines), or None
+    (counters only). `open` picks it for stderr.
+    """
+
+    def __init__(self, mode: Optional[str] = None, stream: Optional[IO[str]] = None, delay: float = DELAY):
+        self.mode = mode
+        self.stream = stream
+        self.delay = delay
+        self.lock = Lock()
+        self.name = ''
+        self.unit = 'files'
+        self.total: Optional[int] = None
+        self.done = 0
+        self.bytes = 0
+        self.running = 0
+        self.start = self.phase_start = perf_counter()
+        self.stopped = Event()
+        self.thread: Optional[Thread] = None
+        self.drawn = False
+
+    @classmethod
+    def open(cls, enabled: bool = True) -> 'Progress':
+        """Progress shown on stderr: a status line if it's a terminal (and stdout isn't written to it live), else log lines."""
+        if not enabled:
+            return cls()
+        # While paging, `sys.stdout` is a buffer (not a terminal)
+        mode = 'line' if sys.stderr.isatty() and not sys.stdout.isatty() else 'log'
+        return cls(mode, sys.stderr)
+
+    def phase(self, name: str, total: Optional[int] = None, unit: str = 'files') -> None:
+        """Start a phase, counting `total` `unit`s done (if known) from 0."""
+        with self.lock:
+            self.name = name
+            self.total = total
+            self.unit = unit
+            self.done = 0
+            self.phase_start = perf_counter()
+
+    def advance(self, n: int = 1, nbytes: int = 0) -> None:
+        """Count `n` files (or commits) done, and `nbytes` bytes read."""
+        with self.lock:
+            self.done += n
+            self.bytes += nbytes
+
+    def read(self, nbytes: int) -> None:
+        with self.lock:
+            self.bytes += nbytes
+
+    @contextmanager
+    def git(self) -> Iterator[None]:
+        """Count a git process as running while in this context."""
+        with self.lock:
+            self.running += 1
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.running -= 1
+
+    def status(self) -> str:
+        """The current phase and counters, with throughput and ETA, e.g. for a status line."""
+        with self.lock:
+            name, unit, total, done = self.name, self.unit, self.total, self.done
+            nbytes, running = self.bytes, self.running
+            elapsed = perf_counter() - self.phase_start
+        parts = []
+        if total:
+            parts.append(f"{done}/{total} {unit} ({100 * done // total}%)")
+        elif done:
+            parts.append(f"{done} {unit}")
+        if nbytes:
+            parts.append(format_bytes(nbytes))
+        if running:
+            parts.append(f"{running} git running")
+        rate = done / elapsed if elapsed > 0 else 0
+        if rate:
+            parts.append(f"{rate:.0f} {unit}/s")
+            if total and done < total:
+                parts.append(f"ETA {format_duration((total - done) / rate)}")
+        return f"{name}: {', '.join(parts)}" if parts else f"{name}…"
+
+    def draw(self) -> None:
+        if not self.name:
+            # No phase started yet
+            return
+        if self.mode == 'line':
+            self.stream.write(f"\r{self.status()}\x1b[K")
+            self.drawn = True
+        else:
+            self.stream.write(f"[{format_duration(perf_counter() - self.start)}] {self.status()}\n")
+        self.stream.flush()
+
+    def run(self) -> None:
+        if self.stopped.wait(self.delay):
+            return
+        interval = REFRESH if self.mode == 'line' else LOG_INTERVAL
+        while True:
+            self.draw()
+            if self.stopped.wait(interval):
+                return
+
+    def __enter__(self) -> 'Progress':
+        if self.mode:
+            self.thread = Thread(target=self.run, daemon=True)
+            self.thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self.thread:
+            self.stopped.set()
+            self.thread.join()
+            self.thread = None
+            if self.drawn:
+                # Clear the status line, so what's printed next starts on a clean line
+                self.stream.write("\r\x1b[K")
+                self.stream.flush()
+
+
+class NullProgress(Progress):
+    """A `Progress` that neither counts nor shows anything, so one can be shared between comparisons."""
+
+    def phase(self, name: str, total: Optional[int] = None, unit: str = 'files') -> None:
+        pass
+
+    def advance(self, n: int = 1, nbytes: int = 0) -> None:
+        pass
+
+    def read(self, nbytes: int) -> None:
+        pass
+
+    @contextmanager
+    def git(self) -> Iterator[None]:
+        yield
+
+
+# Shared by every comparison run without progress (the default for library callers)
+NO_PROGRESS = NullProgress()
@@ -0,0 +1,222 @@
+"""What was changed by hand while rebasing: each commit's committed result vs. git's automatic merge.
+
+For each pair of corresponding commits (original, rebased), the original is
+cherry-picked onto the rebased commit's parent in memory, with
+`git merge-tree --write-tree` (base: the original's parent). Diffing that automatic
+result against the rebased commit leaves only what a human changed: conflict
+resolutions, and any other edits made along the way. Rebased merge commits are
+audited with `git show --remerge-diff`, which re-does the merge of their parents.
+
+Nothing touches the worktree, index or refs. Before git 2.40 (which added
+`merge-tree --merge-base`), the cherry-pick's merge base is set up with a synthetic,
+unreferenced commit (whose parent is the original's parent, and whose tree is the
+rebased commit's parent's).
+"""
+
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import lru_cache
+from subprocess import run
+from typing import Dict, Iterator, Optional
+
+from .diff import DiffTreeBatch
+from .source import GitSource
+
+CLEAN = 'clean'
+RESOLVED = 'resolved'
+EDITED = 'edited'
+MARKERS = 'conflict markers'
+SKIPPED = 'skipped'
+
+REMERGE_CONFLICT_RGX = re.compile(r'remerge CONFLICT \([^)]*\): .* in (?P<path>.*)$')
+# Identity and dates of synthetic merge-base commits (fixed, so repeated audits reuse the same objects)
+SYNTHETIC_ENV = {
+    'GIT_AUTHOR_NAME': 'git-didi',
+    'GIT_AUTHOR_EMAIL': 'git-didi@localhost',
+    'GIT_AUTHOR_DATE': '@0 +0000',
+    'GIT_COMMITTER_NAME': 'git-didi',
+    'GIT_COMMITTER_EMAIL': 'git-didi@localhost',
+    'GIT_COMMITTER_DATE': '@0 +0000',
+}
+
+
+@dataclass
+class CommitInfo:
+    sha: str
+    tree: str
+    parents: list[str]
+
+
+@dataclass
+class RemergeResult:
+    """How a rebased commit differs from git's automatic merge of its original."""
+    index: int
+    sha1: str
+    sha2: str
+    subject: str
+    status: str
+    conflicts: list[str] = field(default_factory=list)
+    diff: str = ''
+    merge: bool = False
+
+    @property
+    def summary(self) -> str:
+        paths = ', '.join(self.conflicts)
+        summary = {
+            CLEAN: 'clean',
+            RESOLVED: f'conflicts resolved by hand in {paths}',
+            EDITED: 'changed by hand',
+            MARKERS: f'conflict markers committed in {paths}',
+            SKIPPED: 'skipped (no parent to re-merge onto)',
+        }[self.status]
+        return f'merge {summary}' if self.merge else summary
+
+    @property
+    def manual(self) -> bool:
+        """Whether anything was changed by hand (or conflict markers were committed)."""
+        return self.status != CLEAN and self.status != SKIPPED
+
+    def record(self) -> dict:
+        """JSON-serializable form (as emitted by `commits --remerge --format=jsonl`)."""
+        return dict(
+            type='remerge',
+            index=self.index,
+            sha1=self.sha1,
+            sha2=self.sha2,
+            subject=self.subject,
+            status=self.status,
+            merge=self.merge,
+            conflicts=self.conflicts,
+            diff=self.diff.splitlines(),
+        )
+
+
+def commit_infos(refspec: str) -> Dict[str, CommitInfo]:
+    """Full SHA, tree and parents of each commit in a range, keyed by both abbreviated and full SHA."""
+    result = run(['git', 'log', '--format=%h %H %T %P', refspec], capture_output=True, text=True)
+    infos = {}
+    for line in result.stdout.splitlines():
+        short, sha, tree, *parents = line.split(' ')
+        infos[short] = infos[sha] = CommitInfo(sha, tree, parents)
+    return infos
+
+
+@lru_cache(maxsize=None)
+def merge_tree_has_merge_base() -> bool:
+    """Whether `git merge-tree` takes `--merge-base` (git 2.40+)."""
+    result = run(['git', 'merge-tree', '-h'], capture_output=True, text=True)
+    return '--merge-base' in result.stdout + result.stderr
+
+
+def synthetic_parent(tree: str, parent: str) -> str:
+    """An unreferenced commit of `tree` whose parent is `parent` (so it merges with `parent`'s children against `parent`)."""
+    result = run(
+        ['git', 'commit-tree', tree, '-p', parent, '-m', 'git-didi remerge base'],
+        capture_output=True, text=True, check=True, env={**os.environ, **SYNTHETIC_ENV},
+    )
+    return result.stdout.strip()
+
+
+def cherry_pick_tree(original: CommitInfo, onto: CommitInfo) -> tuple[str, list[str]]:
+    """The tree (and conflicted paths) of `original` cherry-picked onto `onto`, merged in memory."""
+    base = original.parents[0]
+    if merge_tree_has_merge_base():
+        branches = [f'--merge-base={base}', onto.sha, original.sha]
+    else:
+        branches = [synthetic_parent(onto.tree, base), original.sha]
+    result = run(
+        ['git', 'merge-tree', '--write-tree', '--name-only', '--no-messages', *branches],
+        capture_output=True, text=True,
+    )
+    if result.returncode not in (0, 1):
+        raise RuntimeError(f"git merge-tree failed for {original.sha}: {result.stderr.strip()}")
+    tree, *paths = result.stdout.splitlines()
+    # Conflicted paths (once per stage) end at a blank line
+    conflicts = []
+    for path in paths:
+        if not path:
+            break
+        if path not in conflicts:
+            conflicts.append(path)
+    return tree, conflicts
+
+
+def remerge_diff(
+    sha: str,
+    ignore_whitespace: bool,
+    unified: int,
+    pathspecs: tuple[str, ...],
+) -> tuple[str, list[str]]:
+    """A merge commit's `git show --remerge-diff` (and the paths its re-merge conflicted in)."""
+    cmd = ['git', 'show', '--remerge-diff', '--no-color', '--format=', f'-U{unified}']
+    if ignore_whitespace:
+        cmd.append('-w')
+    cmd.append(sha)
+    if pathspecs:
+        cmd.extend(['--', *pathspecs])
+    diff = run(cmd, capture_output=True, text=True).stdout
+    conflicts = []
+    for line in diff.splitlines():
+        m = REMERGE_CONFLICT_RGX.match(line)
+        if m and m['path'] not in conflicts:
+            conflicts.append(m['path'])
+    return diff, conflicts
+
+
+def status_of(conflicts: list[str], diff: str) -> str:
+    if not diff:
+        # Conflicts, but nothing changed: the auto-merge's conflict markers were committed
+        return MARKERS if conflicts else CLEAN
+    return RESOLVED if conflicts else EDITED
+
+
+class RemergeAudit:
+    """Audits corresponding commits of two git ranges (see the module docstring), in parallel."""
+
+    def __init__(
+        self,
+        source1: GitSource,
+        source2: GitSource,
+        ignore_whitespace: bool = False,
+        unified: int = 3,
+        find_renames: str = None,
+        find_copies: str = None,
+        pathspecs: tuple[str, ...] = (),
+        max_workers: int = 8,
+    ):
+        self.source2 = source2
+        self.infos1 = commit_infos(source1.refspec)
+        self.infos2 = commit_infos(source2.refspec)
+        self.ignore_whitespace = ignore_whitespace
+        self.unified = unified
+        self.pathspecs = pathspecs
+        self.max_workers = max_workers
+        self.batch: DiffTreeBatch = source2.diff_batch(ignore_whitespace, unified, find_renames, find_copies, pathspecs)
+
+    def audit(self, index: int, sha1: str, sha2: str, subject: str) -> RemergeResult:
+        """Compare one rebased commit (`sha2`) against the automatic merge of its original (`sha1`)."""
+        info1: Optional[CommitInfo] = self.infos1.get(sha1)
+        info2: Optional[CommitInfo] = self.infos2.get(sha2)
+        if info2 and len(info2.parents) > 1:
+            diff, conflicts = remerge_diff(info2.sha, self.ignore_whitespace, self.unified, self.pathspecs)
+            return RemergeResult(index, sha1, sha2, subject, status_of(conflicts, diff), conflicts, diff, merge=True)
+        if not (info1 and info2 and info1.parents and info2.parents):
+            # Root commits (or commits outside the ranges) have no merge to re-do
+            return RemergeResult(index, sha1, sha2, subject, SKIPPED)
+        onto = self.infos2.get(info2.parents[0]) or self.parent_info(info2.parents[0])
+        tree, conflicts = cherry_pick_tree(info1, onto)
+        diff = self.batch.submit_trees(tree, info2.tree).result()
+        return RemergeResult(index, sha1, sha2, subject, status_of(conflicts, diff), conflicts, diff)
+
+    @staticmethod
+    def parent_info(sha: str) -> CommitInfo:
+        result = run(['git', 'log', '-1', '--format=%H %T %P', sha], capture_output=True, text=True, check=True)
+        sha, tree, *parents = result.stdout.split()
+        return CommitInfo(sha, tree, parents)
+
+    def run(self, pairs: list[tuple[int, str, str, str]]) -> Iterator[RemergeResult]:
+        """Audit (index, sha1, sha2, subject) pairs in parallel, yielding results in order."""
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            yield from executor.map(lambda pair: self.audit(*pair), pairs)
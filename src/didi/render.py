@@ -0,0 +1,538 @@
+"""Rendering of diff and diff-of-diffs output.
+
+Line styles are looked up in tables precomputed at import time (keyed by a line's first
+two characters), and output is accumulated and written to stdout in batches. `stat`,
+`patch`, `commits` and `swatches` all render through a `Renderer`; `renderer()` picks
+the backend.
+
+In color, similar lines removed from and added to the diff-of-diffs (e.g. `-+old` and
+`++new`) also get their differing words highlighted. Pairs are only matched as
+they're rendered, and only by `AnsiRenderer`, so other backends pay nothing for it.
+"""
+
+import json
+import re
+import sys
+import zlib
+from base64 import b64encode
+from contextlib import contextmanager
+from difflib import SequenceMatcher
+from functools import lru_cache
+from html import escape
+from typing import Iterator, Optional
+
+from click import style
+from utz import err
+
+# 256-color palette for nested (diff-of-diffs) lines
+WHITE = 231
+CLEAR = 0
+BRIGHT_GREEN = 28
+DARK_GREEN = 22
+VDARK_GREEN = 23
+BRIGHT_RED = 161
+DARK_RED = 88
+VDARK_RED = 52
+
+# Nested 2-char prefix → (bold, 1st char bg, 2nd char bg, rest-of-line bg).
+# Each prefix char gets its own background (+ green, - red, space clear); the rest of
+# the line's background is determined by the first (outer) char.
+NESTED_STYLES = {
+    '++': (True, BRIGHT_GREEN, BRIGHT_GREEN, BRIGHT_GREEN),
+    '--': (True, BRIGHT_RED, BRIGHT_RED, BRIGHT_RED),
+    '+ ': (False, BRIGHT_GREEN, CLEAR, VDARK_GREEN),
+    '- ': (False, BRIGHT_RED, CLEAR, VDARK_RED),
+    '+-': (False, BRIGHT_GREEN, BRIGHT_RED, DARK_GREEN),
+    '-+': (False, BRIGHT_RED, BRIGHT_GREEN, DARK_RED),
+}
+# Any other line in an added/removed section of the outer diff (e.g. "+diff", "-index")
+NESTED_DEFAULT_STYLES = {
+    '+': (False, BRIGHT_GREEN, CLEAR, DARK_GREEN),
+    '-': (False, BRIGHT_RED, CLEAR, DARK_RED),
+}
+
+# Backgrounds of words that differ between paired lines, by outer char
+BRIGHTER_GREEN = 34
+BRIGHTER_RED = 196
+INTRALINE_BGS = {'+': BRIGHTER_GREEN, '-': BRIGHTER_RED}
+# Lines longer than this (after the 2-char prefix) aren't highlighted
+INTRALINE_MAX_CHARS = 500
+# Removed/added lines held back (per block) for pairing; larger blocks are rendered as they come
+INTRALINE_MAX_LINES = 200
+# Lines less similar than this are unrelated (highlighting them would just add noise)
+INTRALINE_MIN_RATIO = 0.5
+TOKEN_RGX = re.compile(r'\w+|\s+|[^\w\s]')
+
+# Named foreground styles for headers, banners and messages
+STYLES = {
+    'added': dict(fg='green'),
+    'removed': dict(fg='red'),
+    'hunk': dict(fg='cyan'),
+    'rule': dict(fg='blue'),
+    'title': dict(fg='yellow', bold=True),
+    'error': dict(fg='red'),
+    'error_title': dict(fg='red', bold=True),
+    # `patch --classify` statuses
+    'changed': dict(fg='red'),
+    'dropped': dict(fg='red'),
+    'renamed': dict(fg='cyan'),
+}
+
+# Diff-of-diffs lines rendered with a named (fg-only) style instead of a nested style:
+# outer diff headers/hunk headers, and nested diff metadata. Keyed by the first 2 chars;
+# each entry lists (prefix, style) pairs to check, in order.
+META_PREFIXES = {
+    '@@': (('@@', 'hunk'),),
+    '--': (('---', 'removed'),),
+    '++': (('+++', 'added'),),
+    '-+': (('-+++', 'removed'),),
+    '+-': (('+---', 'added'),),
+    '-@': (('-@@', 'removed'),),
+    '+@': (('+@@', 'added'),),
+    '-i': (('-index ', 'removed'),),
+    '+i': (('+index ', 'added'),),
+    '-d': (('-diff ', 'removed'),),
+    '+d': (('+diff ', 'added'),),
+}
+
+# Plain (outer) diff lines, keyed by first char
+DIFF_STYLES = {'+': 'added', '-': 'removed', '@': 'hunk'}
+
+RESET = '\033[0m'
+
+
+def _nested_escapes(bold: bool, bg0: int, bg1: int, bg2: int) -> tuple[str, str, str]:
+    weight = '1;' if bold else ''
+    return (
+        f'\033[{weight}38;5;{WHITE};48;5;{bg0}m',
+        f'\033[48;5;{bg1}m',
+        f'\033[48;5;{bg2}m',
+    )
+
+
+NESTED_ESCAPES = {prefix: _nested_escapes(*s) for prefix, s in NESTED_STYLES.items()}
+NESTED_DEFAULT_ESCAPES = {c: _nested_escapes(*s) for c, s in NESTED_DEFAULT_STYLES.items()}
+STYLE_ESCAPES = {name: style('', reset=False, **kwargs) for name, kwargs in STYLES.items()}
+
+
+Spans = tuple[tuple[int, int], ...]
+
+
+@lru_cache(maxsize=4096)
+def intraline_spans(old: str, new: str) -> Optional[tuple[Spans, Spans]]:
+    """(start, end) character spans of the words that differ between two lines, or None if they're too different.
+
+    Memoized: the same change often appears in several hunks, or on both sides of a rebase.
+    """
+    if len(old) > INTRALINE_MAX_CHARS or len(new) > INTRALINE_MAX_CHARS or old == new:
+        return None
+    old_tokens = TOKEN_RGX.findall(old)
+    new_tokens = TOKEN_RGX.findall(new)
+    matcher = SequenceMatcher(None, old_tokens, new_tokens, autojunk=False)
+    if matcher.ratio() < INTRALINE_MIN_RATIO:
+        return None
+    old_offsets = [0]
+    for token in old_tokens:
+        old_offsets.append(old_offsets[-1] + len(token))
+    new_offsets = [0]
+    for token in new_tokens:
+        new_offsets.append(new_offsets[-1] + len(token))
+    old_spans, new_spans = [], []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            continue
+        if i2 > i1:
+            old_spans.append((old_offsets[i1], old_offsets[i2]))
+        if j2 > j1:
+            new_spans.append((new_offsets[j1], new_offsets[j2]))
+    return tuple(old_spans), tuple(new_spans)
+
+
+def pair_lines(removed: list[str], added: list[str]) -> dict[int, Spans]:
+    """Highlight spans of a block's removed and added lines, keyed by index in `removed + added`.
+
+    Lines pair up in order among those with the same inner char (`-+` with `++`, `--`
+    with `+-`, `- ` with `+ `).
+    """
+    spans = {}
+    for inner in '+- ':
+        old = [i for i, line in enumerate(removed) if line[1] == inner]
+        new = [len(removed) + j for j, line in enumerate(added) if line[1] == inner]
+        for i, j in zip(old, new):
+            pair = intraline_spans(removed[i][2:], added[j - len(removed)][2:])
+            if pair:
+                old_spans, new_spans = pair
+                if old_spans:
+                    spans[i] = old_spans
+                if new_spans:
+                    spans[j] = new_spans
+    return spans
+
+
+def meta_style(line: str) -> Optional[str]:
+    """Return the named style for a diff-of-diffs header/metadata line, if it is one."""
+    for prefix, name in META_PREFIXES.get(line[:2], ()):
+        if line.startswith(prefix):
+            return name
+    return None
+
+
+class Renderer:
+    """Base renderer: accumulates output lines and writes them to stdout in batches.
+
+    Subclasses override the `format_*` methods to style lines.
+    """
+
+    def __init__(self, batch_lines: int = 4096):
+        self.batch_lines = batch_lines
+        self.lines = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.flush()
+
+    def write(self, text: str = '') -> None:
+        """Queue one (already formatted) output line."""
+        self.lines.append(text)
+        if len(self.lines) >= self.batch_lines:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write queued lines to (the current) stdout."""
+        if self.lines:
+            sys.stdout.write('\n'.join(self.lines) + '\n')
+            self.lines = []
+        sys.stdout.flush()
+
+    def err(self, msg: str) -> None:
+        """Print a message to stderr, after everything rendered so far."""
+        self.flush()
+        err(msg)
+
+    def line(self, text: str = '') -> None:
+        """Render an unstyled line."""
+        self.write(text)
+
+    def styled(self, text: str, name: str) -> None:
+        """Render a line in one of the named `STYLES`."""
+        self.write(self.format_styled(text, name))
+
+    def diff_line(self, line: str) -> None:
+        """Render a line of a plain unified diff."""
+        self.write(self.format_diff_line(line))
+
+    def nested_line(self, line: str) -> None:
+        """Render a line of a diff-of-diffs."""
+        self.write(self.format_nested_line(line))
+
+    @contextmanager
+    def file_section(self, title: str) -> Iterator[None]:
+        """Render one file's section: its title between rules, then whatever's rendered inside the block."""
+        self.line()
+        self.styled('=' * 60, 'rule')
+        self.styled(title, 'title')
+        self.styled('=' * 60, 'rule')
+        yield
+
+    def record(self, record: dict) -> None:
+        """Emit a structured (machine-readable) record; ignored by text backends."""
+
+    def span(self, text: str, name: str) -> str:
+        """Style part of a line in one of the named `STYLES`."""
+        return self.format_styled(text, name)
+
+    def format_styled(self, text: str, name: str) -> str:
+        return text
+
+    def format_diff_line(self, line: str) -> str:
+        return line
+
+    def format_nested_line(self, line: str) -> str:
+        return line
+
+
+class PlainRenderer(Renderer):
+    """Uncolored output."""
+
+
+class AnsiRenderer(Renderer):
+    """Terminal output, using ANSI (256-color) escapes.
+
+    Outer-removed nested lines are held back until the following outer-added ones
+    arrive, so similar lines can be paired and their differing words highlighted.
+    """
+
+    def __init__(self, batch_lines: int = 4096):
+        super().__init__(batch_lines)
+        self.removed: list[str] = []
+        self.added: list[str] = []
+
+    def write(self, text: str = '') -> None:
+        if self.removed:
+            self.write_block()
+        super().write(text)
+
+    def flush(self) -> None:
+        if self.removed:
+            self.write_block()
+        super().flush()
+
+    def nested_line(self, line: str) -> None:
+        pairable = len(line) > 2 and line[0] in '+-' and line[1] in '+- ' and meta_style(line) is None
+        if pairable and line[0] == '-' and not self.added:
+            self.removed.append(line)
+        elif pairable and line[0] == '+' and self.removed:
+            self.added.append(line)
+        else:
+            if self.removed:
+                self.write_block()
+            if pairable and line[0] == '-':
+                self.removed.append(line)
+                return
+            super().write(self.format_nested_line(line))
+            return
+        if len(self.removed) + len(self.added) >= INTRALINE_MAX_LINES:
+            self.write_block(pair=False)
+
+    def write_block(self, pair: bool = True) -> None:
+        """Render held-back removed and added lines, with paired lines' differences highlighted."""
+        lines = self.removed + self.added
+        spans = pair_lines(self.removed, self.added) if pair and self.added else {}
+        self.removed, self.added = [], []
+        for i, line in enumerate(lines):
+            super().write(self.format_nested_line(line, spans.get(i)))
+
+    def format_styled(self, text: str, name: str) -> str:
+        return f'{STYLE_ESCAPES[name]}{text}{RESET}'
+
+    def format_diff_line(self, line: str) -> str:
+        name = DIFF_STYLES.get(line[:1])
+        return self.format_styled(line, name) if name else line
+
+    def format_nested_line(self, line: str, spans: Spans = None) -> str:
+        name = meta_style(line)
+        if name:
+            return self.format_styled(line, name)
+        if len(line) < 2 or line[0] not in '+-':
+            return line
+        escapes = NESTED_ESCAPES.get(line[:2]) or NESTED_DEFAULT_ESCAPES[line[0]]
+        pre0, pre1, pre2 = escapes
+        rest = line[2:]
+        if spans:
+            highlight = f'\033[4;48;5;{INTRALINE_BGS[line[0]]}m'
+            parts = []
+            end = 0
+            for start, stop in spans:
+                parts.append(f'{rest[end:start]}{highlight}{rest[start:stop]}\033[24m{pre2}')
+                end = stop
+            parts.append(rest[end:])
+            rest = ''.join(parts)
+        return f'{pre0}{line[0]}{pre1}{line[1]}{pre2}{rest}{RESET}'
+
+
+class JsonlRenderer(Renderer):
+    """Machine-readable output: one JSON record per line, written as soon as it's emitted.
+
+    Human-oriented text lines are dropped without being formatted.
+    """
+
+    def write(self, text: str = '') -> None:
+        pass
+
+    def format_styled(self, text: str, name: str) -> str:
+        return text
+
+    def record(self, record: dict) -> None:
+        sys.stdout.write(json.dumps(record, ensure_ascii=False) + '\n')
+        sys.stdout.flush()
+
+
+def xterm_hex(color: int) -> str:
+    """CSS color of a 256-color palette index (`CLEAR` is transparent)."""
+    if color == CLEAR:
+        return 'transparent'
+    if color >= 232:
+        r = g = b = 8 + 10 * (color - 232)
+    else:
+        levels = (0, 95, 135, 175, 215, 255)
+        n = color - 16
+        r, g, b = levels[n // 36], levels[n // 6 % 6], levels[n % 6]
+    return f'#{r:02x}{g:02x}{b:02x}'
+
+
+# HTML colors for the named styles' (terminal) foreground colors
+HTML_COLORS = {'green': '#5fd75f', 'red': '#ff5f5f', 'cyan': '#5fd7d7', 'blue': '#5f87ff', 'yellow': '#ffd75f'}
+
+# Nested prefix (or default, by first char) → CSS class
+NESTED_CLASSES = {prefix: f'n{i}' for i, prefix in enumerate([*NESTED_STYLES, *NESTED_DEFAULT_STYLES])}
+
+
+def _html_css() -> str:
+    rules = [
+        'body{background:#1c1c1c;color:#d0d0d0;font:13px/1.35 monospace;margin:1em;display:flex;flex-direction:column}',
+        'nav{order:-1;margin-bottom:1em}',
+        'a{color:#87afff}',
+        'body div{white-space:pre;min-height:1.35em}',
+        'summary{cursor:pointer;white-space:pre}',
+        'summary small{color:#808080}',
+    ]
+    for name, kwargs in STYLES.items():
+        weight = ';font-weight:bold' if kwargs.get('bold') else ''
+        rules.append(f".s-{name}{{color:{HTML_COLORS[kwargs['fg']]}{weight}}}")
+    for prefix, (bold, bg0, bg1, bg2) in {**NESTED_STYLES, **NESTED_DEFAULT_STYLES}.items():
+        cls = NESTED_CLASSES[prefix]
+        weight = ';font-weight:bold' if bold else ''
+        rules.extend([
+            f'.{cls}{{color:{xterm_hex(WHITE)}{weight}}}',
+            f'.{cls} .a{{background:{xterm_hex(bg0)}}}',
+            f'.{cls} .b{{background:{xterm_hex(bg1)}}}',
+            f'.{cls} .r{{background:{xterm_hex(bg2)}}}',
+        ])
+    return '\n'.join(rules)
+
+
+# Expands a file's section (deflated "<class>\t<text>" lines, base64-encoded) when it's first opened
+HTML_SCRIPT = """
+function renderLine(line) {
+  const div = document.createElement('div');
+  const i = line.indexOf('\\t'), cls = line.slice(0, i), text = line.slice(i + 1);
+  if (cls) div.className = cls;
+  if (cls[0] === 'n') {
+    for (const [c, t] of [['a', text[0]], ['b', text[1]], ['r', text.slice(2)]]) {
+      const span = document.createElement('span');
+      span.className = c;
+      span.textContent = t;
+      div.appendChild(span);
+    }
+  } else {
+    div.textContent = text;
+  }
+  return div;
+}
+async function expand(details) {
+  if (details.dataset.expanded) return;
+  details.dataset.expanded = '1';
+  const data = details.querySelector('script').textContent;
+  const bytes = Uint8Array.from(atob(data), c => c.charCodeAt(0));
+  const stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream('deflate'));
+  const text = await new Response(stream).text();
+  const fragment = document.createDocumentFragment();
+  for (const line of text.split('\\n').slice(0, -1)) fragment.appendChild(renderLine(line));
+  details.appendChild(fragment);
+}
+function openHash() {
+  const target = document.getElementById(location.hash.slice(1));
+  if (target && target.tagName === 'DETAILS') target.open = true;
+}
+document.addEventListener('toggle', e => { if (e.target.open) expand(e.target); }, true);
+addEventListener('hashchange', openHash);
+addEventListener('load', openHash);
+"""
+
+
+def html_line(line: str) -> str:
+    """One "<class>\t<text>" line as an HTML element (nested lines get a span per background)."""
+    cls, _, text = line.partition('\t')
+    attr = f' class="{cls}"' if cls else ''
+    if cls.startswith('n'):
+        return (
+            f'<div{attr}><span class="a">{escape(text[0])}</span><span class="b">{escape(text[1])}</span>'
+            f'<span class="r">{escape(text[2:])}</span></div>'
+        )
+    return f'<div{attr}>{escape(text)}</div>'
+
+
+class HtmlRenderer(Renderer):
+    """A single, self-contained HTML report, written as it's rendered.
+
+    Lines are formatted as "<class>\t<text>"; inside a file section they're deflated
+    as they arrive, and the section is written (base64-encoded, under a collapsed
+    `<details>`) when it ends. The browser decompresses and renders a section when
+    it's opened, so large reports load quickly; only the current section's
+    compressed bytes (and the file index) are held in memory. The index is written
+    last, and displayed first.
+    """
+
+    def __init__(self, batch_lines: int = 4096):
+        super().__init__(batch_lines)
+        self.index: list[str] = []
+        self.compressor = None
+        self.chunks: list[bytes] = []
+        self.section_lines = 0
+        super().write(
+            '<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>git-didi</title>\n'
+            f'<style>\n{_html_css()}\n</style>\n<script>{HTML_SCRIPT}</script>\n</head><body>'
+        )
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        entries = ''.join(
+            f'<li><a href="#f{i}">{escape(title)}</a></li>'
+            for i, title in enumerate(self.index)
+        )
+        super().write(f'<nav><ol>{entries}</ol></nav>' if entries else '')
+        super().write('</body></html>')
+        super().__exit__(exc_type, exc_val, exc_tb)
+
+    def write(self, text: str = '') -> None:
+        if self.compressor:
+            self.chunks.append(self.compressor.compress(f'{text}\n'.encode()))
+            self.section_lines += 1
+        else:
+            super().write(html_line(text))
+
+    @contextmanager
+    def file_section(self, title: str) -> Iterator[None]:
+        id = f'f{len(self.index)}'
+        self.index.append(title)
+        self.compressor = zlib.compressobj()
+        try:
+            yield
+        finally:
+            data = b''.join(self.chunks) + self.compressor.flush()
+            lines = self.section_lines
+            self.compressor = None
+            self.chunks = []
+            self.section_lines = 0
+            super().write(
+                f'<details id="{id}"><summary class="s-title">{escape(title)} <small>({lines} lines)</small></summary>'
+                f'<script type="application/x-didi-deflate">{b64encode(data).decode()}</script></details>'
+            )
+
+    def line(self, text: str = '') -> None:
+        self.write(f'\t{text}')
+
+    def span(self, text: str, name: str) -> str:
+        # Lines are escaped as text, so they can't carry markup
+        return text
+
+    def format_styled(self, text: str, name: str) -> str:
+        return f's-{name}\t{text}'
+
+    def format_diff_line(self, line: str) -> str:
+        name = DIFF_STYLES.get(line[:1])
+        return f"{f's-{name}' if name else ''}\t{line}"
+
+    def format_nested_line(self, line: str) -> str:
+        name = meta_style(line)
+        if name:
+            return self.format_styled(line, name)
+        if len(line) < 2 or line[0] not in '+-':
+            return f'\t{line}'
+        return f'{NESTED_CLASSES.get(line[:2]) or NESTED_CLASSES[line[0]]}\t{line}'
+
+
+BACKENDS = {
+    'ansi': AnsiRenderer,
+    'plain': PlainRenderer,
+    'jsonl': JsonlRenderer,
+    'html': HtmlRenderer,
+}
+
+
+def renderer(use_color: bool, backend: str = None) -> Renderer:
+    """Construct the renderer for a command's output."""
+    if backend is None:
+        backend = 'ansi' if use_color else 'plain'
+    return BACKENDS[backend]()
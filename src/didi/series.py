@@ -0,0 +1,202 @@
+"""N-way comparison of a patch series' revisions (e.g. v1 vs v2 vs v3).
+
+Each range's per-file patches (and, optionally, per-commit patches) are fetched with
+one streamed git call per range, and fingerprinted once; every pair of revisions is
+then compared from those fingerprints, and any pair's diff-of-diffs is built from the
+already-fetched patch texts.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from subprocess import PIPE, Popen
+from typing import Dict, Optional
+
+from .compare import ADDED, CHANGED, DROPPED, FileResult
+from .config import NO_RULES, Rules
+from .diff import (
+    FileChange,
+    compute_upstream_range,
+    get_file_changes,
+    get_rename_mapping,
+    split_file_patches,
+    stream_range_diff,
+)
+from .hunks import digest_lines, match_hunks, parse_hunks, patch_id
+from .pathspec import ALL_PATHS, PathFilter
+
+ABSENT = '·'
+
+
+@dataclass
+class Revision:
+    """One range of a series: its per-file (and per-commit) patches and fingerprints.
+
+    Files are keyed by their path in the last range of the series (following upstream
+    renames); commits by (subject, occurrence), so repeated subjects stay distinct.
+    """
+    refspec: str
+    rename_map: Dict[str, str]
+    changes: Dict[str, FileChange] = field(default_factory=dict)
+    patches: Dict[str, str] = field(default_factory=dict)
+    fingerprints: Dict[str, str] = field(default_factory=dict)
+    commits: Dict[tuple[str, int], str] = field(default_factory=dict)
+
+
+def fingerprint(text: str, change: Optional[FileChange], rename_map: Dict[str, str], rules: Rules) -> str:
+    """A file patch's offset- and order-insensitive ID; binary files are identified by their blobs."""
+    header, hunks = parse_hunks(text, rename_map, rules)
+    if change and change.binary:
+        return digest_lines([*header, *change.blobs])
+    return patch_id(header, hunks)
+
+
+def commit_fingerprints(
+    refspec: str,
+    pathspecs: tuple[str, ...],
+    ignore_whitespace: bool,
+    unified: int,
+    find_renames: str,
+    find_copies: str,
+    rename_map: Dict[str, str],
+    rules: Rules,
+    path_filter: PathFilter = ALL_PATHS,
+) -> Dict[tuple[str, int], str]:
+    """Fingerprint each commit in a range (oldest first), from one streamed `git log -p`."""
+    cmd = ['git', 'log', '--reverse', '--no-color', '-p', f'-U{unified}', '--format=%x00%s']
+    if ignore_whitespace:
+        cmd.append('-w')
+    if find_renames:
+        cmd.append(f'-M{find_renames}')
+    if find_copies:
+        cmd.append(f'-C{find_copies}')
+    cmd.append(refspec)
+    if pathspecs:
+        cmd.extend(['--', *pathspecs])
+
+    commits = {}
+    seen = {}
+
+    def add(subject, lines):
+        n = seen[subject] = seen.get(subject, 0) + 1
+        ids = [
+            patch_id(*parse_hunks('\n'.join(section), rename_map, rules))
+            for path, section in split_file_patches(lines)
+            if path_filter.matches(path)
+        ]
+        commits[(subject, n)] = digest_lines(ids)
+
+    subject = None
+    lines = []
+    with Popen(cmd, stdout=PIPE, text=True, errors='replace') as proc:
+        for line in proc.stdout:
+            line = line.rstrip('\n')
+            if line.startswith('\0'):
+                if subject is not None:
+                    add(subject, lines)
+                subject = line[1:]
+                lines = []
+            elif subject is not None:
+                lines.append(line)
+    if subject is not None:
+        add(subject, lines)
+    return commits
+
+
+def load_revisions(
+    refspecs: list[str],
+    paths: tuple[str, ...] = (),
+    ignore_whitespace: bool = False,
+    unified: int = 3,
+    find_renames: str = None,
+    find_copies: str = None,
+    rules: Rules = NO_RULES,
+    path_filter: PathFilter = ALL_PATHS,
+    commits: bool = False,
+    max_workers: int = 8,
+) -> list[Revision]:
+    """Fetch and fingerprint each range's patches once, in parallel.
+
+    Paths are mapped into the last range's namespace, via the upstream renames between
+    each range's base and the last range's base.
+    """
+    pathspecs = (*paths, *rules.pathspecs())
+    last = refspecs[-1]
+
+    def load(refspec: str) -> Revision:
+        upstream_range = compute_upstream_range(refspec, last) if refspec != last else ''
+        rename_map = get_rename_mapping(upstream_range, find_renames, find_copies) if upstream_range else {}
+        revision = Revision(refspec, rename_map)
+        revision.changes = get_file_changes(refspec, pathspecs, find_renames, find_copies)
+        selected = set(path_filter.filter(rules.filter(revision.changes)))
+        lines = stream_range_diff(refspec, pathspecs, ignore_whitespace, unified, find_renames, find_copies)
+        for path, file_lines in split_file_patches(lines):
+            if path not in selected:
+                continue
+            key = rename_map.get(path, path)
+            text = '\n'.join(file_lines)
+            revision.patches[key] = text
+            revision.fingerprints[key] = fingerprint(text, revision.changes[path], rename_map, rules)
+        if commits:
+            revision.commits = commit_fingerprints(
+                refspec, pathspecs, ignore_whitespace, unified, find_renames, find_copies, rename_map, rules,
+                path_filter,
+            )
+        return revision
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(load, refspecs))
+
+
+def matrix(fingerprints: list[Dict]) -> list[tuple[object, str]]:
+    """One row per key (in order of first appearance): a letter per revision, equal letters meaning equal patches.
+
+    Keys missing from a revision get `ABSENT`.
+    """
+    keys = {}
+    for prints in fingerprints:
+        for key in prints:
+            keys.setdefault(key, None)
+    rows = []
+    for key in keys:
+        letters = {}
+        cells = []
+        for prints in fingerprints:
+            fp = prints.get(key)
+            if fp is None:
+                cells.append(ABSENT)
+            else:
+                cells.append(letters.setdefault(fp, chr(ord('A') + len(letters) % 26)))
+        rows.append((key, ''.join(cells)))
+    return rows
+
+
+def pair_results(rev1: Revision, rev2: Revision, rules: Rules = NO_RULES) -> list[FileResult]:
+    """Diff-of-diffs results for files whose patches differ between two revisions, from their fetched patches."""
+    results = []
+    keys = dict.fromkeys([*rev1.patches, *rev2.patches])
+    inverse1 = {new: old for old, new in rev1.rename_map.items()}
+    inverse2 = {new: old for old, new in rev2.rename_map.items()}
+    for key in keys:
+        if rev1.fingerprints.get(key) == rev2.fingerprints.get(key):
+            continue
+        path1 = inverse1.get(key, key)
+        path2 = inverse2.get(key, key)
+        result = FileResult(path1, path2, CHANGED, rev1.changes.get(path1), rev2.changes.get(path2))
+        if key not in rev1.patches:
+            result.status = ADDED
+        elif key not in rev2.patches:
+            result.status = DROPPED
+        change1, change2 = result.change1, result.change2
+        if change1 and change2 and change1.binary and change2.binary:
+            result.summary = (
+                f"Binary file differs: {change1.old_blob[:10]}..{change1.new_blob[:10]}"
+                f" vs {change2.old_blob[:10]}..{change2.new_blob[:10]}"
+            )
+            results.append(result)
+            continue
+        result.header1, hunks1 = parse_hunks(rev1.patches.get(key, ''), rev1.rename_map, rules)
+        result.header2, hunks2 = parse_hunks(rev2.patches.get(key, ''), rev2.rename_map, rules)
+        # Fingerprints differ, so some hunk (or the header) is unmatched
+        result.unmatched1, result.unmatched2 = match_hunks(hunks1, hunks2)
+        results.append(result)
+    return results
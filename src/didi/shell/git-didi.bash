@@ -13,3 +13,92 @@ alias gddpqc='git-didi patch --quiet --color=always'
 alias gddc='git-didi commits'
 alias gddcc='git-didi commits --color=always'
 alias gddsw='git-didi swatches'
+
+# Completion of refs, `ref@{n}` reflog entries (with their commits' subjects) and
+# paths. Listings are cached per repo in <git-common-dir>/didi/completion, and only
+# recomputed (by `git-didi complete`) when refs or reflogs change.
+if [[ -n $ZSH_VERSION ]]; then
+    autoload -U +X bashcompinit && bashcompinit
+fi
+
+_git_didi_cache() {
+    local common
+    common=$(git rev-parse --git-common-dir 2>/dev/null) || return 1
+    local cache="$common/didi/completion"
+    # Ref updates rename a lock file into place, so checking directories' mtimes suffices
+    if [[ ! -f $cache/refs || ! -f $cache/reflog ]] ||
+        [[ $common/HEAD -nt $cache/refs || $common/packed-refs -nt $cache/refs ]] ||
+        [[ -n $(find "$common/refs" "$common/logs" -type d -newer "$cache/refs" -print -quit 2>/dev/null) ]]; then
+        git-didi complete --refresh >/dev/null 2>&1 || return 1
+    fi
+    printf '%s\n' "$cache"
+}
+
+_git_didi_refspec() {
+    # Complete a ref, `ref@{n}`, or either end of `A..B`
+    local cur=$1 prefix= cache line
+    cache=$(_git_didi_cache) || return
+    if [[ $cur == *..* ]]; then
+        prefix=${cur%..*}..
+        cur=${cur##*..}
+    fi
+    if [[ $cur == *@* ]]; then
+        local matches=()
+        while IFS= read -r line; do
+            matches+=("$line")
+        done < <(awk -F '\t' -v p="$cur" 'index($1, p) == 1' "$cache/reflog")
+        if (( ${#matches[@]} == 1 )); then
+            COMPREPLY=("$prefix${matches[0]%%$'\t'*}")
+        else
+            # Several entries: list them with their subjects (only the shared prefix is inserted)
+            for line in "${matches[@]}"; do
+                COMPREPLY+=("$prefix${line%%$'\t'*}  ${line#*$'\t'}")
+            done
+        fi
+    else
+        while IFS= read -r line; do
+            COMPREPLY+=("$prefix$line")
+        done < <(awk -v p="$cur" 'index($0, p) == 1' "$cache/refs")
+    fi
+}
+
+_git_didi_args() {
+    # Complete the arguments of `stat`/`patch`/`commits`/`browse` ($1), starting at word $2:
+    # two refspecs, then (except for `commits`) paths
+    local cmd=$1 i n=0 cur=${COMP_WORDS[COMP_CWORD]}
+    COMPREPLY=()
+    for (( i = $2; i < COMP_CWORD; i++ )); do
+        case ${COMP_WORDS[i]} in
+            -U|--unified|--format|--pager|-c|--color|-M|--find-renames|-C|--find-copies|--large-file-lines|--pathspec-from-file) (( i++ )) ;;
+            -*) ;;
+            *) (( n++ )) ;;
+        esac
+    done
+    [[ $cur == -* ]] && return
+    if (( n < 2 )); then
+        _git_didi_refspec "$cur"
+    elif [[ $cmd != commits ]]; then
+        while IFS= read -r line; do
+            COMPREPLY+=("$line")
+        done < <(compgen -f -- "$cur")
+    fi
+}
+
+_git_didi() {
+    local cur=${COMP_WORDS[COMP_CWORD]}
+    if (( COMP_CWORD == 1 )); then
+        COMPREPLY=($(compgen -W "stat patch commits browse series snapshot swatches watch daemon shell-integration" -- "$cur"))
+        return
+    fi
+    case ${COMP_WORDS[1]} in
+        stat|patch|commits|browse) _git_didi_args "${COMP_WORDS[1]}" 2 ;;
+    esac
+}
+_git_didi_stat() { _git_didi_args stat 1; }
+_git_didi_patch() { _git_didi_args patch 1; }
+_git_didi_commits() { _git_didi_args commits 1; }
+
+complete -F _git_didi git-didi gddi
+complete -F _git_didi_stat gdds gddsc
+complete -F _git_didi_patch gddp gddpc gddpq gddpqc
+complete -F _git_didi_commits gddc gddcc
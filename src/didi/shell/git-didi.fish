@@ -13,3 +13,60 @@ alias gddpqc='git-didi patch --quiet --color=always'
 alias gddc='git-didi commits'
 alias gddcc='git-didi commits --color=always'
 alias gddsw='git-didi swatches'
+
+# Completion of refs, `ref@{n}` reflog entries (with their commits' subjects) and
+# paths. Listings are cached per repo in <git-common-dir>/didi/completion, and only
+# recomputed (by `git-didi complete`) when refs or reflogs change.
+# (The aliases above wrap `git-didi <command>`, so they get these completions too.)
+function __git_didi_cache
+    set -l common (git rev-parse --git-common-dir 2>/dev/null); or return 1
+    set -l cache $common/didi/completion
+    # Ref updates rename a lock file into place, so checking directories' mtimes suffices
+    set -l newer (find $common/HEAD $common/packed-refs -newer $cache/refs 2>/dev/null)
+    set -a newer (find $common/refs $common/logs -type d -newer $cache/refs -print -quit 2>/dev/null)
+    if not test -f $cache/refs; or not test -f $cache/reflog; or set -q newer[1]
+        git-didi complete --refresh >/dev/null 2>&1; or return 1
+    end
+    echo $cache
+end
+
+function __git_didi_refspecs
+    # Complete a ref, `ref@{n}`, or either end of `A..B`
+    set -l cache (__git_didi_cache); or return
+    set -l cur (commandline -ct)
+    set -l prefix ''
+    if string match -q -- '*..*' $cur
+        set prefix (string replace -r '^(.*\.\.).*$' '$1' -- $cur)
+        set cur (string replace -r '^.*\.\.' '' -- $cur)
+    end
+    if string match -q -- '*@*' $cur
+        awk -F '\t' -v p="$cur" -v pre="$prefix" 'index($1, p) == 1 { print pre $0 }' $cache/reflog
+    else
+        awk -v p="$cur" -v pre="$prefix" 'index($0, p) == 1 { print pre $0 }' $cache/refs
+    end
+end
+
+function __git_didi_nargs
+    # Number of positional arguments after the subcommand
+    set -l words (commandline -opc)
+    set -l n 0
+    set -l skip 0
+    for word in $words[3..-1]
+        if test $skip = 1
+            set skip 0
+            continue
+        end
+        switch $word
+            case -U --unified --format --pager -c --color -M --find-renames -C --find-copies --large-file-lines --pathspec-from-file
+                set skip 1
+            case '-*'
+            case '*'
+                set n (math $n + 1)
+        end
+    end
+    echo $n
+end
+
+complete -c git-didi -n __fish_use_subcommand -f -a 'stat patch commits browse series snapshot swatches watch daemon shell-integration'
+complete -c git-didi -n '__fish_seen_subcommand_from stat patch commits browse; and test (__git_didi_nargs) -lt 2' -f -a '(__git_didi_refspecs)'
+complete -c git-didi -n '__fish_seen_subcommand_from commits' -f
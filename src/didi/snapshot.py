@@ -0,0 +1,240 @@
+"""Compact, content-addressed snapshots of a range's patches.
+
+`git-didi snapshot <refspec> -o <file>` stores a range's per-file and per-commit
+patches (with `index` lines normalized), so the range can still be compared after
+its commits are rewritten or garbage-collected. `stat`, `patch` and `commits` accept
+a snapshot file wherever they take a refspec.
+
+Layout (all integers big-endian):
+
+    header   magic "DIDISNAP", version (u32), meta offset/length (u64, u64),
+             index offset (u64), entry count (u32)
+    blobs    zlib-compressed patch texts; identical texts are stored once
+    meta     zlib-compressed JSON: refspec, resolved range, options, file changes,
+             numstat lines, and commits (each with its per-file entries)
+    index    one (offset u64, length u32) record per entry, pointing into blobs
+
+Reads memory-map the file, and decompress only the entries being compared.
+"""
+
+import json
+import mmap
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import blake2b
+from subprocess import PIPE, Popen, run
+from typing import Dict, Iterator, Optional
+
+from .config import Rules
+from .diff import FileChange, compute_patch_ids, normalize_diff, split_file_patches
+from .source import GitSource
+
+MAGIC = b'DIDISNAP'
+VERSION = 1
+HEADER = struct.Struct('>8sIQQQI')
+ENTRY = struct.Struct('>QI')
+
+
+def is_snapshot(path: str) -> bool:
+    """Whether a file starts with the snapshot magic bytes."""
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def resolve_range(refspec: str) -> str:
+    """`A..B` with both ends resolved to commit SHAs (or `refspec` unchanged, if that fails)."""
+    if '..' not in refspec:
+        return refspec
+    base, tip = refspec.split('..', 1)
+    result = run(['git', 'rev-parse', base, tip], capture_output=True, text=True)
+    if result.returncode != 0:
+        return refspec
+    base_sha, tip_sha = result.stdout.split()
+    return f'{base_sha}..{tip_sha}'
+
+
+def iter_commit_patches(refspec: str, ignore_whitespace: bool) -> Iterator[tuple[str, list[str]]]:
+    """("<sha> <subject>", patch lines) for each commit in a range (newest first, like `git log --oneline`), from one `git log -p`."""
+    cmd = ['git', 'log', '--no-color', '-p', '--diff-merges=first-parent', '--format=%x00%h %s']
+    if ignore_whitespace:
+        cmd.append('-w')
+    cmd.append(refspec)
+    commit = None
+    lines = []
+    with Popen(cmd, stdout=PIPE, text=True, errors='replace') as proc:
+        for line in proc.stdout:
+            line = line.rstrip('\n')
+            if line.startswith('\0'):
+                if commit is not None:
+                    yield commit, strip_blank(lines)
+                commit = line[1:]
+                lines = []
+            elif commit is not None and (lines or line):
+                lines.append(line)
+    if commit is not None:
+        yield commit, strip_blank(lines)
+
+
+def strip_blank(lines: list[str]) -> list[str]:
+    """Drop the blank lines `git log` prints between commits (patch context lines start with a space)."""
+    while lines and not lines[-1]:
+        lines.pop()
+    return lines
+
+
+class SnapshotWriter:
+    """Accumulates compressed, deduplicated entries, then writes the meta and index."""
+
+    def __init__(self, f):
+        self.f = f
+        self.blobs: Dict[str, tuple[int, int]] = {}
+        self.entries: list[tuple[int, int]] = []
+        f.write(HEADER.pack(MAGIC, VERSION, 0, 0, 0, 0))
+
+    def add(self, text: str) -> int:
+        """Store a patch text (once per distinct content); returns its entry number."""
+        data = text.encode()
+        digest = blake2b(data, digest_size=16).hexdigest()
+        if digest not in self.blobs:
+            compressed = zlib.compress(data)
+            self.blobs[digest] = (self.f.tell(), len(compressed))
+            self.f.write(compressed)
+        self.entries.append(self.blobs[digest])
+        return len(self.entries) - 1
+
+    def finish(self, meta: dict) -> int:
+        """Write the meta and index, and fill in the header; returns the file's size."""
+        meta_data = zlib.compress(json.dumps(meta).encode())
+        meta_offset = self.f.tell()
+        self.f.write(meta_data)
+        index_offset = self.f.tell()
+        for offset, length in self.entries:
+            self.f.write(ENTRY.pack(offset, length))
+        size = self.f.tell()
+        self.f.seek(0)
+        self.f.write(HEADER.pack(MAGIC, VERSION, meta_offset, len(meta_data), index_offset, len(self.entries)))
+        return size
+
+
+def write_snapshot(
+    refspec: str,
+    output: str,
+    ignore_whitespace: bool = False,
+    unified: int = 3,
+    find_renames: str = None,
+    find_copies: str = None,
+    commits: bool = True,
+    max_workers: int = 8,
+) -> dict:
+    """Write a snapshot of a range's patches; returns summary stats."""
+    source = GitSource(refspec)
+    changes = source.changes((), find_renames, find_copies)
+    numstat = source.numstat((), ignore_whitespace, find_renames, find_copies)
+    # Per-file patches are fetched the way `patch` fetches them, so snapshots compare
+    # equal to the live range they were taken from
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        patches = executor.map(
+            lambda path: source.file_diff(path, ignore_whitespace, unified, find_renames, find_copies),
+            changes,
+        )
+    with open(output, 'wb') as f:
+        writer = SnapshotWriter(f)
+        files = []
+        for (path, change), patch in zip(changes.items(), patches):
+            entry = writer.add(normalize_diff(patch))
+            files.append([
+                change.path, change.old_path, change.status, change.old_blob, change.new_blob,
+                change.added, change.deleted, entry, change.old_mode, change.new_mode,
+            ])
+        commit_list = []
+        if commits:
+            for commit, lines in iter_commit_patches(refspec, ignore_whitespace):
+                sha, _, subject = commit.partition(' ')
+                commit_files = [
+                    [path, writer.add(normalize_diff('\n'.join(section)))]
+                    for path, section in split_file_patches(lines)
+                ]
+                commit_list.append([sha, subject, commit_files])
+        meta = dict(
+            refspec=refspec,
+            range=resolve_range(refspec),
+            options=dict(
+                ignore_whitespace=ignore_whitespace,
+                unified=unified,
+                find_renames=find_renames,
+                find_copies=find_copies,
+            ),
+            files=files,
+            numstat=numstat,
+            commits=commit_list,
+        )
+        size = writer.finish(meta)
+    return dict(files=len(files), commits=len(commit_list), blobs=len(writer.blobs), bytes=size)
+
+
+class SnapshotSource:
+    """Patches read from a snapshot file (see `GitSource` for the interface).
+
+    Stored patches were computed with the options recorded at export time; options
+    passed to these methods are ignored, and pathspecs are left to callers' in-process
+    filtering.
+    """
+
+    def __init__(self, path: str):
+        self.refspec = path
+        with open(path, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, meta_offset, meta_length, self.index_offset, self.count = HEADER.unpack_from(self.mm)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path}: not a version-{VERSION} git-didi snapshot")
+        self.meta = json.loads(zlib.decompress(self.mm[meta_offset:meta_offset + meta_length]))
+        # Upstream renames are looked up between the bases recorded at export time
+        self.range = self.meta['range']
+        self.files = {f[0]: f for f in self.meta['files']}
+        self.commit_entries = {sha: dict(files) for sha, _, files in self.meta['commits']}
+
+    def entry(self, n: int) -> str:
+        """Decompress one stored patch."""
+        offset, length = ENTRY.unpack_from(self.mm, self.index_offset + n * ENTRY.size)
+        return zlib.decompress(self.mm[offset:offset + length]).decode()
+
+    def changes(self, paths=(), find_renames=None, find_copies=None) -> Dict[str, FileChange]:
+        # Modes follow the patch entry (snapshots written before they were stored have none)
+        return {path: FileChange(*f[:7], *f[8:10]) for path, f in self.files.items()}
+
+    def numstat(self, paths=(), ignore_whitespace=False, find_renames=None, find_copies=None, follow=False) -> list[str]:
+        return list(self.meta['numstat'])
+
+    def file_diff(self, path: str, *args) -> str:
+        f = self.files.get(path)
+        return self.entry(f[7]) if f else ''
+
+    def stream_file_diff(self, path: str, *args) -> Iterator[str]:
+        return iter(self.file_diff(path).splitlines())
+
+    def range_patches(self, paths=(), *args, wanted: Optional[set[str]] = None) -> Iterator[tuple[str, list[str]]]:
+        for path in self.files:
+            if wanted is None or path in wanted:
+                yield path, self.file_diff(path).splitlines()
+
+    def commits(self) -> list[str]:
+        return [f'{sha} {subject}' for sha, subject, _ in self.meta['commits']]
+
+    def patch_ids(self) -> Dict[str, str]:
+        # `git patch-id` needs 40-hex keys; stored SHAs are abbreviated
+        return compute_patch_ids((sha.ljust(40, '0'), self.commit_diff(sha)) for sha in self.commit_entries)
+
+    def commit_diff(self, sha: str, ignore_whitespace: bool = False, rules: Rules = None) -> str:
+        return '\n'.join(
+            self.entry(n)
+            for path, n in self.commit_entries.get(sha, {}).items()
+            if not (rules and rules.excluded(path))
+        )
+
+    def commit_files(self, sha: str) -> list[str]:
+        return list(self.commit_entries.get(sha, {}))
+
+    def commit_file_diff(self, sha: str, path: str, *args) -> str:
+        n = self.commit_entries.get(sha, {}).get(path)
+        return self.entry(n) if n is not None else ''
@@ -0,0 +1,205 @@
+"""Where a side of a comparison gets its patches from.
+
+Commands take each side as a string: a git refspec (`A..B`), the path of a
+snapshot written by `git-didi snapshot`, or a `git format-patch` series (an mbox, or
+a directory of `.patch` files). `open_source` returns a `GitSource` (which runs git),
+a `SnapshotSource` (which reads stored patches) or an `MboxSource` (which parses
+mailed patches); all provide the per-range, per-file and per-commit patches `stat`,
+`patch` and `commits` compare.
+"""
+
+import sys
+from functools import cached_property
+from glob import glob
+from os.path import isdir, isfile, join
+from subprocess import run
+from threading import Lock
+from typing import TYPE_CHECKING, Dict, Iterator, Optional, Union
+
+from utz import err
+
+from .config import Rules
+from .diff import (
+    DiffTreeBatch,
+    FileChange,
+    build_diff_cmd,
+    get_changed_files,
+    get_commits,
+    get_file_changes,
+    get_file_diff,
+    get_patch_ids,
+    split_file_patches,
+    stream_file_diff,
+    stream_range_diff,
+)
+
+if TYPE_CHECKING:
+    from .mbox import MboxSource
+    from .snapshot import SnapshotSource
+
+
+class GitSource:
+    """Patches of a git refspec, computed by git on demand."""
+
+    def __init__(self, refspec: str):
+        self.refspec = refspec
+        # The range, as git understands it (used e.g. to find upstream renames)
+        self.range = refspec
+        # Per-commit patches come from one `git diff-tree --stdin` process per set of diff options
+        self.batches: Dict[tuple, DiffTreeBatch] = {}
+        self.sections: Dict[tuple, Dict[str, str]] = {}
+        self.lock = Lock()
+
+    def changes(
+        self,
+        paths: tuple[str, ...] = (),
+        find_renames: str = None,
+        find_copies: str = None,
+    ) -> Dict[str, FileChange]:
+        """Each changed file's blob SHAs and line counts, keyed by (new) path."""
+        return get_file_changes(self.refspec, paths, find_renames, find_copies)
+
+    def numstat(
+        self,
+        paths: tuple[str, ...] = (),
+        ignore_whitespace: bool = False,
+        find_renames: str = None,
+        find_copies: str = None,
+        follow: bool = False,
+    ) -> list[str]:
+        """`git diff --numstat` lines ("added\\tdeleted\\tpath")."""
+        cmd = build_diff_cmd(ignore_whitespace, find_renames, find_copies, follow=follow)
+        cmd.extend(['--numstat', self.refspec])
+        if paths:
+            cmd.extend(['--', *paths])
+        result = run(cmd, capture_output=True, text=True)
+        if result.returncode != 0:
+            err(f"Error getting diff for {self.refspec}: {result.stderr}")
+            sys.exit(1)
+        return result.stdout.splitlines()
+
+    def file_diff(
+        self,
+        path: str,
+        ignore_whitespace: bool = False,
+        unified: int = 3,
+        find_renames: str = None,
+        find_copies: str = None,
+    ) -> str:
+        """One file's patch."""
+        return get_file_diff(self.refspec, path, ignore_whitespace, unified, find_renames, find_copies)
+
+    def stream_file_diff(
+        self,
+        path: str,
+        ignore_whitespace: bool = False,
+        unified: int = 3,
+        find_renames: str = None,
+        find_copies: str = None,
+    ) -> Iterator[str]:
+        """One file's patch, line by line."""
+        return stream_file_diff(self.refspec, path, ignore_whitespace, unified, find_renames, find_copies)
+
+    def range_patches(
+        self,
+        paths: tuple[str, ...] = (),
+        ignore_whitespace: bool = False,
+        unified: int = 3,
+        find_renames: str = None,
+        find_copies: str = None,
+        wanted: Optional[set[str]] = None,
+    ) -> Iterator[tuple[str, list[str]]]:
+        """(path, patch lines) for each file (or each of the `wanted` ones), from one streamed patch of the whole range.
+
+        Files with an empty patch (e.g. whitespace-only changes, with
+        `ignore_whitespace`) aren't yielded.
+        """
+        lines = stream_range_diff(self.refspec, paths, ignore_whitespace, unified, find_renames, find_copies)
+        for path, file_lines in split_file_patches(lines):
+            if wanted is None or path in wanted:
+                yield path, file_lines
+
+    def commits(self) -> list[str]:
+        """"<sha> <subject>" for each commit in the range, newest first."""
+        return get_commits(self.refspec)
+
+    def patch_ids(self) -> Dict[str, str]:
+        """`git patch-id --stable` of each commit, keyed by (full) SHA."""
+        return get_patch_ids(self.refspec)
+
+    @cached_property
+    def full_shas(self) -> Dict[str, str]:
+        """Full SHAs of the range's commits, keyed by their abbreviations (as `commits()` lists them)."""
+        result = run(['git', 'log', '--format=%h %H', self.refspec], capture_output=True, text=True)
+        return dict(line.split(' ', 1) for line in result.stdout.splitlines())
+
+    def full_sha(self, sha: str) -> str:
+        full = self.full_shas.get(sha)
+        if full is None:
+            result = run(['git', 'rev-parse', '--verify', '-q', f'{sha}^{{commit}}'], capture_output=True, text=True)
+            full = result.stdout.strip() or sha
+        return full
+
+    def diff_batch(
+        self,
+        ignore_whitespace: bool = False,
+        unified: int = 3,
+        find_renames: str = None,
+        find_copies: str = None,
+        pathspecs: tuple[str, ...] = (),
+    ) -> DiffTreeBatch:
+        """The `DiffTreeBatch` for a set of diff options, started on first use."""
+        key = (ignore_whitespace, unified, find_renames, find_copies, tuple(pathspecs))
+        with self.lock:
+            if key not in self.batches:
+                self.batches[key] = DiffTreeBatch(*key)
+            return self.batches[key]
+
+    def commit_diff(self, sha: str, ignore_whitespace: bool = False, rules: Rules = None) -> str:
+        """One commit's whole patch (excluding files that match `rules`)."""
+        pathspecs = tuple(rules.pathspecs()) if rules else ()
+        return self.diff_batch(ignore_whitespace, pathspecs=pathspecs).diff(self.full_sha(sha))
+
+    def commit_files(self, sha: str) -> list[str]:
+        """Files changed by one commit."""
+        return get_changed_files(f'{sha}^..{sha}')
+
+    def commit_file_diff(
+        self,
+        sha: str,
+        path: str,
+        ignore_whitespace: bool = False,
+        unified: int = 3,
+        find_renames: str = None,
+        find_copies: str = None,
+    ) -> str:
+        """One file's patch in one commit (from the commit's whole patch, split once per commit)."""
+        key = (sha, ignore_whitespace, unified, find_renames, find_copies)
+        sections = self.sections.get(key)
+        if sections is None:
+            patch = self.diff_batch(ignore_whitespace, unified, find_renames, find_copies).diff(self.full_sha(sha))
+            sections = self.sections[key] = {
+                path: '\n'.join(section) + '\n'
+                for path, section in split_file_patches(patch.splitlines())
+            }
+        return sections.get(path, '')
+
+
+Source = Union[GitSource, 'SnapshotSource', 'MboxSource']
+
+
+def open_source(spec: Union[str, Source]) -> Source:
+    """A snapshot file or patch series (if `spec` is one), or else a git refspec."""
+    if not isinstance(spec, str):
+        return spec
+    if isfile(spec):
+        from .mbox import MboxSource, is_mbox
+        from .snapshot import SnapshotSource, is_snapshot
+        if is_snapshot(spec):
+            return SnapshotSource(spec)
+        if is_mbox(spec):
+            return MboxSource(spec)
+    elif isdir(spec) and glob(join(spec, '*.patch')):
+        from .mbox import MboxSource
+        return MboxSource(spec)
+    return GitSource(spec)
@@ -0,0 +1,95 @@
+"""Which lines upstream changed between two ranges' bases.
+
+After a rebase from A..B onto C (C..D), a file's patch can only legitimately differ
+where its hunks overlap lines that upstream (A..C) changed: git had to re-apply those
+hunks against new context, and a conflict may have been resolved there. Other
+differences are unexpected (e.g. an edit made while resolving an unrelated conflict).
+
+`UpstreamIndex` holds upstream's changed line spans per file, on both sides of A..C,
+built from one `git diff -U0` of the upstream range. Hunks of the first range are
+looked up in A's coordinates (by old path), hunks of the second range in C's (by new
+path).
+"""
+
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from subprocess import PIPE, Popen
+from typing import Dict, Optional
+
+from .diff import build_diff_cmd, section_paths, split_file_patches
+from .hunks import HUNK_HEADER_RGX, Hunk, line_span
+
+OVERLAP = 'upstream overlap'
+UNEXPECTED = 'unexpected change'
+
+
+@dataclass
+class Spans:
+    """Sorted, non-overlapping line spans of one file (closed intervals, see `line_span`)."""
+    starts: list[int] = field(default_factory=list)
+    ends: list[int] = field(default_factory=list)
+
+    def add(self, span: tuple[int, int]) -> None:
+        self.starts.append(span[0])
+        self.ends.append(span[1])
+
+    def intersects(self, span: tuple[int, int]) -> bool:
+        """Whether any span overlaps (or adjoins) `span`, by binary search."""
+        start, end = span
+        i = bisect_left(self.ends, start)
+        return i < len(self.starts) and self.starts[i] <= end
+
+
+@dataclass
+class UpstreamIndex:
+    """Line spans upstream changed, per file: `old` in the first base's coordinates, `new` in the second's."""
+    upstream_range: str
+    old: Dict[str, Spans] = field(default_factory=dict)
+    new: Dict[str, Spans] = field(default_factory=dict)
+    touched: set[str] = field(default_factory=set)
+
+    def touches(self, path1: Optional[str], path2: Optional[str]) -> bool:
+        """Whether upstream changed (or renamed) a file, under either range's name for it."""
+        return path1 in self.touched or path2 in self.touched
+
+    def overlaps1(self, path: str, hunk: Hunk) -> bool:
+        """Whether a hunk of the first range overlaps upstream's changes (unparseable hunks count as overlapping)."""
+        span = hunk.old_span
+        spans = self.old.get(path)
+        return span is None or bool(spans and spans.intersects(span))
+
+    def overlaps2(self, path: str, hunk: Hunk) -> bool:
+        """Whether a hunk of the second range overlaps upstream's changes."""
+        span = hunk.old_span
+        spans = self.new.get(path)
+        return span is None or bool(spans and spans.intersects(span))
+
+
+def build_upstream_index(
+    upstream_range: str,
+    find_renames: str = None,
+    find_copies: str = None,
+) -> UpstreamIndex:
+    """Index the lines changed in `upstream_range`, from one streamed `git diff -U0`."""
+    index = UpstreamIndex(upstream_range)
+    cmd = build_diff_cmd(False, find_renames, find_copies)
+    cmd.extend(['--no-color', '--no-ext-diff', '-U0', upstream_range])
+    with Popen(cmd, stdout=PIPE, text=True, errors='replace') as proc:
+        lines = (line.rstrip('\n') for line in proc.stdout)
+        for _, section in split_file_patches(lines):
+            # Paths come from the header (renames without content changes have no hunks)
+            old_path, new_path = section_paths(section)
+            index.touched.update((old_path, new_path))
+            old_spans = index.old.setdefault(old_path, Spans())
+            new_spans = index.new.setdefault(new_path, Spans())
+            for line in section:
+                if not line.startswith('@@'):
+                    continue
+                m = HUNK_HEADER_RGX.fullmatch(line)
+                if not m:
+                    continue
+                old_count = int(m['old_count']) if m['old_count'] is not None else None
+                new_count = int(m['new_count']) if m['new_count'] is not None else None
+                old_spans.add(line_span(int(m['old_start']), old_count))
+                new_spans.add(line_span(int(m['new_start']), new_count))
+    return index
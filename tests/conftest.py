@@ -0,0 +1,54 @@
+"""Shared test fixtures."""
+
+from subprocess import run
+
+import pytest
+
+
+def git(*args, cwd):
+    run(['git', *args], cwd=cwd, check=True, capture_output=True)
+
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    """A repo with a branch rebased across an upstream commit that shifts and renames files."""
+    git('init', '-q', '-b', 'main', cwd=tmp_path)
+    git('config', 'user.email', 'test@example.com', cwd=tmp_path)
+    git('config', 'user.name', 'Test', cwd=tmp_path)
+    (tmp_path / 'a.py').write_text(''.join(f'{i}\n' for i in range(100)))
+    (tmp_path / 'old.py').write_text(''.join(f'{i}\n' for i in range(20)))
+    (tmp_path / 'gone.py').write_text('gone\n')
+    git('add', '.', cwd=tmp_path)
+    git('commit', '-qm', 'base', cwd=tmp_path)
+    git('tag', 'base', cwd=tmp_path)
+
+    # Upstream: shift a.py, rename old.py → new.py
+    (tmp_path / 'a.py').write_text('header\n' + ''.join(f'{i}\n' for i in range(100)))
+    git('mv', 'old.py', 'new.py', cwd=tmp_path)
+    git('commit', '-qam', 'upstream', cwd=tmp_path)
+    git('tag', 'upstream', cwd=tmp_path)
+
+    # Branch before rebase
+    git('checkout', '-qb', 'before', 'base', cwd=tmp_path)
+    (tmp_path / 'a.py').write_text(''.join(f'{i}\n' for i in range(100)).replace('50\n', '50 changed\n'))
+    (tmp_path / 'old.py').write_text('x\n' + (tmp_path / 'old.py').read_text())
+    (tmp_path / 'gone.py').write_text('gone changed\n')
+    git('commit', '-qam', 'change', cwd=tmp_path)
+
+    # Branch after rebase: same a.py and old.py changes, gone.py change dropped, new file added
+    git('checkout', '-qb', 'after', 'upstream', cwd=tmp_path)
+    (tmp_path / 'a.py').write_text((tmp_path / 'a.py').read_text().replace('50\n', '50 changed\n'))
+    (tmp_path / 'new.py').write_text('x\n' + (tmp_path / 'new.py').read_text())
+    (tmp_path / 'added.py').write_text('added\n')
+    git('add', '.', cwd=tmp_path)
+    git('commit', '-qm', 'change', cwd=tmp_path)
+
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def fake_git(tmp_path, monkeypatch):
+    """A synthetic repo served by a fake `git` on PATH (see `fake_git.py`)."""
+    from fake_git import FakeGit
+    return FakeGit(tmp_path, monkeypatch)
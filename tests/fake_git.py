@@ -0,0 +1,238 @@
+"""A fake `git` executable, serving a synthetic rebase of tens of thousands of files.
+
+The `fake_git` fixture (see `conftest.py`) puts a `git` shim running this module on
+`PATH`. It answers the git commands `stat`, `patch` and `commits` run, for two ranges
+of a repo that doesn't exist: `base..before` (the original) and `upstream..after`
+(rebased). Every invocation is appended to a log (argv, stdout bytes, milliseconds),
+so tests can assert how many subprocesses a command forks, and how much it reads,
+without building a giant repo. Commands it doesn't know exit 1 (and are logged, with
+`unsupported` set).
+
+The model (from the JSON spec in `$FAKE_GIT_SPEC`): `files` files, each changed by
+one of `commits` commits (file `i` by commit `i % commits`), replacing line 2 with
+"<i> changed". In the rebased range, files in `shifted` have different blobs but the
+same hunk (at another offset), and files in `differ` change the line differently.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sys
+from dataclasses import asdict, dataclass
+from time import perf_counter
+from typing import Iterator, Optional
+
+RANGE1 = 'base..before'
+RANGE2 = 'upstream..after'
+PATH_RGX = re.compile(r'dir\d+/file(?P<i>\d+)\.py')
+
+
+def sha(*parts) -> str:
+    return hashlib.sha1(' '.join(map(str, parts)).encode()).hexdigest()
+
+
+@dataclass
+class Model:
+    root: str
+    files: int
+    commits: int
+    shifted: frozenset[int] = frozenset()
+    differ: frozenset[int] = frozenset()
+
+    @classmethod
+    def load(cls, path: str) -> 'Model':
+        with open(path) as f:
+            spec = json.load(f)
+        return cls(
+            spec['root'], spec['files'], spec['commits'],
+            frozenset(spec.get('shifted', ())), frozenset(spec.get('differ', ())),
+        )
+
+    def path(self, i: int) -> str:
+        return f'dir{i // 100}/file{i}.py'
+
+    def rebased(self, refspec: str, i: int) -> bool:
+        return refspec == RANGE2 and (i in self.shifted or i in self.differ)
+
+    def blobs(self, refspec: str, i: int) -> tuple[str, str]:
+        tag = refspec if self.rebased(refspec, i) else ''
+        return sha('old', i, tag), sha('new', i, tag)
+
+    def patch(self, refspec: str, i: int) -> str:
+        old, new = self.blobs(refspec, i)
+        path = self.path(i)
+        line = 12 if refspec == RANGE2 and i in self.shifted else 2
+        change = 'rebased' if refspec == RANGE2 and i in self.differ else 'changed'
+        return (
+            f'diff --git a/{path} b/{path}\nindex {old[:7]}..{new[:7]} 100644\n--- a/{path}\n+++ b/{path}\n'
+            f'@@ -{line - 1},3 +{line - 1},3 @@\n {i} first\n-{i}\n+{i} {change}\n {i} last\n'
+        )
+
+    def commit_shas(self, refspec: str) -> list[str]:
+        """The range's commits' SHAs, newest first."""
+        return [sha(refspec, k) for k in reversed(range(self.commits))]
+
+    def commit_files(self, refspec: str, commit: str) -> list[int]:
+        k = next((k for k in range(self.commits) if sha(refspec, k).startswith(commit)), None)
+        return [] if k is None else list(range(k, self.files, self.commits))
+
+    def find_commit(self, commit: str) -> Optional[tuple[str, str]]:
+        """(range, full SHA) of an abbreviated or full commit SHA."""
+        for refspec in (RANGE1, RANGE2):
+            for full in self.commit_shas(refspec):
+                if full.startswith(commit):
+                    return refspec, full
+        return None
+
+
+def selected(model: Model, paths: list[str]) -> Iterator[int]:
+    """Indices of the files matching `paths` (all files, if none)."""
+    if not paths:
+        yield from range(model.files)
+        return
+    for path in paths:
+        m = PATH_RGX.fullmatch(path)
+        if m and int(m['i']) < model.files and model.path(int(m['i'])) == path:
+            yield int(m['i'])
+
+
+def split_args(args: list[str]) -> tuple[list[str], list[str], list[str]]:
+    """(options, revisions, paths) of a command's arguments."""
+    if '--' in args:
+        i = args.index('--')
+        args, paths = args[:i], args[i + 1:]
+    else:
+        paths = []
+    options = [arg for arg in args if arg.startswith('-')]
+    revs = [arg for arg in args if not arg.startswith('-')]
+    return options, revs, paths
+
+
+def diff(model: Model, args: list[str]) -> Optional[str]:
+    options, revs, paths = split_args(args)
+    refspec = revs[0] if revs else ''
+    if '^..' in refspec:
+        # One commit's files: `<sha>^..<sha>`
+        found = model.find_commit(refspec.partition('^')[0])
+        if found is None:
+            return None
+        return ''.join(f'{model.path(i)}\n' for i in model.commit_files(*found))
+    if refspec not in (RANGE1, RANGE2):
+        # E.g. the upstream range (`base..upstream`), which renames nothing
+        return '' if '--name-status' in options else None
+    if '--raw' in options:
+        raw = ''.join(
+            f':100644 100644 {old} {new} M\0{model.path(i)}\0'
+            for i in selected(model, paths) for old, new in [model.blobs(refspec, i)]
+        )
+        return raw + ''.join(f'1\t1\t{model.path(i)}\0' for i in selected(model, paths))
+    if '--numstat' in options:
+        return ''.join(f'1\t1\t{model.path(i)}\n' for i in selected(model, paths))
+    if '--name-status' in options:
+        return ''.join(f'M\t{model.path(i)}\n' for i in selected(model, paths))
+    if '--name-only' in options:
+        return ''.join(f'{model.path(i)}\n' for i in selected(model, paths))
+    return ''.join(model.patch(refspec, i) for i in selected(model, paths))
+
+
+def log(model: Model, args: list[str]) -> Optional[str]:
+    options, revs, _ = split_args(args)
+    refspec = revs[0] if revs else ''
+    if refspec not in (RANGE1, RANGE2):
+        return None
+    shas = model.commit_shas(refspec)
+    n = len(shas)
+    if '--oneline' in options:
+        return ''.join(f'{full[:7]} commit {n - 1 - k}\n' for k, full in enumerate(shas))
+    if '--format=%h %H' in options:
+        return ''.join(f'{full[:7]} {full}\n' for full in shas)
+    return None
+
+
+def rev_parse(model: Model, args: list[str]) -> Optional[str]:
+    if '--show-toplevel' in args:
+        return f'{model.root}\n'
+    if '--show-prefix' in args:
+        return '\n'
+    if '--verify' in args:
+        found = model.find_commit(args[-1].partition('^')[0])
+        return f'{found[1]}\n' if found else None
+    return None
+
+
+def diff_tree_stdin(model: Model, log_entry: dict) -> None:
+    """Answer `git diff-tree --stdin -p -z` requests as they arrive (commits, or echoed lines)."""
+    out = sys.stdout.buffer
+    for line in sys.stdin.buffer:
+        line = line.decode().rstrip('\n')
+        found = model.find_commit(line) if len(line) == 40 else None
+        if found:
+            refspec, full = found
+            patch = ''.join(model.patch(refspec, i) for i in model.commit_files(refspec, full))
+            data = f'{full}\0{patch}'.encode()
+        else:
+            data = f'{line}\n'.encode()
+        log_entry['bytes'] += len(data)
+        out.write(data)
+        out.flush()
+
+
+def main(argv: list[str]) -> int:
+    start = perf_counter()
+    model = Model.load(os.environ['FAKE_GIT_SPEC'])
+    entry = dict(argv=argv, bytes=0, unsupported=False)
+    cmd, args = (argv[0], argv[1:]) if argv else ('', [])
+    try:
+        if cmd == 'diff-tree' and '--stdin' in args:
+            diff_tree_stdin(model, entry)
+            return 0
+        handler = {'diff': diff, 'log': log, 'rev-parse': rev_parse}.get(cmd)
+        # Anything else (e.g. `config`, looking for rules) finds nothing
+        output = handler(model, args) if handler else ('' if cmd == 'config' else None)
+        if output is None:
+            entry['unsupported'] = True
+            sys.stderr.write(f"fake git: unsupported: {' '.join(argv)}\n")
+            return 1
+        data = output.encode()
+        entry['bytes'] = len(data)
+        sys.stdout.buffer.write(data)
+        # `git config --get-regexp` exits 1 when nothing matches
+        return 1 if cmd == 'config' else 0
+    finally:
+        entry['ms'] = (perf_counter() - start) * 1000
+        with open(os.environ['FAKE_GIT_LOG'], 'a') as f:
+            f.write(json.dumps(entry) + '\n')
+
+
+class FakeGit:
+    """Test-side handle: writes the model's spec, and reads back the invocation log."""
+
+    def __init__(self, directory, monkeypatch):
+        self.spec = directory / 'spec.json'
+        self.log = directory / 'calls.jsonl'
+        bin_dir = directory / 'bin'
+        bin_dir.mkdir()
+        shim = bin_dir / 'git'
+        shim.write_text(f'#!/bin/sh\nexec {sys.executable} {os.path.abspath(__file__)} "$@"\n')
+        shim.chmod(0o755)
+        monkeypatch.setenv('PATH', f'{bin_dir}{os.pathsep}{os.environ["PATH"]}')
+        monkeypatch.setenv('FAKE_GIT_SPEC', str(self.spec))
+        monkeypatch.setenv('FAKE_GIT_LOG', str(self.log))
+        monkeypatch.chdir(directory)
+        self.root = str(directory)
+
+    def configure(self, files: int, commits: int = 1, shifted=(), differ=()) -> Model:
+        model = Model(self.root, files, commits, frozenset(shifted), frozenset(differ))
+        spec = {**asdict(model), 'shifted': sorted(shifted), 'differ': sorted(differ)}
+        self.spec.write_text(json.dumps(spec))
+        self.log.write_text('')
+        return model
+
+    def calls(self) -> list[dict]:
+        """Each git invocation since `configure`: {argv, bytes, ms, unsupported}."""
+        return [json.loads(line) for line in self.log.read_text().splitlines()]
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,44 @@
+"""Test the library API."""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import didi
+from didi import CompareOptions, compare_commits, compare_patches
+
+
+def test_compare_patches(repo):
+    """Test that results stream in, with lazily computed diff texts, and are then available in path order."""
+    comparison = compare_patches('base..before', 'upstream..after')
+    streamed = {result.display_name: result for result in comparison}
+    assert [r.display_name for r in comparison.results] == ['a.py', 'gone.py', 'old.py → new.py', 'added.py']
+    assert streamed['a.py'].status == 'shifted'
+    added = streamed['added.py']
+    assert added.status == 'added' and added.different
+    assert '+++ added.py in upstream..after' in added.diff
+    assert added.patch1 == '' and '+added' in added.patch2
+    assert comparison.moves == []
+    assert didi.FileComparison is type(added)
+
+
+def test_compare_patches_executor_and_cache(repo):
+    """Test that callers can supply the executor patches are fetched in, and a cache reused across calls."""
+    cache = {}
+    options = CompareOptions(paths=('a.py', 'added.py'))
+    with ThreadPoolExecutor(2) as executor:
+        results = list(compare_patches('base..before', 'upstream..after', options, executor, cache))
+        assert sorted(r.path1 for r in results) == ['a.py', 'added.py']
+        assert cache
+        n = len(cache)
+        list(compare_patches('base..before', 'upstream..after', options, executor, cache))
+        assert len(cache) == n
+
+
+def test_compare_commits(repo):
+    """Test pairwise commit results, with patches fetched on first access."""
+    comparison = compare_commits('base..before', 'upstream..after', executor=ThreadPoolExecutor(2))
+    commit, = comparison
+    assert commit.subjects_match
+    assert 'diff1' not in vars(commit)
+    assert commit.status == 'changed'
+    assert commit.files == ['a.py', 'added.py', 'gone.py', 'new.py', 'old.py']
+    assert commit.record()['files'] == commit.files
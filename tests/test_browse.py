@@ -0,0 +1,71 @@
+"""Test the browse command's on-demand, cached per-file comparisons."""
+
+from didi.classify import classify
+from didi.commands.browse import Browser, detail_lines, line_style
+from didi.diff import get_file_diff, get_rename_mapping
+from didi.source import GitSource
+
+
+def browser(**kwargs) -> Browser:
+    rename_map = get_rename_mapping('base..upstream')
+    files = classify('base..before', 'upstream..after', rename_map=rename_map)
+    return Browser('base..before', 'upstream..after', files, rename_map, **kwargs)
+
+
+def test_browser(repo):
+    """Test that a file is compared when opened (prefetching its neighbors), and cached."""
+    b = browser(prefetch=1)
+    try:
+        names = [file.display_name for file in b.files]
+        assert [b.status(i) for i in range(len(names))] == [file.status for file in b.files]
+        i = names.index('gone.py')
+        future = b.open(i)
+        assert future is b.open(i)
+        result = future.result()
+        assert (result.path1, result.status) == ('gone.py', 'dropped')
+        assert set(b.results) == {j for j in (i - 1, i, i + 1) if 0 <= j < len(names)}
+
+        added = b.result(names.index('added.py')).result()
+        assert (added.path2, added.status, added.change1) == ('added.py', 'added', None)
+
+        renamed = b.result(names.index('old.py → new.py')).result()
+        assert (renamed.path1, renamed.path2, renamed.status) == ('old.py', 'new.py', 'identical')
+        lines = detail_lines(renamed, 'base..before', 'upstream..after')
+        assert lines[-1] == 'No differences (identical)'
+
+        lines = detail_lines(result, 'base..before', 'upstream..after')
+        assert lines[0] == 'dropped\tgone.py'
+        assert '--- gone.py in base..before' in lines
+    finally:
+        b.close()
+
+
+def test_compare_fetches_one_file(repo, monkeypatch):
+    """Test that opening a file fetches only its own two patches, without listing either range again."""
+    b = browser(prefetch=0)
+    fetched = []
+
+    def file_diff(self, path, *args):
+        fetched.append((self.refspec, path))
+        return get_file_diff(self.refspec, path, *args)
+
+    def changes(self, *args):
+        raise AssertionError("ranges listed again")
+
+    monkeypatch.setattr(GitSource, 'file_diff', file_diff)
+    monkeypatch.setattr(GitSource, 'changes', changes)
+    try:
+        names = [file.display_name for file in b.files]
+        result = b.open(names.index('a.py')).result()
+        assert result.status == 'shifted'
+        assert sorted(fetched) == [('base..before', 'a.py'), ('upstream..after', 'a.py')]
+    finally:
+        b.close()
+
+
+def test_line_style():
+    assert line_style('@@ -1 +1 @@') == 'hunk'
+    assert line_style('-+++ b/a.py') == 'removed'
+    assert line_style('+ -old') == 'added'
+    assert line_style('- +new') == 'removed'
+    assert line_style('  context') is None
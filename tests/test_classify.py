@@ -0,0 +1,45 @@
+"""Test file classification between two ranges."""
+
+from didi.classify import classify
+
+from conftest import git
+
+
+def test_classify(repo):
+    """Test each file gets the expected classification."""
+    classes = {c.display_name: c.status for c in classify('base..before', 'upstream..after')}
+    assert classes == {
+        'a.py': 'identical',
+        'old.py → new.py': 'renamed',
+        'gone.py': 'dropped',
+        'added.py': 'added',
+    }
+
+
+def test_classify_changed(repo):
+    """Test that a file with different content changes is classified as changed."""
+    (repo / 'a.py').write_text((repo / 'a.py').read_text().replace('60\n', '60 changed\n'))
+    git('commit', '-qam', 'more', cwd=repo)
+    classes = {c.display_name: c for c in classify('base..before', 'upstream..after')}
+    assert classes['a.py'].status == 'changed'
+    assert classes['a.py'].patch_id1 != classes['a.py'].patch_id2
+
+
+def test_classify_ignore_whitespace(tmp_path, monkeypatch):
+    """Test that with -w, files whose patches git leaves out don't shift other files' patches."""
+    git('init', '-q', '-b', 'main', cwd=tmp_path)
+    git('config', 'user.email', 'test@example.com', cwd=tmp_path)
+    git('config', 'user.name', 'Test', cwd=tmp_path)
+    (tmp_path / 'a').write_text('x = 1\n')
+    (tmp_path / 'b').write_text('y = 1\n')
+    git('add', '.', cwd=tmp_path)
+    git('commit', '-qm', 'base', cwd=tmp_path)
+    git('tag', 'base', cwd=tmp_path)
+    for branch, a, b in (('one', 'x =  1\n', 'y = 2\n'), ('two', 'x  = 1\n', 'y = 3\n')):
+        git('checkout', '-qb', branch, 'base', cwd=tmp_path)
+        (tmp_path / 'a').write_text(a)
+        (tmp_path / 'b').write_text(b)
+        git('commit', '-qam', branch, cwd=tmp_path)
+    monkeypatch.chdir(tmp_path)
+    classes = {c.display_name: c.status for c in classify('base..one', 'base..two', ignore_whitespace=True)}
+    assert classes == {'a': 'identical', 'b': 'changed'}
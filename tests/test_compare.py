@@ -0,0 +1,105 @@
+"""Test file-by-file patch comparison."""
+
+import json
+
+from click.testing import CliRunner
+
+from didi.api import CommitComparison
+from didi.cli import cli
+from didi.compare import compare_files
+from didi.diff import get_rename_mapping
+
+from conftest import git
+
+
+def test_compare_files(repo):
+    """Test each file's status, and that callbacks see every result."""
+    seen = []
+    results, moves = compare_files(
+        'base..before', 'upstream..after',
+        rename_map=get_rename_mapping('base..upstream'),
+        on_result=seen.append,
+    )
+    statuses = {r.display_name: r.status for r in results}
+    assert statuses == {
+        'a.py': 'shifted',
+        'gone.py': 'dropped',
+        'old.py → new.py': 'identical',
+        'added.py': 'added',
+    }
+    assert moves == []
+    assert sorted(r.display_name for r in seen) == sorted(statuses)
+
+
+def test_compare_files_changed(repo):
+    """Test that only unmatched hunks end up in the diff-of-diffs."""
+    (repo / 'a.py').write_text((repo / 'a.py').read_text().replace('10\n', '10 changed\n'))
+    git('commit', '-qam', 'more', cwd=repo)
+    results, _ = compare_files('base..before', 'upstream..after')
+    [a] = [r for r in results if r.path1 == 'a.py']
+    assert a.status == 'changed'
+    assert a.unmatched1 == []
+    assert len(a.unmatched2) == 1
+    assert '++10 changed' in a.diff_lines('base..before', 'upstream..after')
+
+
+def test_compare_files_same_blobs(repo, monkeypatch):
+    """Test that files with the same blob pair are identical without a fetch, unless their modes differ."""
+    from didi import source
+    fetched = []
+    get_file_diff = source.get_file_diff
+    monkeypatch.setattr(source, 'get_file_diff', lambda refspec, path, *args: fetched.append(path) or get_file_diff(refspec, path, *args))
+    git('checkout', '-qb', 'again', 'base', cwd=repo)
+    git('checkout', '-q', 'before', '--', '.', cwd=repo)
+    git('commit', '-qm', 'again', cwd=repo)
+    results, _ = compare_files('base..before', 'base..again')
+    assert {r.path1: r.status for r in results} == {'a.py': 'identical', 'old.py': 'identical', 'gone.py': 'identical'}
+    assert fetched == []
+
+    (repo / 'gone.py').chmod(0o755)
+    git('commit', '-qam', 'chmod', cwd=repo)
+    results, _ = compare_files('base..before', 'base..again')
+    assert {r.path1: r.status for r in results}['gone.py'] == 'changed'
+    assert sorted(fetched) == ['gone.py', 'gone.py']
+
+
+def test_patch_jsonl(repo):
+    """Test `patch --format=jsonl` emits one record per file."""
+    result = CliRunner().invoke(cli, ['patch', '--format=jsonl', 'base..before', 'upstream..after'])
+    assert result.exit_code == 0
+    records = [json.loads(line) for line in result.stdout.splitlines()]
+    by_path = {r['path1'] or r['path2']: r for r in records}
+    assert by_path['a.py']['status'] == 'shifted'
+    assert by_path['added.py']['status'] == 'added'
+    assert by_path['added.py']['diff'][0].startswith('--- added.py')
+    assert by_path['old.py']['renamed']
+    assert all('timings' in r for r in records)
+
+
+def test_commits_records_only_when_emitted(repo, monkeypatch):
+    """Test that `commits` only builds per-commit records for the formats that emit them."""
+    built = []
+    record = CommitComparison.record
+    monkeypatch.setattr(CommitComparison, 'record', lambda self: built.append(self.index) or record(self))
+    result = CliRunner().invoke(cli, ['commits', '--color=never', 'base..before', 'upstream..after'])
+    assert result.exit_code == 0
+    assert built == []
+    result = CliRunner().invoke(cli, ['commits', '--format=jsonl', 'base..before', 'upstream..after'])
+    assert result.exit_code == 0
+    assert len(built) == len(result.stdout.splitlines()) > 0
+
+
+def test_patch_html(repo):
+    """Test `patch --format=html` writes one collapsed section per differing file."""
+    result = CliRunner().invoke(cli, ['patch', '--format=html', 'base..before', 'upstream..after'])
+    assert result.exit_code == 0
+    assert result.stdout.count('<details id=') == 2
+    assert '<a href="#f1">File: added.py</a>' in result.stdout
+
+
+def test_stat_follow_with_excludes(repo):
+    """Test that stat with one path (using --follow) applies exclude rules in-process."""
+    (repo / '.didi.toml').write_text('exclude = ["*.lock"]\n')
+    result = CliRunner().invoke(cli, ['stat', 'base..before', 'upstream..after', 'gone.py'])
+    assert result.exit_code == 0, result.output
+    assert 'gone.py' in result.stdout
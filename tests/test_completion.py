@@ -0,0 +1,36 @@
+"""Test the cached ref and reflog listings behind shell completion."""
+
+from os.path import join
+
+from click.testing import CliRunner
+
+from didi.cli import cli
+from didi.completion import git_common_dir, is_stale, refresh
+
+from conftest import git
+
+
+def test_refresh(repo):
+    """Test refs and reflog entries (with subjects, newest first) are cached, until a ref changes."""
+    common_dir = git_common_dir()
+    assert is_stale(common_dir)
+    directory = refresh(common_dir)
+    assert not is_stale(common_dir)
+    with open(join(directory, 'refs')) as f:
+        refs = f.read().splitlines()
+    assert {'HEAD', 'main', 'before', 'after', 'base'} <= set(refs)
+    with open(join(directory, 'reflog')) as f:
+        reflog = f.read().splitlines()
+    assert reflog[reflog.index('main@{0}\tupstream') + 1] == 'main@{1}\tbase'
+    assert 'before@{0}\tchange' in reflog
+
+    git('branch', 'new', 'base', cwd=repo)
+    assert is_stale(common_dir)
+
+
+def test_complete_command(repo):
+    """Test `complete` prints a listing, refreshing the cache first if needed."""
+    result = CliRunner().invoke(cli, ['complete', 'refs'])
+    assert result.exit_code == 0
+    assert 'after' in result.stdout.splitlines()
+    assert not is_stale(git_common_dir())
@@ -0,0 +1,49 @@
+"""Test exclude/normalization rules."""
+
+import re
+
+from didi.config import Rules, glob_regex
+
+
+def test_glob_regex_basename():
+    """Test that globs without a slash match basenames at any depth."""
+    rgx = re.compile(glob_regex('*.lock'))
+    assert rgx.fullmatch('uv.lock')
+    assert rgx.fullmatch('sub/dir/uv.lock')
+    assert not rgx.fullmatch('uv.lock.bak')
+
+
+def test_glob_regex_anchored():
+    """Test that globs with a slash are anchored at the repo root."""
+    rgx = re.compile(glob_regex('docs/*.md'))
+    assert rgx.fullmatch('docs/index.md')
+    assert not rgx.fullmatch('docs/sub/index.md')
+    assert not rgx.fullmatch('other/docs/index.md')
+    assert re.fullmatch(glob_regex('docs/**/*.md'), 'docs/sub/index.md')
+
+
+def test_rules_filter():
+    """Test dropping excluded paths."""
+    rules = Rules(excludes=('uv.lock', 'gen/*'))
+    assert rules.filter(['a.py', 'uv.lock', 'pkg/uv.lock', 'gen/x_pb2.py']) == ['a.py']
+
+
+def test_rules_pathspecs():
+    """Test exclude globs are converted to git exclude pathspecs."""
+    rules = Rules(excludes=('uv.lock', 'gen/*'))
+    assert rules.pathspecs() == [':(top,exclude,glob)**/uv.lock', ':(top,exclude,glob)gen/*']
+
+
+def test_rules_normalize():
+    """Test regex line normalizations."""
+    rules = Rules(normalizations=((re.compile(r'version = ".*"'), 'version = "..."'),))
+    assert rules.normalize('+version = "1.2.3"') == '+version = "..."'
+    assert rules.normalize('+other') == '+other'
+
+
+def test_empty_rules():
+    """Test that empty rules are falsy and pass everything through."""
+    rules = Rules()
+    assert not rules
+    assert rules.filter(['a', 'b']) == ['a', 'b']
+    assert rules.pathspecs() == []
@@ -0,0 +1,100 @@
+"""Test forwarding commands to a resident daemon."""
+
+import os
+import stat
+import sys
+import time
+from os.path import exists
+from subprocess import Popen
+
+import pytest
+from click.testing import CliRunner
+
+from didi.cli import cli
+from didi.client import forward, option_value, socket_path
+from didi.daemon import LRUCache, stop
+
+from conftest import git
+
+
+def test_option_value():
+    """Test client-side option lookup, where the last value wins."""
+    argv = ['-c', 'always', '--pager=never', 'a..b', '-cnever', '--', '--color=always']
+    assert option_value(argv, ('-c', '--color'), 'auto') == 'never'
+    assert option_value(argv, ('--pager',), 'auto') == 'never'
+    assert option_value(argv, ('--format',), 'text') == 'text'
+
+
+@pytest.fixture
+def daemon(repo):
+    path = socket_path()
+    proc = Popen([sys.executable, '-m', 'didi.cli', 'daemon'], cwd=repo)
+    for _ in range(100):
+        if exists(path):
+            break
+        time.sleep(0.05)
+    yield path
+    stop(path)
+    proc.wait(timeout=10)
+
+
+def test_forward(daemon, capsys):
+    """Test that forwarded commands match in-process output, and exit codes come back."""
+    args = ['patch', '--color=never', 'base..before', 'upstream..after']
+    expected = CliRunner().invoke(cli, args).stdout
+    for _ in range(2):
+        assert forward(args) == 0
+        assert capsys.readouterr().out == expected
+    assert forward(['patch', '--bogus']) == 2
+    assert 'No such option' in capsys.readouterr().err
+
+
+def test_forward_without_daemon(repo, monkeypatch):
+    """Test that commands run in-process when no daemon is running (or it's disabled)."""
+    assert forward(['patch', 'base..before', 'upstream..after']) is None
+    monkeypatch.setenv('GIT_DIDI_NO_DAEMON', '1')
+    assert forward(['patch', 'base..before', 'upstream..after']) is None
+
+
+def test_forward_pathspecs_from_stdin(daemon, capsys):
+    """Test that commands reading pathspecs from stdin run in-process, where stdin is the client's."""
+    args = ['patch', '--color=never', '--pathspec-from-file', '-', 'base..before', 'upstream..after']
+    assert forward(args) is None
+    assert forward([*args[:2], '--pathspec-from-file=-', *args[4:]]) is None
+    assert forward([*args[:2], '--pathspec-from-file=paths.txt', *args[4:]]) is not None
+    capsys.readouterr()
+    result = CliRunner().invoke(cli, args, input='a.py\n')
+    assert result.exit_code == 0 and 'gone.py' not in result.stdout
+
+
+def test_socket_path(repo, monkeypatch):
+    """Test that the socket is found without running git (in linked worktrees too), unless `$GIT_DIR` is set."""
+    expected = str(repo / '.git' / 'didi' / 'daemon.sock')
+    git('worktree', 'add', '-q', str(repo / 'wt'), 'before', cwd=repo)
+
+    def no_git(*args, **kwargs):
+        raise AssertionError("ran git")
+
+    with monkeypatch.context() as m:
+        m.setattr('didi.client.run', no_git)
+        assert socket_path() == expected
+        m.chdir(repo / 'wt')
+        assert socket_path() == expected
+    monkeypatch.setenv('GIT_DIR', str(repo / '.git'))
+    assert socket_path() == expected
+
+
+def test_socket_mode(daemon):
+    """Test that only the daemon's owner can connect to it."""
+    assert stat.S_IMODE(os.stat(daemon).st_mode) == 0o600
+
+
+def test_lru_cache():
+    """Test that warm caches evict their least recently used entries."""
+    cache = LRUCache(2)
+    cache['a'] = 1
+    cache['b'] = 2
+    assert cache.get('a') == 1
+    cache['c'] = 3
+    assert dict(cache) == {'a': 1, 'c': 3}
+    assert cache.get('b') is None
@@ -1,10 +1,23 @@
 """Test diff utilities."""
 
+import re
+from concurrent.futures import ThreadPoolExecutor
+from subprocess import run
+
+import pytest
+
+from didi.config import Rules
 from didi.diff import (
+    NULL_SHA,
+    DiffTreeBatch,
     build_diff_cmd,
     compute_upstream_range,
     normalize_diff,
+    numstat_path,
+    parse_raw_numstat,
     parse_refspec_bases,
+    section_paths,
+    split_file_patches,
 )
 
 
@@ -104,3 +117,111 @@ def test_compute_upstream_range_invalid():
     """Test computing upstream range with invalid refspecs."""
     upstream = compute_upstream_range('main', 'feature')
     assert upstream == ''
+
+
+def test_parse_raw_numstat():
+    """Test parsing `--raw --numstat -z` output, including renames and binaries."""
+    sha = lambda c: c * 40
+    output = '\0'.join([
+        f':100644 100644 {sha("a")} {sha("b")} M', 'b.bin',
+        f':100644 100644 {sha("c")} {sha("d")} R099', 'a.txt', 'c.txt',
+        f':000000 100644 {"0" * 40} {sha("e")} A', 'n.txt',
+        '-\t-\tb.bin',
+        '1\t0\t', 'a.txt', 'c.txt',
+        '3\t0\tn.txt',
+        '',
+    ])
+    changes = parse_raw_numstat(output)
+    assert list(changes) == ['b.bin', 'c.txt', 'n.txt']
+
+    assert changes['b.bin'].binary
+    assert changes['b.bin'].blobs == (sha('a'), sha('b'))
+
+    renamed = changes['c.txt']
+    assert renamed.old_path == 'a.txt'
+    assert renamed.status == 'R099'
+    assert (renamed.added, renamed.deleted) == (1, 0)
+    assert not renamed.binary
+
+    assert changes['n.txt'].size == 3
+    assert changes['n.txt'].old_blob == NULL_SHA
+
+
+def test_normalize_diff_with_rules():
+    """Test user-defined normalizations are applied alongside index rewriting."""
+    diff_text = """index abc123..def456 100644
++version = "1.2.3\""""
+    rules = Rules(normalizations=((re.compile(r'"[\d.]+"'), '"..."'),))
+    assert normalize_diff(diff_text, rules=rules) == 'index ...\n+version = "..."'
+
+
+def test_split_file_patches():
+    """Test attributing each `diff --git` section of a range patch to the file in its header."""
+    lines = [
+        'diff --git a/a.py b/a.py',
+        '@@ -1 +1 @@',
+        '-a',
+        '+b',
+        'diff --git a/b.bin b/b.bin',
+        'Binary files a/b.bin and b/b.bin differ',
+        'diff --git a/old.py b/new.py',
+        'similarity index 90%',
+        'rename from old.py',
+        'rename to new.py',
+        'diff --git a/sp ace b/sp ace',
+        'deleted file mode 100644',
+        '--- a/sp ace\t',
+        '+++ /dev/null',
+        'diff --git "a/t\\303\\251" "b/t\\303\\251"',
+        '--- /dev/null',
+        '+++ "b/t\\303\\251"',
+    ]
+    assert [(path, len(section)) for path, section in split_file_patches(iter(lines))] == [
+        ('a.py', 4), ('b.bin', 2), ('new.py', 4), ('sp ace', 4), ('té', 3),
+    ]
+    sections = [section for _, section in split_file_patches(iter(lines))]
+    assert [section_paths(section) for section in sections] == [
+        ('a.py', 'a.py'), ('b.bin', 'b.bin'), ('old.py', 'new.py'), ('sp ace', 'sp ace'), ('té', 'té'),
+    ]
+
+
+def test_numstat_path():
+    """Test extracting the new path from --numstat lines, including rename notation."""
+    assert numstat_path('1\t2\tsrc/a.py') == 'src/a.py'
+    assert numstat_path('0\t0\tsrc/{old => new}/a.py') == 'src/new/a.py'
+    assert numstat_path('0\t0\tsrc/{ => new}/a.py') == 'src/new/a.py'
+    assert numstat_path('0\t0\tsrc/{old => }/a.py') == 'src/a.py'
+    assert numstat_path('0\t0\told.py => new.py') == 'new.py'
+
+
+def rev_parse(*revs):
+    return run(['git', 'rev-parse', *revs], capture_output=True, text=True, check=True).stdout.split()
+
+
+def test_diff_tree_batch(repo):
+    """Test batched patches match `git diff`'s, in request order, from concurrent callers."""
+    base, upstream, before, after, base_tree, after_tree = rev_parse(
+        'base', 'upstream', 'before', 'after', 'base^{tree}', 'after^{tree}',
+    )
+    batch = DiffTreeBatch()
+    expected = {
+        (sha,): run(['git', 'diff', f'{sha}^', sha], capture_output=True, text=True).stdout
+        for sha in (upstream, before, after)
+    }
+    expected[(base_tree, after_tree)] = run(['git', 'diff', base, after], capture_output=True, text=True).stdout
+    expected[(after_tree, after_tree)] = ''
+    requests = list(expected) * 5
+
+    def fetch(request):
+        future = batch.submit(*request) if len(request) == 1 else batch.submit_trees(*request)
+        return future.result()
+
+    with ThreadPoolExecutor(4) as executor:
+        patches = list(executor.map(fetch, requests))
+    assert patches == [expected[request] for request in requests]
+    # Root commits (like `git diff <root>^ <root>`) have no patch
+    assert batch.diff(base) == ''
+    with pytest.raises(ValueError):
+        batch.submit('HEAD')
+    batch.close()
+    assert batch.proc.returncode == 0
@@ -0,0 +1,153 @@
+"""Test hunk hashing utilities."""
+
+from time import perf_counter
+
+from didi.hunks import (
+    canonical_diff,
+    find_moved_hunks,
+    first_differing_hunk,
+    format_hunks,
+    iter_hunk_digests,
+    match_hunks,
+    parse_hunks,
+)
+
+
+PATCH = """diff --git a/file.py b/file.py
+index abc123..def456 100644
+--- a/file.py
++++ b/file.py
+@@ -1,3 +1,3 @@
+-old line
++new line
+@@ -10,3 +10,3 @@
+-other old line
++other new line"""
+
+
+def test_iter_hunk_digests_counts_header_and_hunks():
+    """Test that the header and each hunk get their own digest."""
+    digests = list(iter_hunk_digests(PATCH.splitlines()))
+    assert len(digests) == 3
+
+
+def test_iter_hunk_digests_ignores_index_shas():
+    """Test that digests are computed over normalized lines."""
+    other = PATCH.replace('abc123..def456', '111111..222222')
+    assert list(iter_hunk_digests(PATCH.splitlines())) == list(iter_hunk_digests(other.splitlines()))
+
+
+def test_first_differing_hunk():
+    """Test locating the first differing hunk."""
+    other = PATCH.replace('other new line', 'something else')
+    assert first_differing_hunk(
+        iter_hunk_digests(PATCH.splitlines()),
+        iter_hunk_digests(other.splitlines()),
+    ) == 2
+
+
+def test_first_differing_hunk_identical():
+    """Test that identical patches have no differing hunk."""
+    assert first_differing_hunk(
+        iter_hunk_digests(PATCH.splitlines()),
+        iter_hunk_digests(PATCH.splitlines()),
+    ) is None
+
+
+def test_first_differing_hunk_missing_side():
+    """Test that a patch missing on one side differs at its header."""
+    assert first_differing_hunk(iter_hunk_digests(PATCH.splitlines()), iter_hunk_digests([])) == 0
+
+
+def test_iter_hunk_digests_ignores_offsets():
+    """Test that shifted hunk headers don't change digests."""
+    shifted = PATCH.replace('@@ -10,3 +10,3 @@', '@@ -12,3 +12,3 @@ def f():')
+    assert list(iter_hunk_digests(PATCH.splitlines())) == list(iter_hunk_digests(shifted.splitlines()))
+
+
+def test_parse_hunks():
+    """Test splitting a patch into header lines and hunks."""
+    header, hunks = parse_hunks(PATCH)
+    assert header[1] == 'index ...'
+    assert len(header) == 4
+    assert [h.header for h in hunks] == ['@@ -1,3 +1,3 @@', '@@ -10,3 +10,3 @@']
+    assert hunks[0].lines == ['-old line', '+new line']
+    assert format_hunks(header, hunks) == PATCH.replace('abc123..def456 100644', '...').splitlines()
+
+
+def test_canonical_diff_strips_offsets():
+    """Test the canonical form drops offsets but keeps section headings."""
+    shifted = PATCH.replace('@@ -10,3 +10,3 @@', '@@ -12,3 +12,3 @@ def f():')
+    canonical = canonical_diff(shifted)
+    assert '@@ @@\n-old line' in canonical
+    assert '@@ @@ def f():\n-other old line' in canonical
+
+
+def test_match_hunks_reordered():
+    """Test that reordered and shifted hunks all match."""
+    _, hunks1 = parse_hunks(PATCH)
+    _, hunks2 = parse_hunks(PATCH)
+    assert match_hunks(hunks1, list(reversed(hunks2))) == ([], [])
+
+
+def test_match_hunks_unmatched():
+    """Test that only differing hunks are reported, including duplicates."""
+    _, hunks1 = parse_hunks(PATCH)
+    _, hunks2 = parse_hunks(PATCH.replace('other new line', 'something else'))
+    unmatched1, unmatched2 = match_hunks(hunks1 + hunks1[:1], hunks2)
+    assert [h.lines[-1] for h in unmatched1] == ['+other new line', '+new line']
+    assert [h.lines[-1] for h in unmatched2] == ['+something else']
+
+
+def test_find_moved_hunks():
+    """Test that hunks present under different files on each side are reported as moves."""
+    _, hunks1 = parse_hunks(PATCH)
+    moved = parse_hunks(PATCH.replace(' 1,3 +1,3', ' 40,3 +40,3'))[1][0]
+    unmatched1 = {'helpers.py': [hunks1[0]], 'other.py': [hunks1[1]]}
+    unmatched2 = {'utils.py': [moved], 'other.py': []}
+    moves = find_moved_hunks(unmatched1, unmatched2)
+    assert [(m.key1, m.key2) for m in moves] == [('helpers.py', 'utils.py')]
+    assert unmatched1 == {'helpers.py': [], 'other.py': [hunks1[1]]}
+    assert unmatched2 == {'utils.py': [], 'other.py': []}
+
+
+def test_find_moved_hunks_ignores_same_file():
+    """Test that a hunk unmatched within the same file is not reported as moved."""
+    _, hunks1 = parse_hunks(PATCH)
+    _, hunks2 = parse_hunks(PATCH.replace('-old line', ' old line\n-old line'))
+    unmatched1 = {'a.py': [hunks1[0]]}
+    unmatched2 = {'a.py': [hunks2[0]]}
+    assert find_moved_hunks(unmatched1, unmatched2) == []
+    assert unmatched1 == {'a.py': [hunks1[0]]}
+
+
+def test_find_moved_hunks_ignores_trivial_changes():
+    """Test that unrelated hunks sharing only a trivial change (e.g. `+}`) aren't moves, unless their context matches too."""
+    _, [brace1] = parse_hunks('@@ -5,3 +5,4 @@ def f():\n a\n+}\n b\n c')
+    _, [brace2] = parse_hunks('@@ -9,3 +9,4 @@ def g():\n x\n+}\n y\n z')
+    assert find_moved_hunks({'a.py': [brace1]}, {'b.py': [brace2]}) == []
+
+    _, [same] = parse_hunks('@@ -90,3 +90,4 @@ def h():\n a\n+}\n b\n c')
+    assert [(m.key1, m.key2) for m in find_moved_hunks({'a.py': [brace1]}, {'b.py': [same]})] == [('a.py', 'b.py')]
+
+    body = '\n-x = 1\n-y = 2\n+x = 10\n+y = 20'
+    _, [big1] = parse_hunks('@@ -1,4 +1,4 @@\n before' + body)
+    _, [big2] = parse_hunks('@@ -7,4 +7,4 @@\n after' + body)
+    assert len(find_moved_hunks({'a.py': [big1]}, {'b.py': [big2]})) == 1
+
+
+def test_find_moved_hunks_repeated_digests():
+    """Test that many hunks with the same changes are matched in one pass, skipping same-file candidates."""
+    n = 5000
+    changes = '\n-x = 1\n-y = 2\n+x = 10\n+y = 20'
+
+    def hunks(context: str) -> list:
+        return [parse_hunks(f'@@ -1,4 +1,4 @@\n {context}{changes}')[1][0] for _ in range(n)]
+
+    unmatched1 = {'a.py': hunks('c')}
+    unmatched2 = {'a.py': hunks('a'), 'b.py': hunks('b')}
+    start = perf_counter()
+    moves = find_moved_hunks(unmatched1, unmatched2)
+    assert perf_counter() - start < 1
+    assert len(moves) == n and {m.key2 for m in moves} == {'b.py'}
+    assert unmatched1 == {'a.py': []} and len(unmatched2['a.py']) == n
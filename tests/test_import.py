@@ -1,5 +1,8 @@
 """Test that the package imports correctly."""
 
+import sys
+from subprocess import run
+
 
 def test_import():
     """Test basic imports."""
@@ -39,3 +42,9 @@ def test_import_pager():
     """Test pager module imports."""
     from didi import Pager
     assert Pager
+
+
+def test_cli_skips_curses():
+    """Test that importing the CLI (which registers `browse`) doesn't load curses."""
+    result = run([sys.executable, '-c', 'import sys, didi.cli; print("curses" in sys.modules)'], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == 'False'
@@ -0,0 +1,147 @@
+"""Test comparing `git format-patch` series (mboxes and `.patch` directories) without applying them."""
+
+import re
+from subprocess import run
+
+from click.testing import CliRunner
+
+from didi.api import compare_commits
+from didi.cli import cli
+from didi.mbox import MboxSource, decode_subject, iter_messages
+from didi.source import GitSource, open_source
+
+from conftest import git
+
+
+def format_patch(*args) -> str:
+    return run(['git', 'format-patch', *args], capture_output=True, text=True, check=True).stdout
+
+
+def test_iter_messages():
+    """Test header parsing (folded, encoded subjects), and skipping the diffstat and signature."""
+    mbox = [
+        f'From {"1" * 40} Mon Sep 17 00:00:00 2001',
+        'Subject: [PATCH v2 1/2] =?UTF-8?q?caf=C3=A9?=',
+        ' fix',
+        '',
+        'Message body.',
+        '---',
+        ' a.py | 2 +-',
+        '',
+        'diff --git a/a.py b/a.py',
+        '@@ -1 +1 @@',
+        '-a',
+        '+b',
+        '-- ',
+        '2.39.5',
+        '',
+    ]
+    (sha, subject, lines, base), = iter_messages(line + '\n' for line in mbox)
+    assert sha == '1' * 40
+    assert subject == 'café fix'
+    assert lines == ['diff --git a/a.py b/a.py', '@@ -1 +1 @@', '-a', '+b']
+    assert base is None
+    assert decode_subject('[RFC] [PATCH] x') == 'x'
+
+
+def test_mbox_source(repo, tmp_path):
+    """Test that a series (as an mbox or a directory) compares equal to the range it came from."""
+    (tmp_path / 'series.mbox').write_text(format_patch('--stdout', '--base=base', 'base..before'))
+    format_patch('-q', '-o', str(tmp_path / 'series'), 'base..before')
+    for path in (tmp_path / 'series.mbox', tmp_path / 'series'):
+        source = open_source(str(path))
+        assert isinstance(source, MboxSource)
+        changes = source.changes()
+        assert sorted(changes) == ['a.py', 'gone.py', 'old.py']
+        assert (changes['a.py'].added, changes['a.py'].deleted) == (1, 1)
+        result = CliRunner().invoke(cli, ['patch', '--color=never', str(path), 'base..before'])
+        assert result.exit_code == 0
+        assert 'File:' not in result.stdout
+        result = CliRunner().invoke(cli, ['commits', '--color=never', str(path), 'base..before'])
+        assert '[1] change - identical' in result.stdout
+    assert MboxSource(str(tmp_path / 'series.mbox')).range.endswith('..')
+
+
+def make_series(repo):
+    """`series`: a branch off `base` whose two commits both change a.py (the second partly undoing the first)."""
+    git('checkout', '-qb', 'series', 'base', cwd=repo)
+    a = repo / 'a.py'
+    a.write_text(a.read_text().replace('10\n', 'ten\n').replace('12\n', 'twelve\n'))
+    git('commit', '-qam', 'one', cwd=repo)
+    a.write_text(a.read_text().replace('twelve\n', '12\n').replace('11\n', 'eleven\n'))
+    git('commit', '-qam', 'two', cwd=repo)
+
+
+def test_cumulative_patch(repo, tmp_path):
+    """Test that files several commits change compare by their cumulative patch, with or without `--base`."""
+    make_series(repo)
+    (tmp_path / 'base.mbox').write_text(format_patch('--stdout', '--base=base', 'base..series'))
+    (tmp_path / 'series.mbox').write_text(format_patch('--stdout', 'base..series'))
+    for path in ('base.mbox', 'series.mbox'):
+        source = MboxSource(str(tmp_path / path))
+        assert source.applied
+        assert source.file_diff('a.py') == GitSource('base..series').file_diff('a.py')
+        result = CliRunner().invoke(cli, ['patch', '--color=never', str(tmp_path / path), 'base..series'])
+        assert result.exit_code == 0
+        assert 'File:' not in result.stdout
+
+    # Upstream renames are found from the first commit's parent, without `--base`
+    (tmp_path / 'before.mbox').write_text(format_patch('--stdout', 'base..before'))
+    result = CliRunner().invoke(cli, ['patch', '--color=never', str(tmp_path / 'before.mbox'), 'upstream..after'])
+    expected = CliRunner().invoke(cli, ['patch', '--color=never', 'base..before', 'upstream..after'])
+    assert result.stdout.replace(str(tmp_path / 'before.mbox'), 'base..before') == expected.stdout
+    assert 'moved' not in result.stdout
+
+
+def test_unapplied_series(repo, tmp_path, monkeypatch):
+    """Test that a series with no base is compared as mailed, with a warning about files several commits change."""
+    make_series(repo)
+    mbox = re.sub(r'^From [0-9a-f]{40} ', 'From unknown ', format_patch('--stdout', 'base..series'), flags=re.M)
+    (tmp_path / 'series.mbox').write_text(mbox)
+    warnings = []
+    monkeypatch.setattr('didi.mbox.err', warnings.append)
+    result = CliRunner().invoke(cli, ['patch', '--color=never', str(tmp_path / 'series.mbox'), 'base..series'])
+    assert result.exit_code == 0
+    warning, = warnings
+    assert 'compared hunk by hunk' in warning and warning.endswith(': a.py')
+    source = MboxSource(str(tmp_path / 'series.mbox'))
+    assert [commit.split(' ', 1)[1] for commit in source.commits()] == ['two', 'one']
+    assert '+eleven' in source.commit_file_diff(source.commits()[0].split()[0], 'a.py').splitlines()
+
+
+def test_mbox_paths(repo, tmp_path):
+    """Test that renames and binary files are parsed from their headers, even where paths contain " b/"."""
+    (repo / 'x y.py').write_text(''.join(f'{i}\n' for i in range(20)))
+    git('add', '.', cwd=repo)
+    git('commit', '-qm', 'add', cwd=repo)
+    git('tag', 'added', cwd=repo)
+    (repo / 'a b').mkdir()
+    git('mv', 'x y.py', 'a b/z.py', cwd=repo)
+    (repo / 'a b' / 'c.bin').write_bytes(b'\0binary')
+    git('add', '.', cwd=repo)
+    git('commit', '-qm', 'rename', cwd=repo)
+    (tmp_path / 'rename.mbox').write_text(format_patch('--stdout', '--binary', 'added..HEAD'))
+    source = MboxSource(str(tmp_path / 'rename.mbox'))
+    changes = source.changes()
+    assert sorted(changes) == ['a b/c.bin', 'a b/z.py']
+    assert changes['a b/z.py'].old_path == 'x y.py'
+    assert changes['a b/c.bin'].binary
+    assert 'Binary files /dev/null and b/a b/c.bin differ' in source.file_diff('a b/c.bin')
+
+
+def test_pair_by_patch_id(repo, tmp_path):
+    """Test that reordered commits are paired by patch ID."""
+    git('checkout', '-qb', 'two', 'base', cwd=repo)
+    (repo / 'gone.py').write_text('one\n')
+    git('commit', '-qam', 'one', cwd=repo)
+    (repo / 'a.py').write_text('two\n')
+    git('commit', '-qam', 'two', cwd=repo)
+    git('checkout', '-qb', 'swapped', 'base', cwd=repo)
+    (repo / 'a.py').write_text('two\n')
+    git('commit', '-qam', 'two', cwd=repo)
+    (repo / 'gone.py').write_text('one\n')
+    git('commit', '-qam', 'one', cwd=repo)
+
+    (tmp_path / 'two.mbox').write_text(format_patch('--stdout', 'base..two'))
+    commits = list(compare_commits(str(tmp_path / 'two.mbox'), 'base..swapped'))
+    assert [(c.subject1, c.subject2, c.status) for c in commits] == [('two', 'two', 'identical'), ('one', 'one', 'identical')]
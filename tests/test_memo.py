@@ -0,0 +1,70 @@
+"""Test the whole-run memo: re-rendering a comparison without running git."""
+
+from click.testing import CliRunner
+
+from didi.cli import cli
+from didi.memo import find_git_dirs
+
+from conftest import git
+
+
+def patch(*args) -> str:
+    result = CliRunner().invoke(cli, ['patch', *args, 'base..before', 'upstream..after'])
+    assert result.exit_code == 0, result.output
+    return result.stdout
+
+
+def test_rerender_without_git(repo, tmp_path_factory, monkeypatch):
+    """Test that presentation-only re-runs are served from the memo, and ref updates invalidate it."""
+    full = patch()
+    quiet = patch('-q')
+    assert 'added.py' in full and full != quiet
+
+    # Without git on PATH, only memoized comparisons can be rendered
+    with monkeypatch.context() as m:
+        m.setenv('PATH', str(tmp_path_factory.mktemp('empty')))
+        assert patch() == full
+        assert patch('-q') == quiet
+        assert patch('--format=html').startswith('<!DOCTYPE html>')
+
+    git('checkout', '-q', 'after', cwd=repo)
+    (repo / 'added.py').unlink()
+    git('commit', '-qam', 'drop added.py', cwd=repo)
+    assert 'added.py' not in patch()
+    # Back to the original SHAs: found by their resolved key
+    git('reset', '-q', '--hard', 'HEAD~1', cwd=repo)
+    assert patch() == full
+
+
+def test_no_memo(repo):
+    """Test that --no-memo recomputes, and that options affecting results aren't served from another run's memo."""
+    assert patch() == patch('--no-memo')
+    assert 'a.py' not in patch('--no-memo')
+    assert patch('-U0') == patch('-U0', '--no-memo')
+    assert patch('--classify') == patch('--classify', '--no-memo')
+
+
+def test_find_git_dirs(repo, tmp_path_factory):
+    """Test that git dirs are found without git, including from a linked worktree's subdirectory."""
+    git_dir, common_dir, toplevel = find_git_dirs(str(repo))
+    assert git_dir == common_dir == str(repo / '.git')
+    assert toplevel == str(repo)
+
+    linked = tmp_path_factory.mktemp('linked') / 'wt'
+    git('worktree', 'add', '-q', str(linked), 'before', cwd=repo)
+    (linked / 'sub').mkdir()
+    git_dir, common_dir, toplevel = find_git_dirs(str(linked / 'sub'))
+    assert git_dir == str(repo / '.git' / 'worktrees' / 'wt')
+    assert common_dir == str(repo / '.git')
+    assert toplevel == str(linked)
+
+
+def test_pseudo_ref_invalidates(repo):
+    """Test that moving a pseudo-ref (like FETCH_HEAD) invalidates command lines naming it."""
+    def patch_fetched(*args) -> str:
+        return CliRunner().invoke(cli, ['patch', '-q', *args, 'upstream..FETCH_HEAD', 'upstream..after']).stdout
+
+    git('fetch', '-q', '.', 'upstream', cwd=repo)
+    assert 'added.py' in patch_fetched()
+    git('fetch', '-q', '.', 'after', cwd=repo)
+    assert patch_fetched() == patch_fetched('--no-memo') == ''
@@ -0,0 +1,57 @@
+"""Test verification records in git notes: identical comparisons are recorded, and skipped when re-run."""
+
+import json
+from subprocess import run
+
+from click.testing import CliRunner
+
+from didi.cli import cli
+
+from conftest import git
+
+
+def didi(*args) -> list[dict]:
+    result = CliRunner().invoke(cli, [*args, '--format=jsonl'])
+    assert result.exit_code == 0, result.output
+    return [json.loads(line) for line in result.stdout.splitlines()]
+
+
+def note(repo, rev: str) -> str:
+    return run(['git', 'notes', '--ref=didi', 'show', rev], cwd=repo, capture_output=True, text=True).stdout
+
+
+def test_patch_notes(repo, tmp_path_factory, monkeypatch):
+    """Test that a verified comparison is recorded on the rebased tip, skipped on re-runs, and travels with fetch."""
+    args = ['patch', '--notes', '--no-memo', 'base..before', 'upstream..after', 'a.py']
+    records = didi(*args)
+    assert [(record['path1'], record['status']) for record in records] == [('a.py', 'shifted')]
+    lines = note(repo, 'after').splitlines()
+    assert len(lines) == 1 and lines[0].startswith('didi patch ') and lines[0].endswith(' identical')
+
+    # Recorded: nothing is compared
+    assert didi(*args) == []
+    # Other options affecting results aren't covered by the record
+    assert didi(*args[:-3], '-U0', *args[-3:])
+    assert len(note(repo, 'after').splitlines()) == 2
+
+    # Differences aren't recorded
+    assert didi('patch', '--notes', 'base..before', 'upstream..after')
+    assert len(note(repo, 'after').splitlines()) == 2
+
+    # Another clone fetching the notes skips it too
+    clone = tmp_path_factory.mktemp('clone') / 'repo'
+    git('clone', '-q', str(repo), str(clone), cwd=repo)
+    git('fetch', '-q', 'origin', 'refs/notes/didi:refs/notes/didi', cwd=clone)
+    git('branch', '-q', 'before', 'origin/before', cwd=clone)
+    monkeypatch.chdir(clone)
+    assert didi(*args) == []
+
+
+def test_commits_notes(repo):
+    """Test that commits --notes records ranges whose commits all match, and skips them on re-runs."""
+    args = ['commits', '--notes', 'base..before', 'base..before']
+    assert len(didi(*args)) == 1
+    assert note(repo, 'before').startswith('didi commits ')
+    assert didi(*args) == []
+    didi('commits', '--notes', 'base..before', 'upstream..after')
+    assert not note(repo, 'after')
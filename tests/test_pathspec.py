@@ -0,0 +1,41 @@
+"""Test in-process pathspec matching."""
+
+from didi.compare import compare_files
+from didi.pathspec import PathFilter, load_path_filter, read_pathspec_file
+
+
+def test_path_filter():
+    """Test files, directories and wildcards, relative to a subdirectory."""
+    f = PathFilter.from_specs(['a.py', 'lib/', '*.md', '../top.txt'], prefix='sub/')
+    assert f.matches('sub/a.py')
+    assert f.matches('sub/lib/x/y.py')
+    assert f.matches('sub/docs/README.md')
+    assert f.matches('top.txt')
+    assert not f.matches('a.py')
+    assert not f.matches('sub/library.py')
+    assert f.filter(['sub/a.py', 'b.py']) == ['sub/a.py']
+    assert f.git_pathspecs() == ()
+
+
+def test_path_filter_special():
+    """Test "." (everything) and magic pathspecs, which are left to git."""
+    assert PathFilter.from_specs(['.']).matches('any/path')
+    magic = PathFilter.from_specs([':(glob)**/*.py', 'a.py'])
+    assert magic.git_pathspecs() == (':(glob)**/*.py', 'a.py')
+    assert magic.matches('b.txt')
+
+
+def test_read_pathspec_file(tmp_path):
+    """Test newline- and NUL-separated pathspec files."""
+    (tmp_path / 'lines').write_text('a.py\nsrc/\n\n')
+    (tmp_path / 'nul').write_text('a b.py\0src/\0')
+    assert read_pathspec_file(str(tmp_path / 'lines')) == ['a.py', 'src/']
+    assert read_pathspec_file(str(tmp_path / 'nul'), nul=True) == ['a b.py', 'src/']
+
+
+def test_compare_files_path_filter(repo):
+    """Test that pathspecs from a file select files without being passed to git."""
+    (repo / 'paths').write_text('a.py\nadded.py\n')
+    path_filter = load_path_filter(pathspec_from_file=str(repo / 'paths'))
+    results, _ = compare_files('base..before', 'upstream..after', path_filter=path_filter)
+    assert [r.display_name for r in results] == ['a.py', 'added.py']
@@ -0,0 +1,70 @@
+"""Test progress reporting: counters updated by the comparison pipeline, and their display."""
+
+from io import StringIO
+from time import sleep
+
+from didi import progress
+from didi.api import compare_patches
+from didi.progress import NO_PROGRESS, Progress, format_bytes, format_duration
+
+
+def test_status():
+    p = Progress()
+    p.phase('comparing patches', 10)
+    assert p.status() == 'comparing patches: 0/10 files (0%)'
+    p.advance(4, nbytes=2048)
+    p.phase_start -= 2
+    with p.git():
+        assert p.status() == 'comparing patches: 4/10 files (40%), 2.0 KB, 1 git running, 2 files/s, ETA 0:03'
+    assert p.running == 0
+    p.phase('listing changed files')
+    assert p.status() == 'listing changed files: 2.0 KB'
+
+
+def test_format():
+    assert format_bytes(512) == '512 B'
+    assert format_bytes(3 * 1024 ** 2) == '3.0 MB'
+    assert format_duration(75) == '1:15'
+    assert format_duration(3725) == '1:02:05'
+
+
+def test_pipeline_counters(repo):
+    """Test that comparing patches updates the counters as files are decided."""
+    p = Progress()
+    comparison = compare_patches('base..before', 'upstream..after', progress=p)
+    for result in comparison:
+        assert p.name in ('comparing patches', 'finding moved hunks') and p.done <= p.total
+    assert p.done == p.total and p.total <= len(comparison.results)
+    assert p.bytes > 0 and p.running == 0
+
+
+def test_no_progress(repo):
+    """Test that comparisons run without progress don't share (or update) any counters."""
+    list(compare_patches('base..before', 'upstream..after'))
+    assert (NO_PROGRESS.name, NO_PROGRESS.done, NO_PROGRESS.bytes, NO_PROGRESS.total) == ('', 0, 0, None)
+
+
+def test_display(monkeypatch):
+    """Test that log mode prints lines periodically, and line mode redraws (then clears) one line."""
+    monkeypatch.setattr(progress, 'LOG_INTERVAL', 0.01)
+    stream = StringIO()
+    with Progress('log', stream, delay=0) as p:
+        p.phase('comparing commits', 3, 'commits')
+        p.advance()
+        sleep(0.1)
+    lines = stream.getvalue().splitlines()
+    assert len(lines) > 1
+    assert lines[-1].startswith('[0:00] comparing commits: 1/3 commits (33%)')
+
+    stream = StringIO()
+    with Progress('line', stream, delay=0) as p:
+        p.phase('comparing patches', 2)
+        sleep(0.3)
+    assert stream.getvalue().startswith('\rcomparing patches: 0/2 files (0%)\x1b[K')
+    assert stream.getvalue().endswith('\r\x1b[K') and '\n' not in stream.getvalue()
+
+    # Nothing is shown for comparisons finishing within the delay
+    stream = StringIO()
+    with Progress('line', stream) as p:
+        p.phase('comparing patches', 2)
+    assert stream.getvalue() == ''
@@ -0,0 +1,87 @@
+"""Test auditing rebased commits against git's automatic merges."""
+
+import json
+from subprocess import run
+
+import pytest
+from click.testing import CliRunner
+
+from didi.cli import cli
+from didi.remerge import CLEAN, EDITED, RESOLVED, RemergeAudit
+from didi.source import GitSource
+
+from conftest import git
+
+
+def edit(path, old, new):
+    path.write_text(path.read_text().replace(f'{old}\n', f'{new}\n'))
+
+
+@pytest.fixture
+def rebased(tmp_path, monkeypatch):
+    """A branch rebased across a conflicting upstream change: one conflict resolved, one clean pick, one extra edit."""
+    git('init', '-q', '-b', 'main', cwd=tmp_path)
+    git('config', 'user.email', 'test@example.com', cwd=tmp_path)
+    git('config', 'user.name', 'Test', cwd=tmp_path)
+    f, g = tmp_path / 'f.txt', tmp_path / 'g.txt'
+    f.write_text(''.join(f'{i}\n' for i in range(20)))
+    g.write_text(''.join(f'{i}\n' for i in range(10)))
+    git('add', '.', cwd=tmp_path)
+    git('commit', '-qm', 'base', cwd=tmp_path)
+    git('tag', 'base', cwd=tmp_path)
+    edit(f, '3', '3 upstream')
+    git('commit', '-qam', 'upstream', cwd=tmp_path)
+    git('tag', 'upstream', cwd=tmp_path)
+
+    def commits(resolution, extra):
+        if resolution:
+            edit(f, '3 upstream', resolution)
+        else:
+            edit(f, '3', '3 feature')
+        git('commit', '-qam', 'conflicting', cwd=tmp_path)
+        edit(g, '8', '8 feature')
+        git('commit', '-qam', 'clean', cwd=tmp_path)
+        edit(f, '15', '15 feature')
+        if extra:
+            edit(g, '1', '1 extra')
+        git('commit', '-qam', 'edited', cwd=tmp_path)
+
+    git('checkout', '-qb', 'before', 'base', cwd=tmp_path)
+    commits(None, extra=False)
+    git('checkout', '-qb', 'after', 'upstream', cwd=tmp_path)
+    commits('3 upstream feature', extra=True)
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def rev_parse(*revs):
+    return run(['git', 'rev-parse', *revs], capture_output=True, text=True, check=True).stdout.split()
+
+
+def test_remerge_audit(rebased):
+    """Test only conflict resolutions and extra edits are reported, and the worktree is untouched."""
+    audit = RemergeAudit(GitSource('base..before'), GitSource('upstream..after'))
+    before = rev_parse('before~2', 'before~1', 'before')
+    after = rev_parse('after~2', 'after~1', 'after')
+    subjects = ['conflicting', 'clean', 'edited']
+    results = list(audit.run(list(zip([1, 2, 3], before, after, subjects))))
+    assert [r.status for r in results] == [RESOLVED, CLEAN, EDITED]
+    assert results[0].conflicts == ['f.txt']
+    assert '+3 upstream feature' in results[0].diff.splitlines()
+    assert not results[1].diff
+    # The edit that came with the commit is expected; only the extra one is reported
+    assert [line for line in results[2].diff.splitlines() if line[:1] in '+-' and line[:3] not in ('---', '+++')] == [
+        '-1', '+1 extra',
+    ]
+    status = run(['git', 'status', '--porcelain'], capture_output=True, text=True).stdout
+    assert status == ''
+
+
+def test_commits_remerge(rebased):
+    """Test `commits --remerge` emits one record per commit pair."""
+    result = CliRunner().invoke(cli, ['commits', '--remerge', '--format=jsonl', 'base..before', 'upstream..after'])
+    assert result.exit_code == 0
+    records = [json.loads(line) for line in result.stdout.splitlines()]
+    assert [(r['subject'], r['status']) for r in records] == [
+        ('edited', EDITED), ('clean', CLEAN), ('conflicting', RESOLVED),
+    ]
@@ -0,0 +1,117 @@
+"""Test output renderers."""
+
+import re
+import zlib
+from base64 import b64decode
+
+from didi.render import AnsiRenderer, HtmlRenderer, PlainRenderer, html_line, intraline_spans, meta_style, renderer
+
+
+def test_renderer_backend():
+    """Test picking a backend from the color setting."""
+    assert isinstance(renderer(True), AnsiRenderer)
+    assert isinstance(renderer(False), PlainRenderer)
+    assert isinstance(renderer(True, 'plain'), PlainRenderer)
+
+
+def test_meta_style():
+    """Test outer headers and nested metadata get fg-only styles."""
+    assert meta_style('--- a.py in A..B') == 'removed'
+    assert meta_style('+++ a.py in C..D') == 'added'
+    assert meta_style('@@ -1,3 +1,3 @@') == 'hunk'
+    assert meta_style('-@@ -1 +1 @@') == 'removed'
+    assert meta_style('+index ...') == 'added'
+    assert meta_style('-+++ b/a.py') == 'removed'
+    assert meta_style('+---') == 'added'
+    assert meta_style('+-old line') is None
+    assert meta_style(' @@ -1 +1 @@') is None
+
+
+def test_ansi_nested_line():
+    """Test nested prefixes get per-char and rest-of-line backgrounds."""
+    out = AnsiRenderer()
+    assert out.format_nested_line('++new') == (
+        '\033[1;38;5;231;48;5;28m+\033[48;5;28m+\033[48;5;28mnew\033[0m'
+    )
+    assert out.format_nested_line('-+added') == (
+        '\033[38;5;231;48;5;161m-\033[48;5;28m+\033[48;5;88madded\033[0m'
+    )
+    assert out.format_nested_line('+ context') == (
+        '\033[38;5;231;48;5;28m+\033[48;5;0m \033[48;5;23mcontext\033[0m'
+    )
+    assert out.format_nested_line('+new file mode 100644') == (
+        '\033[38;5;231;48;5;28m+\033[48;5;0mn\033[48;5;22mew file mode 100644\033[0m'
+    )
+    assert out.format_nested_line('  context') == '  context'
+    assert out.format_nested_line('+') == '+'
+
+
+def test_intraline_spans():
+    """Test differing words are found, and unrelated or overlong lines aren't paired."""
+    assert intraline_spans('x = foo(1)', 'x = bar(1)') == (((4, 7),), ((4, 7),))
+    assert intraline_spans('return a', 'return a + b') == ((), ((8, 12),))
+    assert intraline_spans('completely different', 'nothing alike here') is None
+    assert intraline_spans('a' * 600, 'a' * 599 + 'b') is None
+
+
+def test_ansi_intraline(capsys):
+    """Test paired removed/added lines (with the same inner char) get their differing words highlighted."""
+    with AnsiRenderer() as out:
+        out.nested_line('-+x = foo(1)')
+        out.nested_line('- context')
+        out.nested_line('++x = bar(1)')
+        out.nested_line('+ context')
+        out.nested_line(' + unchanged')
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0] == (
+        '\033[38;5;231;48;5;161m-\033[48;5;28m+\033[48;5;88mx = '
+        '\033[4;48;5;196mfoo\033[24m\033[48;5;88m(1)\033[0m'
+    )
+    assert lines[2] == (
+        '\033[1;38;5;231;48;5;28m+\033[48;5;28m+\033[48;5;28mx = '
+        '\033[4;48;5;34mbar\033[24m\033[48;5;28m(1)\033[0m'
+    )
+    # Identical context lines, and lines outside the block, are rendered as usual
+    assert lines[1] == AnsiRenderer().format_nested_line('- context')
+    assert lines[4] == ' + unchanged'
+
+
+def test_plain_renderer(capsys):
+    """Test plain output is unstyled and flushed in order."""
+    with PlainRenderer(batch_lines=2) as out:
+        out.styled('title', 'title')
+        out.nested_line('++new')
+        out.diff_line('-old')
+    assert capsys.readouterr().out == 'title\n++new\n-old\n'
+
+
+def test_html_renderer(capsys):
+    """Test HTML sections are stored deflated, with an index of files and styled lines outside them."""
+    with HtmlRenderer(batch_lines=2) as out:
+        with out.file_section('File: a<b>.py'):
+            out.nested_line('-+added')
+            out.nested_line('@@ -1 +1 @@')
+            out.line('summary')
+        out.styled('Moves:', 'title')
+    html = capsys.readouterr().out
+    assert html.startswith('<!DOCTYPE html>')
+    assert html.rstrip().endswith('</body></html>')
+    assert '<li><a href="#f0">File: a&lt;b&gt;.py</a></li>' in html
+    assert '(3 lines)' in html
+    assert '<div class="s-title">Moves:</div>' in html
+    [data] = re.findall(r'x-didi-deflate">([^<]*)<', html)
+    assert zlib.decompress(b64decode(data)).decode().splitlines() == [
+        'n5\t-+added',
+        's-hunk\t@@ -1 +1 @@',
+        '\tsummary',
+    ]
+    # Background colors come from the nested palette
+    assert '.n5 .r{background:#870000}' in html
+
+
+def test_html_line():
+    """Test nested lines outside sections get a span per background."""
+    assert html_line('n0\t++<x>') == (
+        '<div class="n0"><span class="a">+</span><span class="b">+</span><span class="r">&lt;x&gt;</span></div>'
+    )
+    assert html_line('\tplain') == '<div>plain</div>'
@@ -0,0 +1,63 @@
+"""Subprocess, bytes-read and wall-time budgets on a synthetic 20k-file rebase (served by `fake_git.py`)."""
+
+from time import perf_counter
+
+import pytest
+from click.testing import CliRunner
+
+from didi.cli import cli
+
+FILES = 20000
+COMMITS = 50
+# Files whose blobs changed in the rebase, but whose hunks didn't (only their offsets)
+SHIFTED = range(0, FILES, 1000)
+# Files whose changes differ after the rebase (all in one commit)
+DIFFER = range(5, FILES, 2000)
+
+
+@pytest.fixture
+def model(fake_git):
+    return fake_git.configure(FILES, COMMITS, SHIFTED, DIFFER)
+
+
+def run_budgeted(fake_git, *args) -> tuple[str, list[dict], float]:
+    """Run a command against the fake repo; returns its output, git invocations, and seconds taken."""
+    start = perf_counter()
+    result = CliRunner().invoke(cli, [*args, 'base..before', 'upstream..after'])
+    seconds = perf_counter() - start
+    assert result.exit_code == 0, result.output
+    calls = fake_git.calls()
+    assert [call['argv'] for call in calls if call['unsupported']] == []
+    return result.stdout, calls, seconds
+
+
+def test_stat_budget(fake_git, model):
+    """`stat` reads each range's numstat once."""
+    out, calls, seconds = run_budgeted(fake_git, 'stat')
+    assert out == ''
+    assert len(calls) <= 5
+    assert sum(call['bytes'] for call in calls) <= 50 * FILES
+    assert seconds < 10
+
+
+def test_patch_budget(fake_git, model):
+    """`patch` forks per file only for files whose blob pairs differ between the ranges."""
+    out, calls, seconds = run_budgeted(fake_git, 'patch')
+    files = [line.removeprefix('File: ') for line in out.splitlines() if line.startswith('File: ')]
+    assert files == [model.path(i) for i in DIFFER]
+    rebased = len(SHIFTED) + len(DIFFER)
+    assert len(calls) <= 5 + 2 * rebased
+    assert sum(call['bytes'] for call in calls) <= 300 * FILES
+    assert seconds < 30
+
+
+def test_commits_budget(fake_git, model):
+    """`commits` reads each commit's patch once, from one `git diff-tree --stdin` per range."""
+    out, calls, seconds = run_budgeted(fake_git, 'commits')
+    changed = [line for line in out.splitlines() if line.endswith(' - DIFFERS')]
+    assert len(changed) == 2
+    assert out.count(': patches differ') == len(SHIFTED) + len(DIFFER)
+    assert sum(call['argv'][0] == 'diff-tree' for call in calls) == 2
+    assert len(calls) <= 8 + 2 * len(changed)
+    assert sum(call['bytes'] for call in calls) <= 450 * FILES
+    assert seconds < 20
@@ -0,0 +1,55 @@
+"""Test N-way patch-series comparison."""
+
+from click.testing import CliRunner
+
+from didi.cli import cli
+from didi.config import NO_RULES
+from didi.pathspec import PathFilter
+from didi.series import commit_fingerprints, load_revisions, matrix, pair_results
+
+from conftest import git
+
+
+def test_matrix():
+    """Test that equal fingerprints get equal letters, per row."""
+    rows = matrix([{'a': 'x', 'b': 'y'}, {'a': 'x', 'b': 'z'}, {'b': 'y', 'c': 'w'}])
+    assert rows == [('a', 'AA·'), ('b', 'ABA'), ('c', '··A')]
+
+
+def test_load_revisions(repo):
+    """Test fingerprints follow upstream renames and ignore hunk offsets."""
+    rev1, rev2 = load_revisions(['base..before', 'upstream..after'], commits=True)
+    assert rev1.fingerprints['a.py'] == rev2.fingerprints['a.py']
+    assert rev1.fingerprints['new.py'] == rev2.fingerprints['new.py']
+    assert 'gone.py' not in rev2.fingerprints
+    assert list(rev1.commits) == list(rev2.commits) == [('change', 1)]
+    results = pair_results(rev1, rev2)
+    assert {r.display_name: r.status for r in results} == {'gone.py': 'dropped', 'added.py': 'added'}
+
+
+def test_commit_fingerprints_paths(repo):
+    """Test that commits' files are filtered by their header paths, even where those are quoted or contain " b/"."""
+    for branch in ('one', 'two'):
+        git('checkout', '-qb', branch, 'base', cwd=repo)
+        (repo / 'a b').mkdir(exist_ok=True)
+        (repo / 'a b' / 'c.py').write_text('c\n')
+        (repo / 'café.py').write_text(f'{branch}\n')
+        git('add', '.', cwd=repo)
+        git('commit', '-qm', 'paths', cwd=repo)
+
+    def fingerprints(refspec, *specs):
+        return commit_fingerprints(refspec, (), False, 3, None, None, {}, NO_RULES, PathFilter.from_specs(specs))
+
+    assert fingerprints('base..one') != fingerprints('base..two')
+    assert fingerprints('base..one', 'a b/c.py') == fingerprints('base..two', 'a b/c.py')
+    assert fingerprints('base..one', 'café.py') != fingerprints('base..two', 'café.py')
+
+
+def test_series_cli(repo):
+    """Test the matrix output, and the diff-of-diffs for a chosen pair."""
+    result = CliRunner().invoke(cli, ['series', '--color=never', 'base..before', 'upstream..after', '--pair', '1', '2'])
+    assert result.exit_code == 0
+    lines = result.stdout.splitlines()
+    assert 'A·  gone.py' in lines
+    assert '·A  added.py' in lines
+    assert 'File: added.py' in lines
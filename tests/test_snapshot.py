@@ -0,0 +1,70 @@
+"""Test range snapshots, and comparing against them."""
+
+from click.testing import CliRunner
+
+from didi.cli import cli
+from didi.compare import compare_files
+from didi.snapshot import SnapshotSource, is_snapshot, write_snapshot
+from didi.source import GitSource, open_source
+
+from conftest import git
+
+
+def test_round_trip(repo):
+    """Test that a snapshot reads back the live range's files, patches and commits."""
+    stats = write_snapshot('base..before', 'before.didi')
+    assert stats['files'] == 3 and stats['commits'] == 1
+    assert is_snapshot('before.didi')
+
+    snapshot = open_source('before.didi')
+    assert isinstance(snapshot, SnapshotSource)
+    assert isinstance(open_source('base..before'), GitSource)
+    live = GitSource('base..before')
+    assert snapshot.changes() == live.changes()
+    assert snapshot.numstat() == live.numstat()
+    assert snapshot.commits() == live.commits()
+    sha = snapshot.commits()[0].split()[0]
+    assert sorted(snapshot.commit_files(sha)) == sorted(live.commit_files(sha))
+    assert 'gone changed' in snapshot.commit_file_diff(sha, 'gone.py')
+
+
+def test_commit_paths(repo):
+    """Test that commit patches are stored under their paths, even where headers quote them or contain " b/"."""
+    git('checkout', '-q', 'before', cwd=repo)
+    (repo / 'a b').mkdir()
+    (repo / 'a b' / 'c.py').write_text('c\n')
+    (repo / 'café.py').write_text('café\n')
+    git('add', '.', cwd=repo)
+    git('commit', '-qm', 'paths', cwd=repo)
+    write_snapshot('base..HEAD', 'head.didi')
+    snapshot = SnapshotSource('head.didi')
+    sha = snapshot.commits()[0].split()[0]
+    assert sorted(snapshot.commit_files(sha)) == ['a b/c.py', 'café.py']
+    assert '+c' in snapshot.commit_file_diff(sha, 'a b/c.py').splitlines()
+
+
+def test_compare_after_rewrite(repo):
+    """Test that a snapshot can still be compared after its range's commits are gone."""
+    write_snapshot('base..before', 'before.didi')
+    results, _ = compare_files('before.didi', 'base..before')
+    assert not any(result.different for result in results)
+
+    git('branch', '-D', 'before', cwd=repo)
+    git('reflog', 'expire', '--expire=now', '--all', cwd=repo)
+    git('gc', '-q', '--prune=now', cwd=repo)
+    results, _ = compare_files('before.didi', 'upstream..after')
+    assert {r.display_name: r.status for r in results if r.different} == {'gone.py': 'dropped', 'added.py': 'added'}
+
+
+def test_snapshot_cli(repo):
+    """Test writing a snapshot, then comparing against it with `patch` and `stat`."""
+    runner = CliRunner()
+    result = runner.invoke(cli, ['snapshot', 'base..before', '-o', 'before.didi'])
+    assert result.exit_code == 0
+    result = runner.invoke(cli, ['patch', '--color=never', '--pager=never', 'before.didi', 'upstream..after'])
+    assert result.exit_code == 0
+    assert 'File: added.py' in result.stdout
+    assert 'File: a.py' not in result.stdout
+    result = runner.invoke(cli, ['commits', '--color=never', '--pager=never', 'before.didi', 'base..before'])
+    assert result.exit_code == 0
+    assert '[1] change - identical' in result.stdout
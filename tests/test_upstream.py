@@ -0,0 +1,90 @@
+"""Test triaging differing hunks by overlap with upstream's changes."""
+
+from click.testing import CliRunner
+
+from didi.cli import cli
+from didi.compare import DROPPED, UPSTREAM, compare_files
+from didi.hunks import line_span
+from didi.upstream import OVERLAP, UNEXPECTED, Spans, build_upstream_index
+
+from conftest import git
+
+
+def test_spans():
+    """Test span lookups, including empty sides (pure insertions/deletions)."""
+    spans = Spans()
+    for span in (line_span(5, 2), line_span(20, 0), line_span(30, None)):
+        spans.add(span)
+    assert spans.intersects(line_span(1, 4))  # lines 1-4 adjoin line 5
+    assert not spans.intersects(line_span(8, 3))
+    assert spans.intersects(line_span(18, 3))  # insertion after line 20
+    assert not spans.intersects(line_span(22, 3))
+    assert spans.intersects(line_span(30, 0))
+    assert not spans.intersects(line_span(40, 3))
+
+
+def test_upstream_index(repo):
+    """Test that upstream's line changes are indexed by path, on both sides of the range."""
+    index = build_upstream_index('base..upstream')
+    assert index.old['a.py'].starts == [1] and index.new['a.py'].starts == [1]
+    assert index.touches('old.py', None) and index.touches(None, 'new.py')
+    assert not index.touches('gone.py', 'gone.py')
+
+
+def test_upstream_index_paths(repo):
+    """Test that quoted paths, and paths containing " b/", are indexed under their own names."""
+    git('checkout', '-q', 'upstream', cwd=repo)
+    (repo / 'x y.py').write_text(''.join(f'{i}\n' for i in range(20)))
+    (repo / 'café.py').write_text('café\n')
+    git('add', '.', cwd=repo)
+    git('commit', '-qm', 'add', cwd=repo)
+    git('tag', 'added', cwd=repo)
+    (repo / 'a b').mkdir()
+    git('mv', 'x y.py', 'a b/z.py', cwd=repo)
+    (repo / 'a b' / 'z.py').write_text('top\n' + (repo / 'a b' / 'z.py').read_text())
+    (repo / 'café.py').write_text('changed\n')
+    git('commit', '-qam', 'rename', cwd=repo)
+    index = build_upstream_index('added..HEAD')
+    assert index.touches('x y.py', None) and index.touches(None, 'a b/z.py')
+    assert index.old['x y.py'].starts == [1] and index.new['a b/z.py'].starts == [1]
+    assert index.new['café.py'].starts == [1]
+
+
+def amend_after(repo):
+    """Make `after` differ from `before` near upstream's change to a.py (top) and away from it (line 90)."""
+    a = repo / 'a.py'
+    a.write_text(a.read_text().replace('1\n', '1 resolved\n', 1).replace('90\n', '90 extra\n'))
+    git('commit', '-qa', '--amend', '--no-edit', cwd=repo)
+
+
+def test_triage(repo):
+    """Test hunk tags, and that --unexpected-only drops overlapping hunks."""
+    amend_after(repo)
+    upstream = build_upstream_index('base..upstream')
+    results, _ = compare_files('base..before', 'upstream..after', upstream=upstream)
+    a = next(r for r in results if r.path1 == 'a.py')
+    assert a.tags(1) == [] and a.tags(2) == [OVERLAP, UNEXPECTED]
+    assert a.overlapping
+
+    results, _ = compare_files('base..before', 'upstream..after', upstream=upstream, unexpected_only=True)
+    statuses = {r.path1: r.status for r in results}
+    assert statuses['gone.py'] == DROPPED
+    a = next(r for r in results if r.path1 == 'a.py')
+    assert a.tags(2) == [UNEXPECTED]
+    assert '90 extra' in '\n'.join(a.unmatched2[0].lines)
+
+    # Resolve the unexpected change: only the overlapping one is left
+    (repo / 'a.py').write_text((repo / 'a.py').read_text().replace('90 extra\n', '90\n'))
+    git('commit', '-qa', '--amend', '--no-edit', cwd=repo)
+    results, _ = compare_files('base..before', 'upstream..after', upstream=upstream, unexpected_only=True)
+    assert {r.path1: r.status for r in results}['a.py'] == UPSTREAM
+
+
+def test_triage_cli(repo):
+    """Test that --triage tags hunks in the diff-of-diffs."""
+    amend_after(repo)
+    result = CliRunner().invoke(cli, ['patch', '--triage', '--color=never', 'base..before', 'upstream..after'])
+    assert result.exit_code == 0
+    assert f'Differing hunks: 1 {OVERLAP}, 1 {UNEXPECTED}' in result.stdout
+    result = CliRunner().invoke(cli, ['patch', '--triage', 'a.py', 'b.py'])
+    assert result.exit_code == 1
@@ -0,0 +1,82 @@
+"""Test the watch command's incremental re-comparison."""
+
+from subprocess import check_output
+
+from click.testing import CliRunner
+
+from didi import source
+from didi.cli import cli
+from didi.commands.watch import prune_diff_cache, render_updates, worktree_refspec, worktree_state
+from didi.compare import compare_files
+from didi.render import renderer
+
+from conftest import git
+
+
+def test_diff_cache(repo, monkeypatch):
+    """Test that a second comparison only re-fetches patches whose blob pairs changed."""
+    fetched = []
+    get_file_diff = source.get_file_diff
+    monkeypatch.setattr(source, 'get_file_diff', lambda refspec, path, *args: fetched.append(path) or get_file_diff(refspec, path, *args))
+    cache = {}
+    compare_files('base..before', 'upstream..after', diff_cache=cache)
+    assert fetched
+    fetched.clear()
+    compare_files('base..before', 'upstream..after', diff_cache=cache)
+    assert fetched == []
+
+    (repo / 'added.py').write_text('added changed\n')
+    git('commit', '-qam', 'more', cwd=repo)
+    results, _ = compare_files('base..before', 'upstream..after', diff_cache=cache)
+    assert fetched == ['added.py']
+
+    # The superseded added.py patch is dropped; the rest are still current
+    size = len(cache)
+    prune_diff_cache(cache, results)
+    assert len(cache) == size - 1
+    fetched.clear()
+    compare_files('base..before', 'upstream..after', diff_cache=cache)
+    assert fetched == []
+
+
+def test_render_updates(repo, capsys):
+    """Test that only files whose status changed are printed."""
+    shown = {}
+    with renderer(False) as out:
+        results, _ = compare_files('base..before', 'upstream..after')
+        render_updates(out, results, shown)
+        git('checkout', '-q', 'before', '--', 'gone.py', cwd=repo)
+        git('commit', '-qam', 'restore gone.py', cwd=repo)
+        results, _ = compare_files('base..before', 'upstream..after')
+        render_updates(out, results, shown)
+    lines = [line.split('\t', 1)[1] for line in capsys.readouterr().out.splitlines()]
+    assert lines == [
+        'dropped\tgone.py',
+        'added\tadded.py',
+        'identical\tgone.py',
+    ]
+
+
+def test_watch_worktree(repo):
+    """Test that --worktree compares uncommitted changes."""
+    assert worktree_refspec('upstream..after') == 'upstream'
+    def rev_parse(ref):
+        return check_output(['git', 'rev-parse', ref], text=True).strip()
+
+    assert worktree_refspec('upstream...after') == rev_parse('upstream')
+    assert worktree_refspec('after...before') == rev_parse('base')
+    (repo / 'added.py').unlink()
+    result = CliRunner().invoke(cli, ['watch', '--once', '-W', 'base..before', 'upstream..after'])
+    assert result.exit_code == 0
+    assert 'added.py' not in result.stdout
+    assert 'dropped\tgone.py' in result.stdout
+
+
+def test_worktree_state(repo):
+    """Test that editing a tracked file changes the worktree state, even if it wasn't shown yet."""
+    before = worktree_state(str(repo), {'added.py'})
+    assert before[0] == ('added.py',)
+    assert worktree_state(str(repo), {'added.py'}) == before
+    (repo / 'a.py').write_text('edited\n')
+    after = worktree_state(str(repo), {'added.py'})
+    assert after[0] == ('a.py', 'added.py') and after != before